@@ -0,0 +1,323 @@
+"""HTTP benchmarks for the auth and user hot paths.
+
+Starts the app from ``main.create_app`` under uvicorn in a separate process and
+drives it over real HTTP at a fixed concurrency. Latency percentiles and
+throughput per scenario are written to a JSON file and, when a baseline exists,
+compared against it.
+
+Usage (from the project root, see also ``make bench``)::
+
+    PYTHONPATH=src python benchmarks/http_bench.py --save-baseline   # on the base branch
+    PYTHONPATH=src python benchmarks/http_bench.py                   # on your change
+
+The exit code is 1 when any scenario regressed by more than ``--threshold``
+percent (p95 latency up or requests per second down).
+
+``--db sqlite`` (default) uses a fresh temporary database; ``--db postgres``
+uses the database configured through the usual ``DB_*`` settings, which must be
+migrated already. Numbers are only comparable on the same machine and settings.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+_ROOT_DIR = Path(__file__).resolve().parent.parent
+_OUTPUT_DIR = _ROOT_DIR / "output" / "bench"
+
+_USERNAME = "bench_user"
+_PASSWORD = "bench_password"
+
+type Request = Callable[[httpx.AsyncClient, "_Session"], Awaitable[httpx.Response]]
+
+
+@dataclass
+class ScenarioResult:
+    requests: int
+    errors: int
+    rps: float
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+
+
+@dataclass
+class _Session:
+    """Per virtual user state: refresh tokens rotate, so each client keeps its own."""
+
+    access_token: str
+    refresh_token: str
+
+
+def _serve(port: int, db: str, db_path: str | None) -> None:
+    """Child process entry point: build the app and run it under uvicorn."""
+    sys.path.insert(0, str(_ROOT_DIR / "src"))
+    import uvicorn
+    from loguru import logger
+
+    if db == "sqlite":
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from sqlmodel import SQLModel, create_engine
+
+        from auth import model as auth_model
+        from conf import db as db_module
+        from user import model as user_model
+
+        sync_engine = create_engine(f"sqlite:///{db_path}")
+        SQLModel.metadata.create_all(sync_engine)
+        sync_engine.dispose()
+        engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        db_module.engine = user_model.engine = auth_model.engine = engine
+
+    from main import create_app
+
+    app = create_app()
+    # Keep request logging in the measured path but off the terminal
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_ready(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError("server did not start in time")
+
+
+async def _login(client: httpx.AsyncClient) -> _Session:
+    response = await client.post("/auth/login", data={"username": _USERNAME, "password": _PASSWORD})
+    response.raise_for_status()
+    data = response.json()
+    return _Session(access_token=data["access_token"], refresh_token=data["refresh_token"])
+
+
+def _auth(session: _Session) -> dict[str, str]:
+    return {"Authorization": f"Bearer {session.access_token}"}
+
+
+async def _root(client: httpx.AsyncClient, session: _Session) -> httpx.Response:
+    return await client.get("/")
+
+
+async def _me(client: httpx.AsyncClient, session: _Session) -> httpx.Response:
+    return await client.get("/user/me", headers=_auth(session))
+
+
+async def _update_me(client: httpx.AsyncClient, session: _Session) -> httpx.Response:
+    return await client.patch("/user/me", headers=_auth(session), json={"nickname": "bench"})
+
+
+async def _login_request(client: httpx.AsyncClient, session: _Session) -> httpx.Response:
+    return await client.post("/auth/login", data={"username": _USERNAME, "password": _PASSWORD})
+
+
+async def _refresh(client: httpx.AsyncClient, session: _Session) -> httpx.Response:
+    response = await client.post("/auth/refresh", json={"refresh_token": session.refresh_token})
+    if response.status_code == 200:
+        session.refresh_token = response.json()["refresh_token"]
+    return response
+
+
+# name -> (request, share of --requests); login is dominated by the password KDF, so it runs fewer requests
+SCENARIOS: dict[str, tuple[Request, float]] = {
+    "root": (_root, 1.0),
+    "user_me": (_me, 1.0),
+    "user_me_patch": (_update_me, 1.0),
+    "auth_refresh": (_refresh, 1.0),
+    "auth_login": (_login_request, 0.1),
+}
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def _run_scenario(
+    base_url: str, request: Request, *, total: int, concurrency: int, warmup: int
+) -> ScenarioResult:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        sessions = [await _login(client) for _ in range(concurrency)]
+        latencies: list[float] = []
+        errors = 0
+        # Warmup requests are the first ones taken from the shared budget
+        remaining = total + warmup
+        measure_start: float | None = None
+
+        async def _worker(session: _Session) -> None:
+            nonlocal remaining, errors, measure_start
+            while remaining > 0:
+                remaining -= 1
+                measured = remaining < total
+                start = time.perf_counter()
+                if measured and measure_start is None:
+                    measure_start = start
+                response = await request(client, session)
+                elapsed = time.perf_counter() - start
+                if not measured:
+                    continue
+                latencies.append(elapsed)
+                if response.status_code >= 400:
+                    errors += 1
+
+        await asyncio.gather(*(_worker(session) for session in sessions))
+        wall = time.perf_counter() - (measure_start or time.perf_counter())
+
+    latencies.sort()
+    return ScenarioResult(
+        requests=len(latencies),
+        errors=errors,
+        rps=len(latencies) / wall if wall else 0.0,
+        mean_ms=statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        p50_ms=_percentile(latencies, 50) * 1000,
+        p95_ms=_percentile(latencies, 95) * 1000,
+        p99_ms=_percentile(latencies, 99) * 1000,
+    )
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=_ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db") if args.db == "sqlite" else None
+        server = multiprocessing.get_context("spawn").Process(target=_serve, args=(port, args.db, db_path), daemon=True)
+        server.start()
+        try:
+            await _wait_ready(base_url)
+            async with httpx.AsyncClient(base_url=base_url) as client:
+                response = await client.post("/user/register", json={"username": _USERNAME, "password": _PASSWORD})
+                if response.status_code not in (200, 409):
+                    response.raise_for_status()
+
+            scenarios: dict[str, dict[str, Any]] = {}
+            for name, (request, share) in SCENARIOS.items():
+                if args.scenario and name not in args.scenario:
+                    continue
+                total = max(args.concurrency, int(args.requests * share))
+                result = await _run_scenario(
+                    base_url, request, total=total, concurrency=args.concurrency, warmup=args.warmup
+                )
+                scenarios[name] = asdict(result)
+                print(
+                    f"{name:<15} {result.rps:>9.1f} req/s  p50 {result.p50_ms:>7.2f}ms  "
+                    f"p95 {result.p95_ms:>7.2f}ms  p99 {result.p99_ms:>7.2f}ms  errors {result.errors}"
+                )
+        finally:
+            server.terminate()
+            server.join(10)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(UTC).isoformat(),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "db": args.db,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+        },
+        "scenarios": scenarios,
+    }
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any], threshold: float) -> list[str]:
+    """Return one message per scenario whose p95 or throughput regressed beyond ``threshold`` percent."""
+    regressions: list[str] = []
+    for name, result in current["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if not base:
+            continue
+        p95_change = (result["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100 if base["p95_ms"] else 0.0
+        rps_change = (result["rps"] - base["rps"]) / base["rps"] * 100 if base["rps"] else 0.0
+        print(f"{name:<15} p95 {p95_change:+6.1f}%  rps {rps_change:+6.1f}%")
+        if p95_change > threshold:
+            regressions.append(f"{name}: p95 {base['p95_ms']:.2f}ms -> {result['p95_ms']:.2f}ms ({p95_change:+.1f}%)")
+        if rps_change < -threshold:
+            regressions.append(f"{name}: rps {base['rps']:.1f} -> {result['rps']:.1f} ({rps_change:+.1f}%)")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", choices=("sqlite", "postgres"), default="sqlite")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=100, help="unmeasured requests per scenario")
+    parser.add_argument("--scenario", action="append", choices=tuple(SCENARIOS), help="run only these scenarios")
+    parser.add_argument("--output", type=Path, default=_OUTPUT_DIR / "http-latest.json")
+    parser.add_argument("--baseline", type=Path, default=_OUTPUT_DIR / "http-baseline.json")
+    parser.add_argument("--save-baseline", action="store_true", help="also store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed regression in percent")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=2))
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(results, indent=2))
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print("No baseline found; run with --save-baseline on the base branch first")
+        return 0
+
+    regressions = compare(results, json.loads(args.baseline.read_text()), args.threshold)
+    if regressions:
+        print(f"Regressions beyond {args.threshold:.0f}%:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"No regressions beyond {args.threshold:.0f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
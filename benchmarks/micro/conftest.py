@@ -0,0 +1,72 @@
+"""Fixtures for the per-request micro-benchmarks.
+
+Run with ``uv run --extra dev pytest benchmarks/micro`` (or ``make bench-micro``).
+pytest-benchmark reports ops per second; the ``allocations`` fixture adds the
+peak memory allocated by one call and the memory still held after many calls,
+both measured with tracemalloc outside the timed loop.
+"""
+
+import asyncio
+import tracemalloc
+from collections.abc import Callable, Generator
+from typing import Any
+
+import pytest
+from loguru import logger
+
+_ALLOCATIONS: dict[str, dict[str, float]] = {}
+_TRACEMALLOC_FILTER = tracemalloc.Filter(False, tracemalloc.__file__)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _quiet_logger() -> Generator[None, None, None]:
+    # Keep record formatting in the measured path but discard the output
+    logger.remove()
+    handler_id = logger.add(lambda _: None, level="INFO", format="{message}")
+    yield
+    logger.remove(handler_id)
+
+
+@pytest.fixture(scope="session")
+def event_loop_runner() -> Generator[Callable[[Any], Any], None, None]:
+    """Run a coroutine to completion on a loop shared by the whole session."""
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.close()
+
+
+@pytest.fixture
+def allocations(request: pytest.FixtureRequest, benchmark: Any) -> Callable[..., dict[str, float]]:
+    def measure(fn: Callable[[], object], *, calls: int = 200) -> dict[str, float]:
+        fn()  # warm up caches and lazy imports so they are not counted
+        tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot().filter_traces([_TRACEMALLOC_FILTER])
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+            for _ in range(calls - 1):
+                fn()
+            after = tracemalloc.take_snapshot().filter_traces([_TRACEMALLOC_FILTER])
+        finally:
+            tracemalloc.stop()
+        retained = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+        info = {"alloc_peak_bytes": peak - current, "retained_bytes_per_call": retained / calls}
+        benchmark.extra_info.update(info)
+        _ALLOCATIONS[request.node.name] = info
+        return info
+
+    return measure
+
+
+def pytest_terminal_summary(terminalreporter: Any) -> None:
+    if not _ALLOCATIONS:
+        return
+    terminalreporter.section("allocations per call")
+    width = max(len(name) for name in _ALLOCATIONS)
+    terminalreporter.write_line(f"{'Name':<{width}}  {'peak bytes':>12}  {'retained bytes':>14}")
+    for name, info in _ALLOCATIONS.items():
+        terminalreporter.write_line(
+            f"{name:<{width}}  {info['alloc_peak_bytes']:>12,.0f}  {info['retained_bytes_per_call']:>14,.1f}"
+        )
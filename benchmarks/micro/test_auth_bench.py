@@ -0,0 +1,36 @@
+from typing import Any
+
+import pytest
+
+from auth import service
+from common.cache import TTLCache
+from middleware import auth
+
+
+@pytest.fixture
+def token() -> str:
+    access_token, _ = service.create_access_token("bench_user")
+    return access_token
+
+
+def test_create_access_token(benchmark: Any, allocations: Any):
+    allocations(lambda: service.create_access_token("bench_user"))
+    benchmark(service.create_access_token, "bench_user")
+
+
+def test_verify_token_cached(benchmark: Any, allocations: Any, token: str):
+    allocations(lambda: auth.verify_token(token))
+    benchmark(auth.verify_token, token)
+
+
+def test_verify_token_uncached(benchmark: Any, allocations: Any, token: str, monkeypatch: pytest.MonkeyPatch):
+    disabled: TTLCache[bytes, dict[str, Any]] = TTLCache(maxsize=0, ttl=0)
+    monkeypatch.setattr(auth, "token_cache", lambda: disabled, raising=True)
+    allocations(lambda: auth.verify_token(token))
+    benchmark(auth.verify_token, token)
+
+
+def test_get_password_hash(benchmark: Any, allocations: Any, event_loop_runner: Any):
+    # One scrypt hash takes tens of milliseconds, so use a few fixed rounds
+    allocations(lambda: event_loop_runner(service.get_password_hash("bench_password")), calls=5)
+    benchmark.pedantic(lambda: event_loop_runner(service.get_password_hash("bench_password")), rounds=10)
@@ -0,0 +1,121 @@
+import json
+from typing import Any
+
+import pytest
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.types import Message, Receive, Scope, Send
+
+from auth import service
+from common import erri
+from middleware.auth import JWTMiddleware, verify_token
+from middleware.logging import LoggingMiddleware, _mask_fields, _parse_body
+
+_BODY = json.dumps({"username": "bench_user", "password": "secret", "nickname": "x" * 64}).encode()
+
+
+def _nested_payload(depth: int = 4, width: int = 8) -> Any:
+    if depth == 0:
+        return {"password": "secret", "value": "x" * 16, "count": 1}
+    return {
+        "items": [_nested_payload(depth - 1, width // 2 or 1) for _ in range(width)],
+        "access_token": "token",
+        "meta": {"page": 1, "api_key": "key"},
+    }
+
+
+async def _noop_app(scope: Scope, receive: Receive, send: Send) -> None:
+    await receive()
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": b'{"ok":true}'})
+
+
+def _request_scope(token: str) -> Scope:
+    return {
+        "type": "http",
+        "method": "POST",
+        "path": "/user/me",
+        "query_string": b"",
+        "headers": [
+            (b"authorization", f"Bearer {token}".encode()),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(_BODY)).encode()),
+        ],
+    }
+
+
+async def _previous_jwt_dispatch(request: Request, call_next: RequestResponseEndpoint) -> Response:
+    """The ``@app.middleware("http")`` function that JWTMiddleware replaced, kept for comparison."""
+    auth = request.headers.get("Authorization")
+    if not auth or not auth.startswith("Bearer "):
+        return JSONResponse(status_code=401, content={"detail": "Unauthorized"})
+    token = auth.split(" ", 1)[1]
+    try:
+        payload = verify_token(token)
+    except erri.BusinessError as e:
+        return JSONResponse(status_code=e.status_code, content={"detail": e.detail})
+    request.state.user = payload.get("sub")
+    return await call_next(request)
+
+
+def _round_trip(app: Any, scope: Scope, run: Any) -> None:
+    async def receive() -> Message:
+        return {"type": "http.request", "body": _BODY, "more_body": False}
+
+    async def send(_: Message) -> None:
+        return None
+
+    run(app(dict(scope), receive, send))
+
+
+@pytest.fixture
+def scope() -> Scope:
+    access_token, _ = service.create_access_token("bench_user")
+    return _request_scope(access_token)
+
+
+def test_mask_fields_large_nested_payload(benchmark: Any, allocations: Any):
+    payload = _nested_payload()
+    allocations(lambda: _mask_fields(payload))
+    benchmark(_mask_fields, payload)
+
+
+def test_parse_body_json(benchmark: Any, allocations: Any):
+    body = json.dumps(_nested_payload(depth=3)).encode()
+    allocations(lambda: _parse_body(body, "application/json"))
+    benchmark(_parse_body, body, "application/json")
+
+
+def test_parse_body_form(benchmark: Any, allocations: Any):
+    body = b"&".join(f"field{i}=value{i}".encode() for i in range(50))
+    allocations(lambda: _parse_body(body, "application/x-www-form-urlencoded"))
+    benchmark(_parse_body, body, "application/x-www-form-urlencoded")
+
+
+def test_asgi_noop_baseline(benchmark: Any, allocations: Any, scope: Scope, event_loop_runner: Any):
+    """Cost of driving the no-op app alone; subtract it from the middleware round trips."""
+    allocations(lambda: _round_trip(_noop_app, scope, event_loop_runner))
+    benchmark(_round_trip, _noop_app, scope, event_loop_runner)
+
+
+@pytest.mark.parametrize("verbose", [False, True], ids=["summary", "verbose"])
+def test_asgi_round_trip_logging_and_jwt(
+    benchmark: Any, allocations: Any, scope: Scope, event_loop_runner: Any, verbose: bool
+):
+    app = LoggingMiddleware(JWTMiddleware(_noop_app, exempt_paths=frozenset()), verbose=verbose)
+    allocations(lambda: _round_trip(app, scope, event_loop_runner))
+    benchmark(_round_trip, app, scope, event_loop_runner)
+
+
+@pytest.mark.parametrize("implementation", ["base_http_middleware", "asgi"])
+def test_asgi_round_trip_jwt(
+    benchmark: Any, allocations: Any, scope: Scope, event_loop_runner: Any, implementation: str
+):
+    """JWTMiddleware against the previous BaseHTTPMiddleware version, both with a cached token."""
+    if implementation == "asgi":
+        app: Any = JWTMiddleware(_noop_app, exempt_paths=frozenset())
+    else:
+        app = BaseHTTPMiddleware(_noop_app, dispatch=_previous_jwt_dispatch)
+    allocations(lambda: _round_trip(app, scope, event_loop_runner))
+    benchmark(_round_trip, app, scope, event_loop_runner)
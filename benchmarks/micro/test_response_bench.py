@@ -0,0 +1,43 @@
+from typing import Any
+
+from fastapi._compat import ModelField
+from fastapi.responses import JSONResponse
+from fastapi.utils import create_model_field
+
+from common.response import FastJSONResponse
+from user.dto import UserProfileResponse
+
+_PROFILE = UserProfileResponse(
+    username="bench_user",
+    nickname="Bench",
+    email="bench@example.com",
+    avatar_url="https://example.com/avatar.png",
+    role="user",
+    is_active=True,
+)
+
+
+def _response_field() -> ModelField:
+    return create_model_field(name="Response_bench", type_=UserProfileResponse, mode="serialization")
+
+
+def test_dto_response_fastapi_default(benchmark: Any, allocations: Any):
+    """The steps of ``fastapi.routing.serialize_response`` for a returned DTO, then json.dumps."""
+    field = _response_field()
+
+    def render() -> JSONResponse:
+        value, _ = field.validate(_PROFILE, {}, loc=("response",))
+        return JSONResponse(field.serialize(value))
+
+    allocations(render)
+    benchmark(render)
+
+
+def test_dto_response_fast(benchmark: Any, allocations: Any):
+    """Returning FastJSONResponse(dto): no revalidation, serialized to bytes by pydantic-core."""
+
+    def render() -> FastJSONResponse:
+        return FastJSONResponse(_PROFILE)
+
+    allocations(render)
+    benchmark(render)
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+_BATCH_SIZE = 5000
+
+
+def upgrade() -> None:
+    # Nullable without a default, so adding it does not rewrite the table
+    op.add_column("refresh_token", sa.Column("revoked_at", sa.DateTime(timezone=True), nullable=True))
+
+    # CONCURRENTLY cannot run inside a transaction, but keeps the table writable while building
+    with op.get_context().autocommit_block():
+        # Rows already revoked get their issue time, the best estimate available. Rows the previous
+        # release revokes during the rollout stay NULL and are purged once they expire.
+        conn = op.get_bind()
+        backfill = sa.text(
+            "UPDATE refresh_token SET revoked_at = created_at "
+            "WHERE id IN (SELECT id FROM refresh_token WHERE revoked AND revoked_at IS NULL LIMIT :limit)"
+        )
+        # Each batch commits on its own, so row locks are held only briefly
+        while conn.execute(backfill, {"limit": _BATCH_SIZE}).rowcount:
+            pass
+
+        # Lookups by user only care about live tokens; revoked rows stay out of the index
+        op.create_index(
+            "ix_refresh_token_active_user_id",
+            "refresh_token",
+            ["user_id"],
+            unique=False,
+            postgresql_where=sa.text("NOT revoked"),
+            postgresql_concurrently=True,
+        )
+        # Every lookup by user filters on NOT revoked, so the partial index replaces the full one
+        op.drop_index("ix_refresh_token_user_id", table_name="refresh_token", postgresql_concurrently=True)
+        # Lets the purge find expired rows without scanning the table
+        op.create_index(
+            "ix_refresh_token_expires_at",
+            "refresh_token",
+            ["expires_at"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        # Lets the purge find long-revoked rows; live rows stay out of the index
+        op.create_index(
+            "ix_refresh_token_revoked_at",
+            "refresh_token",
+            ["revoked_at"],
+            unique=False,
+            postgresql_where=sa.text("revoked"),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_refresh_token_revoked_at", table_name="refresh_token", postgresql_concurrently=True)
+        op.drop_index("ix_refresh_token_expires_at", table_name="refresh_token", postgresql_concurrently=True)
+        op.create_index(
+            "ix_refresh_token_user_id", "refresh_token", ["user_id"], unique=False, postgresql_concurrently=True
+        )
+        op.drop_index("ix_refresh_token_active_user_id", table_name="refresh_token", postgresql_concurrently=True)
+    op.drop_column("refresh_token", "revoked_at")
@@ -0,0 +1,82 @@
+"""Store refresh tokens as SHA-256 digests (expand step).
+
+Adds ``token_hash`` next to the raw ``token`` column, which becomes nullable
+because the new release only writes the digest. A trigger fills ``token_hash``
+for rows the previous release still inserts during the rollout; existing rows
+are backfilled in small autocommitted batches and the unique index is built
+CONCURRENTLY, so the table stays readable and writable throughout. Every step
+is idempotent, so a run interrupted after the autocommit block can be resumed.
+
+Tokens issued by the new release cannot be refreshed by workers still running
+the previous one. ``0006`` makes ``token_hash`` NOT NULL and drops ``token``
+once every worker runs the new release.
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+_BATCH_SIZE = 5000
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE refresh_token ADD COLUMN IF NOT EXISTS token_hash bytea")
+    op.execute("ALTER TABLE refresh_token ALTER COLUMN token DROP NOT NULL")
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION refresh_token_hash_token() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.token IS NOT NULL THEN
+                NEW.token_hash := sha256(convert_to(NEW.token, 'UTF8'));
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute("DROP TRIGGER IF EXISTS refresh_token_hash_token ON refresh_token")
+    op.execute(
+        "CREATE TRIGGER refresh_token_hash_token BEFORE INSERT OR UPDATE OF token ON refresh_token "
+        "FOR EACH ROW EXECUTE FUNCTION refresh_token_hash_token()"
+    )
+
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        backfill = sa.text(
+            "UPDATE refresh_token SET token_hash = sha256(convert_to(token, 'UTF8')) "
+            "WHERE id IN (SELECT id FROM refresh_token WHERE token_hash IS NULL AND token IS NOT NULL LIMIT :limit)"
+        )
+        # Each batch commits on its own, so row locks are held only briefly
+        while conn.execute(backfill, {"limit": _BATCH_SIZE}).rowcount:
+            pass
+
+        # An interrupted CONCURRENTLY build leaves an invalid index behind; rebuild it
+        invalid = conn.execute(
+            sa.text("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass('ix_refresh_token_token_hash')")
+        ).scalar()
+        if invalid:
+            op.drop_index("ix_refresh_token_token_hash", table_name="refresh_token", postgresql_concurrently=True)
+        op.create_index(
+            "ix_refresh_token_token_hash",
+            "refresh_token",
+            ["token_hash"],
+            unique=True,
+            if_not_exists=True,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    # Tokens issued by the new release have no raw value and cannot be kept
+    op.execute("DELETE FROM refresh_token WHERE token IS NULL")
+    op.execute("DROP TRIGGER IF EXISTS refresh_token_hash_token ON refresh_token")
+    op.execute("DROP FUNCTION IF EXISTS refresh_token_hash_token()")
+    op.drop_index("ix_refresh_token_token_hash", table_name="refresh_token", if_exists=True)
+    op.execute("ALTER TABLE refresh_token DROP COLUMN IF EXISTS token_hash")
+    op.alter_column("refresh_token", "token", nullable=False)
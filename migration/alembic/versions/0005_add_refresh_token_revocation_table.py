@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "refresh_token_revocation",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.text("CURRENT_TIMESTAMP"),
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("key"),
+    )
+    # Workers poll new revocations by created_at; the purge finds expired entries by expires_at
+    op.create_index("ix_refresh_token_revocation_created_at", "refresh_token_revocation", ["created_at"], unique=False)
+    op.create_index("ix_refresh_token_revocation_expires_at", "refresh_token_revocation", ["expires_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_refresh_token_revocation_expires_at", table_name="refresh_token_revocation")
+    op.drop_index("ix_refresh_token_revocation_created_at", table_name="refresh_token_revocation")
+    op.drop_table("refresh_token_revocation")
@@ -0,0 +1,60 @@
+"""Finish storing refresh tokens as SHA-256 digests (contract step of ``0004``).
+
+Run this only once every worker runs the release that writes ``token_hash``:
+from then on no row can be inserted without it. It sits above
+``migration.runner.RELEASE_REVISION``, so startup does not apply it; it ships
+with the next release, or is applied with ``MIGRATE_TARGET=head``.
+
+A validated CHECK lets SET NOT NULL skip its full-table scan under an
+exclusive lock. The raw ``token`` column and the trigger that hashed it are
+dropped. Every step is idempotent.
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE refresh_token DROP CONSTRAINT IF EXISTS ck_refresh_token_token_hash_not_null")
+    op.execute(
+        "ALTER TABLE refresh_token ADD CONSTRAINT ck_refresh_token_token_hash_not_null "
+        "CHECK (token_hash IS NOT NULL) NOT VALID"
+    )
+    op.execute("ALTER TABLE refresh_token VALIDATE CONSTRAINT ck_refresh_token_token_hash_not_null")
+    op.alter_column("refresh_token", "token_hash", nullable=False)
+    op.execute("ALTER TABLE refresh_token DROP CONSTRAINT ck_refresh_token_token_hash_not_null")
+
+    op.execute("DROP TRIGGER IF EXISTS refresh_token_hash_token ON refresh_token")
+    op.execute("DROP FUNCTION IF EXISTS refresh_token_hash_token()")
+    op.drop_index("ix_refresh_token_token", table_name="refresh_token", if_exists=True)
+    op.execute("ALTER TABLE refresh_token DROP COLUMN IF EXISTS token")
+
+
+def downgrade() -> None:
+    # Back to the state after 0004; the raw values of existing tokens are gone, so they stay NULL
+    op.add_column("refresh_token", sa.Column("token", sa.String(), nullable=True))
+    op.create_index("ix_refresh_token_token", "refresh_token", ["token"], unique=True)
+    op.alter_column("refresh_token", "token_hash", nullable=True)
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION refresh_token_hash_token() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.token IS NOT NULL THEN
+                NEW.token_hash := sha256(convert_to(NEW.token, 'UTF8'));
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        "CREATE TRIGGER refresh_token_hash_token BEFORE INSERT OR UPDATE OF token ON refresh_token "
+        "FOR EACH ROW EXECUTE FUNCTION refresh_token_hash_token()"
+    )
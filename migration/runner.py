@@ -1,12 +1,21 @@
 from __future__ import annotations
 
+import os
 from pathlib import Path
 
 from alembic.command import upgrade
 from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, pool
 
 from conf.config import settings
 
+# Highest revision this release applies on startup. Contract migrations above it (0006 drops the
+# raw refresh token column the previous release still reads) ship with the next release, once no
+# worker or rollback image runs code that needs the old schema. Raise it in that release.
+RELEASE_REVISION = "0005"
+
 
 def _alembic_config() -> Config:
     migration_dir = Path(__file__).resolve().parent
@@ -16,5 +25,30 @@ def _alembic_config() -> Config:
     return alembic_cfg
 
 
+def _current_revision() -> str | None:
+    engine = create_engine(settings.database_url, poolclass=pool.NullPool)
+    try:
+        with engine.connect() as connection:
+            return MigrationContext.configure(connection).get_current_revision()
+    finally:
+        engine.dispose()
+
+
 def upgrade_head() -> None:
     upgrade(_alembic_config(), "head")
+
+
+def upgrade_release() -> None:
+    """Upgrade to ``MIGRATE_TARGET`` (e.g. ``head``) if set, else to `RELEASE_REVISION`.
+
+    A database already past the target is left alone, so an older image started
+    for a rollback does not fail on a schema a later release has migrated.
+    """
+    config = _alembic_config()
+    target = os.environ.get("MIGRATE_TARGET") or RELEASE_REVISION
+    current = _current_revision()
+    if current is not None:
+        applied = {script.revision for script in ScriptDirectory.from_config(config).iterate_revisions(current, "base")}
+        if target in applied:
+            return
+    upgrade(config, target)
@@ -0,0 +1,10 @@
+#!/usr/bin/env bash
+set -euo pipefail
+
+ROOT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
+cd "$ROOT_DIR"
+
+export PYTHONPATH="${PYTHONPATH:-$ROOT_DIR/src}"
+
+# Extra arguments are passed through, e.g. ./scripts/bench.sh --save-baseline --db postgres
+uv run --extra dev python benchmarks/http_bench.py "$@"
@@ -114,8 +114,8 @@ rollback() {
         log_info "Rolling back to previous version..."
         docker compose -f "$COMPOSE_FILE" down --remove-orphans || true
         
-        # Use rollback image
-        DOCKER_IMAGE=fastapi-boilerplate:rollback docker compose -f "$COMPOSE_FILE" up -d
+        # Use rollback image; it must not migrate a schema the failed release already moved ahead
+        DOCKER_IMAGE=fastapi-boilerplate:rollback SKIP_MIGRATIONS=1 docker compose -f "$COMPOSE_FILE" up -d
         
         if health_check; then
             log_info "Rollback successful!"
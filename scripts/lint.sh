@@ -5,11 +5,11 @@ ROOT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
 cd "$ROOT_DIR"
 
 echo "=== Running ruff check ==="
-if ! uv run ruff check src tests; then
+if ! uv run ruff check src tests benchmarks; then
     read -rn1 -p "Lint check failed. Run ruff check --fix? [y/n] " answer
     echo
     if [[ "$answer" == [yY] ]]; then
-        uv run ruff check --fix src tests
+        uv run ruff check --fix src tests benchmarks
         echo "Fix complete."
     else
         echo "Skipped fix."
@@ -19,11 +19,11 @@ fi
 
 echo ""
 echo "=== Running ruff format check ==="
-if ! uv run ruff format --check src tests; then
+if ! uv run ruff format --check src tests benchmarks; then
     read -rn1 -p "Format check failed. Run ruff format? [y/n] " answer
     echo
     if [[ "$answer" == [yY] ]]; then
-        uv run ruff format src tests
+        uv run ruff format src tests benchmarks
         echo "Format complete."
     else
         echo "Skipped formatting."
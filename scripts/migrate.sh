@@ -3,14 +3,22 @@ set -e
 
 cd "$(dirname "$0")/.."
 
+# Rollbacks start the previous image against the current schema without migrating it
+if [ -n "$SKIP_MIGRATIONS" ]; then
+    echo "SKIP_MIGRATIONS is set, not migrating."
+    exit 0
+fi
+
+# Migrates up to this release's revision (migration/runner.py); set MIGRATE_TARGET=head
+# to also apply contract migrations once no running worker needs the old schema
 echo "Running database migrations..."
 
 # Docker: PYTHONPATH is pre-configured
 # Local: need to set PYTHONPATH to include src and project root
 if [ -n "$PYTHONPATH" ]; then
-    python -c "from migration.runner import upgrade_head; upgrade_head()"
+    python -c "from migration.runner import upgrade_release; upgrade_release()"
 else
-    PYTHONPATH="src:." uv run python -c "from migration.runner import upgrade_head; upgrade_head()"
+    PYTHONPATH="src:." uv run python -c "from migration.runner import upgrade_release; upgrade_release()"
 fi
 
 echo "Database migrations completed."
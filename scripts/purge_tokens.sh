@@ -0,0 +1,14 @@
+#!/bin/bash
+set -e
+
+cd "$(dirname "$0")/.."
+
+echo "Purging expired and revoked refresh tokens..."
+
+# Docker: PYTHONPATH is pre-configured
+# Local: need to set PYTHONPATH to include src
+if [ -n "$PYTHONPATH" ]; then
+    python -m auth.sweeper
+else
+    PYTHONPATH="src" uv run python -m auth.sweeper
+fi
@@ -23,3 +23,8 @@ class RefreshTokenResponse(BaseModel):
 
 class LogoutResponse(BaseModel):
     message: str = "Successfully logged out"
+
+
+class LogoutAllResponse(BaseModel):
+    message: str = "Successfully logged out from all devices"
+    revoked: int
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordRequestForm
 
 from auth import dto, service
 from common import erri
+from common.response import FastJSONResponse
 from middleware import auth
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -10,17 +11,21 @@ router = APIRouter(prefix="/auth", tags=["auth"])
 
 @auth.exempt
 @router.post("/login", response_model=dto.LoginResponse)
-async def login(form_data: OAuth2PasswordRequestForm = Depends()) -> dto.LoginResponse:
+async def login(form_data: OAuth2PasswordRequestForm = Depends()) -> FastJSONResponse:
     """Authenticate user and return access and refresh tokens."""
     try:
-        token_pair = service.login_user(form_data.username, form_data.password)
-        return dto.LoginResponse(
-            access_token=token_pair.access_token,
-            refresh_token=token_pair.refresh_token,
-            expires_in=token_pair.expires_in,
-            refresh_token_expires_in=token_pair.refresh_token_expires_in,
+        token_pair = await service.login_user(form_data.username, form_data.password)
+        return FastJSONResponse(
+            dto.LoginResponse(
+                access_token=token_pair.access_token,
+                refresh_token=token_pair.refresh_token,
+                expires_in=token_pair.expires_in,
+                refresh_token_expires_in=token_pair.refresh_token_expires_in,
+            )
         )
     except erri.BusinessError as e:
+        if e.status_code == 503:
+            raise HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers) from None
         # OAuth2 standard error format (RFC 6749 Section 5.2)
         raise HTTPException(
             status_code=400,
@@ -30,26 +35,39 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()) -> dto.LoginRe
 
 @auth.exempt
 @router.post("/refresh", response_model=dto.RefreshTokenResponse)
-async def refresh(body: dto.RefreshTokenRequest) -> dto.RefreshTokenResponse:
+async def refresh(body: dto.RefreshTokenRequest) -> FastJSONResponse:
     """Refresh access token using a valid refresh token.
 
     Implements Token Rotation: the old refresh token is revoked and a new one is issued.
     """
     try:
-        token_pair = service.refresh_tokens(body.refresh_token)
-        return dto.RefreshTokenResponse(
-            access_token=token_pair.access_token,
-            refresh_token=token_pair.refresh_token,
-            expires_in=token_pair.expires_in,
-            refresh_token_expires_in=token_pair.refresh_token_expires_in,
+        token_pair = await service.refresh_tokens(body.refresh_token)
+        return FastJSONResponse(
+            dto.RefreshTokenResponse(
+                access_token=token_pair.access_token,
+                refresh_token=token_pair.refresh_token,
+                expires_in=token_pair.expires_in,
+                refresh_token_expires_in=token_pair.refresh_token_expires_in,
+            )
         )
     except erri.BusinessError as e:
-        raise HTTPException(status_code=e.status_code, detail=e.detail) from None
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers) from None
 
 
 @auth.exempt
 @router.post("/logout", response_model=dto.LogoutResponse)
-async def logout(body: dto.RefreshTokenRequest) -> dto.LogoutResponse:
+async def logout(body: dto.RefreshTokenRequest) -> FastJSONResponse:
     """Logout by revoking the refresh token."""
-    service.revoke_token(body.refresh_token)
-    return dto.LogoutResponse()
+    await service.revoke_token(body.refresh_token)
+    return FastJSONResponse(dto.LogoutResponse())
+
+
+@router.post("/logout-all", response_model=dto.LogoutAllResponse)
+async def logout_all(request: Request) -> FastJSONResponse:
+    """Logout everywhere by revoking all refresh tokens of the current user."""
+    try:
+        username = auth.get_username(request)
+        revoked = await service.revoke_all_tokens(username)
+        return FastJSONResponse(dto.LogoutAllResponse(revoked=revoked))
+    except erri.BusinessError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers) from None
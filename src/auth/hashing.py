@@ -0,0 +1,96 @@
+"""Password hashing primitives.
+
+Hashes are stored in a versioned, self-describing format::
+
+    $scrypt$n=16384,r=8,p=1$<salt>$<digest>
+
+Legacy hashes (a bare SHA-512 hex digest of ``password + PASSWORD_SALT``) are
+still accepted by `verify_password` and reported as needing a rehash.
+"""
+
+import base64
+import hashlib
+import hmac
+import secrets
+
+_SCHEME = "scrypt"
+_SALT_BYTES = 16
+_DIGEST_BYTES = 64
+_LEGACY_HEX_LENGTH = 128
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii").rstrip("=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.b64decode(data + "=" * (-len(data) % 4))
+
+
+def _scrypt(password: str, salt: bytes, *, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        password.encode("utf-8"),
+        salt=salt,
+        n=n,
+        r=r,
+        p=p,
+        maxmem=256 * n * r,
+        dklen=_DIGEST_BYTES,
+    )
+
+
+def _format(salt: bytes, digest: bytes, *, n: int, r: int, p: int) -> str:
+    return f"${_SCHEME}$n={n},r={r},p={p}${_b64encode(salt)}${_b64encode(digest)}"
+
+
+def _parse(hashed: str) -> tuple[int, int, int, bytes, bytes] | None:
+    parts = hashed.split("$")
+    if len(parts) != 5 or parts[0] or parts[1] != _SCHEME:
+        return None
+    try:
+        params = dict(item.split("=", 1) for item in parts[2].split(","))
+        return int(params["n"]), int(params["r"]), int(params["p"]), _b64decode(parts[3]), _b64decode(parts[4])
+    except (KeyError, ValueError):
+        return None
+
+
+def hash_password(password: str, *, n: int, r: int, p: int) -> str:
+    """Hash a password with a fresh random salt."""
+    salt = secrets.token_bytes(_SALT_BYTES)
+    return _format(salt, _scrypt(password, salt, n=n, r=r, p=p), n=n, r=r, p=p)
+
+
+def dummy_hash(*, n: int, r: int, p: int) -> str:
+    """Return a well-formed hash that matches no password.
+
+    Verifying against it costs the same as verifying a real hash, which keeps
+    login timing independent of whether the user exists.
+    """
+    return _format(bytes(_SALT_BYTES), bytes(_DIGEST_BYTES), n=n, r=r, p=p)
+
+
+def is_legacy_hash(hashed: str) -> bool:
+    return len(hashed) == _LEGACY_HEX_LENGTH and not hashed.startswith("$")
+
+
+def legacy_hash(password: str, salt: str) -> str:
+    """Compute the pre-scrypt SHA-512 hash, kept only to verify old rows."""
+    return hashlib.sha512((password + salt).encode("utf-8")).hexdigest()
+
+
+def verify_password(password: str, hashed: str, *, legacy_salt: str, n: int, r: int, p: int) -> tuple[bool, bool]:
+    """Check a password against a stored hash.
+
+    Returns:
+        A tuple of (matches, needs_rehash). ``needs_rehash`` is True when the
+        stored hash is legacy or uses parameters other than the current ones.
+    """
+    if is_legacy_hash(hashed):
+        return hmac.compare_digest(legacy_hash(password, legacy_salt), hashed), True
+
+    parsed = _parse(hashed)
+    if parsed is None:
+        return False, False
+    stored_n, stored_r, stored_p, salt, digest = parsed
+    matches = hmac.compare_digest(_scrypt(password, salt, n=stored_n, r=stored_r, p=stored_p), digest)
+    return matches, (stored_n, stored_r, stored_p) != (n, r, p)
@@ -1,61 +1,136 @@
+import hashlib
 import secrets
 from datetime import UTC, datetime, timedelta
 
-from sqlmodel import Field, Session, SQLModel, select
+from loguru import logger
+from sqlalchemy import Index, LargeBinary, delete, insert, literal, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Field, SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.sql.expression import SelectOfScalar
 
 from conf.config import settings
-from conf.db import engine
+from conf.db import engine, timed_query
+from user.model import User
 
 
 class RefreshToken(SQLModel, table=True):
     __tablename__ = "refresh_token"
+    __table_args__ = (
+        # Only live tokens are looked up by user, so revoked rows stay out of this index
+        Index(
+            "ix_refresh_token_active_user_id",
+            "user_id",
+            postgresql_where=text("NOT revoked"),
+            sqlite_where=text("NOT revoked"),
+        ),
+        # The purge finds long-revoked rows by revocation time; live rows stay out of this index
+        Index(
+            "ix_refresh_token_revoked_at",
+            "revoked_at",
+            postgresql_where=text("revoked"),
+            sqlite_where=text("revoked"),
+        ),
+    )
 
     id: int | None = Field(default=None, primary_key=True)
-    token: str = Field(unique=True, index=True)
-    user_id: int = Field(index=True)
+    # SHA-256 of the token; the raw token is only ever handed to the client
+    token_hash: bytes = Field(sa_type=LargeBinary(32), unique=True, index=True)
+    user_id: int
     username: str
-    expires_at: datetime
+    expires_at: datetime = Field(index=True)
     revoked: bool = Field(default=False)
+    revoked_at: datetime | None = Field(default=None)
     created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
 
 
+class RefreshTokenRevocation(SQLModel, table=True):
+    """Revocation entry for stateless (JWT) refresh tokens.
+
+    ``kind`` is one of:
+      - ``token``: ``key`` is a spent token id (jti), written on rotation and logout
+      - ``family``: ``key`` is a revoked token family, e.g. after reuse was detected
+      - ``user``: tokens of ``user_id`` issued up to ``created_at`` are revoked; ``key`` is random
+    Rows can be deleted once ``expires_at`` has passed, when no token they cover is valid anymore.
+    """
+
+    __tablename__ = "refresh_token_revocation"
+
+    id: int | None = Field(default=None, primary_key=True)
+    kind: str
+    key: str = Field(unique=True)
+    user_id: int
+    expires_at: datetime = Field(index=True)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(UTC), index=True)
+
+
 def generate_refresh_token() -> str:
     """Generate a cryptographically secure random token."""
     return secrets.token_urlsafe(32)
 
 
-def create_refresh_token(user_id: int, username: str) -> RefreshToken:
-    """Create and store a new refresh token for the user."""
-    token = generate_refresh_token()
-    expires_at = datetime.now(UTC) + timedelta(seconds=settings.refresh_token_expire_seconds)
+def hash_refresh_token(token: str) -> bytes:
+    """Digest under which a refresh token is stored and looked up."""
+    return hashlib.sha256(token.encode()).digest()
 
-    refresh_token = RefreshToken(
-        token=token,
-        user_id=user_id,
-        username=username,
-        expires_at=expires_at,
-    )
 
-    with Session(engine) as session:
-        session.add(refresh_token)
-        session.commit()
-        session.refresh(refresh_token)
+@timed_query
+async def create_refresh_token(
+    user_id: int, username: str, *, password_hash: str | None = None
+) -> tuple[str, RefreshToken] | None:
+    """Create and store a new refresh token for the user in one INSERT ... RETURNING.
 
-    return refresh_token
+    With ``password_hash`` the row is inserted by ``INSERT ... SELECT`` from the
+    user row, and only if the user still has that password hash: a login racing
+    a password change or account removal does not get a token.
+
+    Returns:
+        A tuple of (token, stored row), or None if the password check failed.
+        Only the hash of the token is stored.
+    """
+    token = generate_refresh_token()
+    now = datetime.now(UTC)
+    values = {
+        "token_hash": hash_refresh_token(token),
+        "user_id": user_id,
+        "username": username,
+        "expires_at": now + timedelta(seconds=settings.refresh_token_expire_seconds),
+        "revoked": False,
+        "created_at": now,
+    }
+
+    if password_hash is None:
+        statement = insert(RefreshToken).values(**values)
+    else:
+        columns = RefreshToken.__table__.c  # type: ignore[attr-defined]
+        source = select(*(literal(value, columns[name].type) for name, value in values.items())).where(
+            User.id == user_id, User.password == password_hash
+        )
+        statement = insert(RefreshToken).from_select(list(values), source)
+
+    async with AsyncSession(engine) as session:
+        token_id = (await session.exec(statement.returning(RefreshToken.id))).scalar_one_or_none()
+        if token_id is None:
+            return None
+        await session.commit()
+
+    return token, RefreshToken(id=token_id, **values)
 
 
-def get_refresh_token(token: str) -> RefreshToken | None:
+@timed_query
+async def get_refresh_token(token: str) -> RefreshToken | None:
     """Get a refresh token by its token string."""
-    with Session(engine) as session:
-        return session.exec(select(RefreshToken).where(RefreshToken.token == token)).one_or_none()
+    statement = select(RefreshToken).where(RefreshToken.token_hash == hash_refresh_token(token))
+    async with AsyncSession(engine) as session:
+        return (await session.exec(statement)).one_or_none()
 
 
-def validate_refresh_token(token: str) -> RefreshToken | None:
+async def validate_refresh_token(token: str) -> RefreshToken | None:
     """Validate a refresh token and return it if valid.
 
     Returns None if the token is invalid, expired, or revoked.
     """
-    refresh_token = get_refresh_token(token)
+    refresh_token = await get_refresh_token(token)
     if not refresh_token:
         return None
 
@@ -75,85 +150,198 @@ def validate_refresh_token(token: str) -> RefreshToken | None:
     return refresh_token
 
 
-def revoke_refresh_token(token: str) -> bool:
+@timed_query
+async def revoke_refresh_token(token: str) -> bool:
     """Revoke a refresh token.
 
     Returns True if the token was found and revoked, False otherwise.
     """
-    with Session(engine) as session:
-        refresh_token = session.exec(select(RefreshToken).where(RefreshToken.token == token)).one_or_none()
+    statement = select(RefreshToken).where(RefreshToken.token_hash == hash_refresh_token(token))
+    async with AsyncSession(engine) as session:
+        refresh_token = (await session.exec(statement)).one_or_none()
 
         if not refresh_token:
             return False
 
         refresh_token.revoked = True
+        refresh_token.revoked_at = datetime.now(UTC)
         session.add(refresh_token)
-        session.commit()
+        await session.commit()
 
     return True
 
 
-def revoke_all_user_tokens(user_id: int) -> int:
-    """Revoke all refresh tokens for a user.
+@timed_query
+async def revoke_all_user_tokens(user_id: int) -> int:
+    """Revoke all refresh tokens for a user in a single UPDATE.
 
     Returns the number of tokens revoked.
     """
-    with Session(engine) as session:
-        tokens = session.exec(
-            select(RefreshToken).where(
-                RefreshToken.user_id == user_id,
-                RefreshToken.revoked == False,  # noqa: E712
-            )
-        ).all()
+    statement = (
+        update(RefreshToken)
+        .where(RefreshToken.user_id == user_id, RefreshToken.revoked == False)  # noqa: E712
+        .values(revoked=True, revoked_at=datetime.now(UTC))
+        .returning(RefreshToken.id)
+    )
+    async with AsyncSession(engine) as session:
+        revoked_ids = (await session.exec(statement)).all()
+        await session.commit()
+
+    return len(revoked_ids)
 
-        count = 0
-        for token in tokens:
-            token.revoked = True
-            session.add(token)
-            count += 1
 
-        session.commit()
+async def _spend(session: AsyncSession, token: str, now: datetime) -> tuple[int, str] | None:
+    """Revoke a live, unexpired token by a conditional UPDATE and return its (user_id, username).
 
-    return count
+    Of two concurrent calls for the same token exactly one gets the owner.
+    """
+    token_hash = hash_refresh_token(token)
+    revoke = (
+        update(RefreshToken)
+        .where(
+            RefreshToken.token_hash == token_hash,
+            RefreshToken.revoked == False,  # noqa: E712
+            RefreshToken.expires_at > now,
+        )
+        .values(revoked=True, revoked_at=now)
+        .returning(RefreshToken.user_id, RefreshToken.username)
+    )
+    owner = (await session.exec(revoke)).one_or_none()
+    if owner is None:
+        # Rare path: find out whether a revoked token was replayed
+        revoked = await session.exec(
+            select(RefreshToken.username).where(RefreshToken.token_hash == token_hash, RefreshToken.revoked == True)  # noqa: E712
+        )
+        username = revoked.one_or_none()
+        if username is not None:
+            logger.warning("Revoked refresh token presented for user {}", username)
+        return None
+    return owner.user_id, owner.username
 
 
-def rotate_refresh_token(old_token: str) -> RefreshToken | None:
+@timed_query
+async def rotate_refresh_token(old_token: str) -> tuple[str, RefreshToken] | None:
     """Atomically rotate a refresh token.
 
-    Validates, revokes the old token, and creates a new one in a single transaction.
-    Returns None if the old token is invalid/expired/revoked.
-    """
-    with Session(engine) as session:
-        # Query within the transaction
-        token_obj = session.exec(select(RefreshToken).where(RefreshToken.token == old_token)).one_or_none()
-
-        if not token_obj or token_obj.revoked:
-            return None
+    The old token is revoked by a conditional UPDATE that only matches a live,
+    unexpired token, so of two concurrent rotations of the same token exactly
+    one wins. The new token is inserted in the same transaction.
 
-        now = datetime.now(UTC)
-        # Ensure both datetimes are timezone-aware for comparison
-        expires_at = (
-            token_obj.expires_at.replace(tzinfo=UTC) if token_obj.expires_at.tzinfo is None else token_obj.expires_at
-        )
-        if expires_at < now:
+    Returns:
+        A tuple of (new token, stored row), or None if the old token is
+        invalid/expired/revoked.
+    """
+    now = datetime.now(UTC)
+    # Keep the new row usable after commit without reloading it
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        owner = await _spend(session, old_token, now)
+        if owner is None:
             return None
 
-        # Revoke old token
-        token_obj.revoked = True
-        session.add(token_obj)
-
-        # Create new token
+        user_id, username = owner
         new_token = generate_refresh_token()
-        expires_at = now + timedelta(seconds=settings.refresh_token_expire_seconds)
         new_refresh_token = RefreshToken(
-            token=new_token,
-            user_id=token_obj.user_id,
-            username=token_obj.username,
-            expires_at=expires_at,
+            token_hash=hash_refresh_token(new_token),
+            user_id=user_id,
+            username=username,
+            expires_at=now + timedelta(seconds=settings.refresh_token_expire_seconds),
         )
         session.add(new_refresh_token)
+        # The INSERT fetches the generated id with RETURNING
+        await session.flush()
+        await session.commit()
+
+    return new_token, new_refresh_token
+
+
+@timed_query
+async def spend_refresh_token(token: str) -> tuple[int, str] | None:
+    """Revoke a live refresh token without issuing a successor.
+
+    Used to move an opaque session onto a stateless token in ``jwt`` mode.
+
+    Returns:
+        A tuple of (user_id, username), or None if the token is invalid/expired/revoked.
+    """
+    async with AsyncSession(engine) as session:
+        owner = await _spend(session, token, datetime.now(UTC))
+        if owner is not None:
+            await session.commit()
+    return owner
 
-        session.commit()
-        session.refresh(new_refresh_token)
 
-        return new_refresh_token
+@timed_query
+async def purge_expired_refresh_tokens(*, before: datetime, limit: int) -> int:
+    """Delete up to ``limit`` tokens that expired before the given time, found through their expiry index.
+
+    Rows are picked by id in a subquery so each call is one short transaction,
+    the portable equivalent of ``DELETE ... LIMIT``. Returns the number deleted.
+    """
+    batch = select(RefreshToken.id).where(RefreshToken.expires_at < before).limit(limit)
+    return await _delete_refresh_tokens(batch)
+
+
+@timed_query
+async def purge_revoked_refresh_tokens(*, before: datetime, limit: int) -> int:
+    """Delete up to ``limit`` tokens revoked before the given time, found through the partial revoked_at index.
+
+    Rows revoked without a revoked_at (by a release that did not record it)
+    are left to `purge_expired_refresh_tokens`. Returns the number deleted.
+    """
+    batch = (
+        select(RefreshToken.id)
+        .where(RefreshToken.revoked == True, RefreshToken.revoked_at < before)  # type: ignore[operator]  # noqa: E712
+        .limit(limit)
+    )
+    return await _delete_refresh_tokens(batch)
+
+
+async def _delete_refresh_tokens(batch: SelectOfScalar[int | None]) -> int:
+    async with AsyncSession(engine) as session:
+        result = await session.exec(delete(RefreshToken).where(RefreshToken.id.in_(batch.scalar_subquery())))  # type: ignore[union-attr]
+        await session.commit()
+    return result.rowcount
+
+
+@timed_query
+async def add_revocation(revocation: RefreshTokenRevocation) -> bool:
+    """Insert a revocation entry.
+
+    Returns False if an entry with the same key already exists, which for a
+    spent token id means the token is being reused.
+    """
+    # The caller keeps using the entry after commit
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        session.add(revocation)
+        try:
+            await session.commit()
+        except IntegrityError:
+            return False
+    return True
+
+
+@timed_query
+async def list_revocations(*, since: datetime, kinds: tuple[str, ...]) -> list[RefreshTokenRevocation]:
+    """Get the revocation entries of the given kinds created after ``since``, oldest first."""
+    statement = (
+        select(RefreshTokenRevocation)
+        .where(RefreshTokenRevocation.created_at > since, RefreshTokenRevocation.kind.in_(kinds))  # type: ignore[attr-defined]
+        .order_by(RefreshTokenRevocation.created_at)  # type: ignore[arg-type]
+    )
+    async with AsyncSession(engine) as session:
+        return list((await session.exec(statement)).all())
+
+
+@timed_query
+async def purge_revocations(*, expired_before: datetime, limit: int) -> int:
+    """Delete up to ``limit`` revocation entries that expired before the given time.
+
+    Returns the number deleted.
+    """
+    batch = select(RefreshTokenRevocation.id).where(RefreshTokenRevocation.expires_at < expired_before).limit(limit)
+    async with AsyncSession(engine) as session:
+        result = await session.exec(
+            delete(RefreshTokenRevocation).where(RefreshTokenRevocation.id.in_(batch.scalar_subquery()))  # type: ignore[union-attr]
+        )
+        await session.commit()
+    return result.rowcount
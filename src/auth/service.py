@@ -1,14 +1,29 @@
-import hashlib
 import time
+from collections.abc import Callable
 from dataclasses import dataclass
-from functools import cache
+from functools import cache, partial
 
 from jwt import PyJWT
-
-from auth.model import create_refresh_token, revoke_refresh_token, rotate_refresh_token
-from common import erri
+from loguru import logger
+
+from auth import hashing, stateless
+from auth.model import (
+    create_refresh_token,
+    revoke_all_user_tokens,
+    revoke_refresh_token,
+    rotate_refresh_token,
+    spend_refresh_token,
+)
+from common import erri, metrics
+from common.executor import BoundedExecutor, ExecutorSaturatedError
 from conf.config import settings
-from user.model import User, get_user
+from user.model import User, get_user, replace_password_hash
+
+_HASH_DURATION = metrics.registry.histogram(
+    "password_hash_duration_seconds",
+    "Password hashing and verification time, including queueing on the hashing pool",
+    ("operation",),
+)
 
 
 @cache
@@ -16,6 +31,22 @@ def _jwt() -> PyJWT:
     return PyJWT()
 
 
+@cache
+def _hash_executor() -> BoundedExecutor:
+    return BoundedExecutor(
+        max_workers=settings.password_hash_workers,
+        max_queue=settings.password_hash_max_queue,
+        thread_name_prefix="password-hash",
+    )
+
+
+def shutdown_hash_executor() -> None:
+    """Stop the hashing pool if it was started, cancelling queued jobs; called on application shutdown."""
+    if _hash_executor.cache_info().currsize:
+        _hash_executor().shutdown()
+        _hash_executor.cache_clear()
+
+
 @dataclass
 class TokenPair:
     """A pair of access and refresh tokens."""
@@ -26,9 +57,39 @@ class TokenPair:
     refresh_token_expires_in: int
 
 
-def get_password_hash(password: str) -> str:
-    """Hash a password with the configured salt."""
-    return hashlib.sha512((password + settings.password_salt).encode("utf-8")).hexdigest()
+async def _run_hash_job[T](operation: str, fn: Callable[..., T], *args: object) -> T:
+    start = time.perf_counter()
+    try:
+        return await _hash_executor().run(fn, *args)
+    except ExecutorSaturatedError:
+        raise erri.service_unavailable("Server is busy, please retry later") from None
+    finally:
+        _HASH_DURATION.observe(time.perf_counter() - start, operation)
+
+
+def _kdf_params() -> dict[str, int]:
+    return {"n": settings.password_hash_n, "r": settings.password_hash_r, "p": settings.password_hash_p}
+
+
+async def get_password_hash(password: str) -> str:
+    """Hash a password with scrypt on the bounded hashing pool."""
+    return await _run_hash_job("hash", partial(hashing.hash_password, password, **_kdf_params()))
+
+
+async def verify_password(password: str, hashed_password: str) -> tuple[bool, bool]:
+    """Verify a password on the bounded hashing pool.
+
+    Returns:
+        A tuple of (matches, needs_rehash).
+    """
+    verify = partial(
+        hashing.verify_password,
+        password,
+        hashed_password,
+        legacy_salt=settings.password_salt,
+        **_kdf_params(),
+    )
+    return await _run_hash_job("verify", verify)
 
 
 def create_access_token(username: str) -> tuple[str, int]:
@@ -44,31 +105,46 @@ def create_access_token(username: str) -> tuple[str, int]:
     return token, expires_in
 
 
-def create_token(user: User) -> TokenPair:
-    """Create access and refresh tokens for the user.
+async def create_token(user: User) -> TokenPair:
+    """Create access and refresh tokens for a user whose password was just verified.
+
+    The opaque refresh token is only stored if ``user.password`` is still the
+    user's password hash in the database, checked by the same statement.
 
     Returns:
         A TokenPair containing access_token, refresh_token, and expiration info.
+
+    Raises:
+        BusinessError: If the user was removed or changed password meanwhile.
     """
     if user.id is None:
         raise erri.internal("User ID is required for token creation")
 
     access_token, expires_in = create_access_token(user.username)
-    refresh_token_obj = create_refresh_token(user.id, user.username)
+    if settings.refresh_token_mode == "jwt":
+        refresh_token = stateless.issue(user.id, user.username)
+    else:
+        issued = await create_refresh_token(user.id, user.username, password_hash=user.password)
+        if issued is None:
+            raise erri.unauthorized("Invalid credentials")
+        refresh_token, _ = issued
 
     return TokenPair(
         access_token=access_token,
-        refresh_token=refresh_token_obj.token,
+        refresh_token=refresh_token,
         expires_in=expires_in,
         refresh_token_expires_in=settings.refresh_token_expire_seconds,
     )
 
 
-def refresh_tokens(refresh_token: str) -> TokenPair:
+async def refresh_tokens(refresh_token: str) -> TokenPair:
     """Refresh the access token using a refresh token.
 
     Implements Token Rotation: the old refresh token is revoked and a new one is issued.
-    Uses a database transaction to ensure atomicity.
+    Opaque tokens are rotated in one database transaction. In ``jwt`` mode, stateless
+    tokens are rotated by `stateless.rotate`, and an opaque token issued before the
+    switch is revoked and replaced by a stateless one, so the session stops using
+    the database on its next refresh.
 
     Returns:
         A new TokenPair with fresh access and refresh tokens.
@@ -76,37 +152,78 @@ def refresh_tokens(refresh_token: str) -> TokenPair:
     Raises:
         BusinessError: If the refresh token is invalid, expired, or revoked.
     """
-    new_refresh_token = rotate_refresh_token(refresh_token)
-    if not new_refresh_token:
+    if settings.refresh_token_mode == "jwt" and stateless.is_stateless_token(refresh_token):
+        rotated = await stateless.rotate(refresh_token)
+    elif settings.refresh_token_mode == "jwt":
+        owner = await spend_refresh_token(refresh_token)
+        rotated = (owner[1], stateless.issue(*owner)) if owner else None
+    else:
+        stored = await rotate_refresh_token(refresh_token)
+        rotated = (stored[1].username, stored[0]) if stored else None
+    if not rotated:
+        logger.info("Rejected refresh token")
         raise erri.unauthorized("Invalid or expired refresh token")
 
-    access_token, expires_in = create_access_token(new_refresh_token.username)
+    username, new_refresh_token = rotated
+    access_token, expires_in = create_access_token(username)
 
     return TokenPair(
         access_token=access_token,
-        refresh_token=new_refresh_token.token,
+        refresh_token=new_refresh_token,
         expires_in=expires_in,
         refresh_token_expires_in=settings.refresh_token_expire_seconds,
     )
 
 
-def revoke_token(refresh_token: str) -> bool:
+async def revoke_token(refresh_token: str) -> bool:
     """Revoke a refresh token.
 
     Returns:
         True if the token was revoked, False if it was not found.
     """
-    return revoke_refresh_token(refresh_token)
+    if settings.refresh_token_mode == "jwt" and stateless.is_stateless_token(refresh_token):
+        return await stateless.revoke(refresh_token)
+    return await revoke_refresh_token(refresh_token)
+
+
+async def revoke_all_tokens(username: str) -> int:
+    """Revoke every refresh token of the user, logging them out on all devices.
+
+    Access tokens already issued stay valid until they expire.
+
+    Returns:
+        The number of opaque refresh tokens revoked. Stateless tokens are revoked
+        by a cutoff and not counted.
+    """
+    user = await get_user(username)
+    if not user or user.id is None:
+        raise erri.not_found("User not found")
+    count = await revoke_all_user_tokens(user.id)
+    if settings.refresh_token_mode == "jwt":
+        await stateless.revoke_user(user.id)
+    logger.info("Revoked {} refresh tokens for user {}", count, username)
+    return count
 
 
-def login_user(username: str, password: str) -> TokenPair:
+async def login_user(username: str, password: str) -> TokenPair:
     """Authenticate user and create tokens.
 
     Returns:
         A TokenPair containing access_token, refresh_token, and expiration info.
     """
-    user = get_user(username)
-    encrypted_password = get_password_hash(password)
-    if not user or user.password != encrypted_password or user.id is None:
+    user = await get_user(username)
+    # Always run the KDF, even for unknown users, so timing does not reveal which usernames exist
+    hashed_password = user.password if user else hashing.dummy_hash(**_kdf_params())
+    matches, needs_rehash = await verify_password(password, hashed_password)
+    if not user or not matches or user.id is None:
+        logger.info("Login failed for user {}", username)
         raise erri.unauthorized("Invalid credentials")
-    return create_token(user)
+    if needs_rehash:
+        new_hash = await get_password_hash(password)
+        stored = await replace_password_hash(user.username, user.password, new_hash)
+        # A concurrent login may have upgraded it first; a password changed meanwhile must still fail
+        if stored is None or (stored != new_hash and not (await verify_password(password, stored))[0]):
+            raise erri.unauthorized("Invalid credentials")
+        user.password = stored
+        logger.info("Upgraded password hash for user {}", user.username)
+    return await create_token(user)
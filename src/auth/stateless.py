@@ -0,0 +1,185 @@
+"""Stateless refresh tokens.
+
+With ``refresh_token_mode = "jwt"`` refresh tokens are signed JWTs carrying the
+user, a token id (``jti``) and a family id (``fam``) shared by every token
+rotated from the same login. They use the ``refresh`` audience, which access
+token verification rejects.
+
+Revoked families and "log out everywhere" cutoffs are rare, so every worker
+keeps them in a `RevocationSet` that is polled from the database; checking a
+token needs no database read. Spent token ids are not mirrored: rotation
+inserts the old ``jti`` under a unique key, and a conflict means the token was
+used before, which revokes the whole family. Revocations made on another worker
+take effect here within ``refresh_token_revocation_sync_seconds``.
+"""
+
+import asyncio
+import secrets
+import time
+from datetime import UTC, datetime, timedelta
+from functools import cache
+from typing import Any
+
+from jwt import PyJWT, PyJWTError
+from loguru import logger
+
+from auth.model import RefreshTokenRevocation, add_revocation, list_revocations
+from conf.config import settings
+
+_AUDIENCE = "refresh"
+_REQUIRED_CLAIMS = ["sub", "uid", "jti", "fam", "iat", "exp"]
+# Only these kinds are mirrored in memory; spent token ids are checked by the unique insert
+_SYNCED_KINDS = ("family", "user")
+# created_at comes from the writing worker's clock and is set before commit, so each
+# poll re-reads a window to pick up rows from skewed clocks or slow transactions
+_SYNC_OVERLAP = timedelta(seconds=30)
+
+
+def _timestamp(value: datetime) -> float:
+    # SQLite hands back naive datetimes; everything is stored in UTC
+    return (value if value.tzinfo else value.replace(tzinfo=UTC)).timestamp()
+
+
+class RevocationSet:
+    """Revoked token families and per-user cutoffs, pruned as they expire."""
+
+    def __init__(self) -> None:
+        self._families: dict[str, float] = {}  # family id -> expiry
+        self._users: dict[int, tuple[float, float]] = {}  # user id -> (cutoff, expiry)
+        self._watermark = datetime(1970, 1, 1, tzinfo=UTC)
+
+    def __len__(self) -> int:
+        return len(self._families) + len(self._users)
+
+    def add(self, revocation: RefreshTokenRevocation) -> None:
+        expires = _timestamp(revocation.expires_at)
+        if revocation.kind == "family":
+            self._families[revocation.key] = expires
+        elif revocation.kind == "user":
+            cutoff = _timestamp(revocation.created_at)
+            current = self._users.get(revocation.user_id)
+            if current is None or cutoff > current[0]:
+                self._users[revocation.user_id] = (cutoff, expires)
+
+    def is_revoked(self, claims: dict[str, Any]) -> bool:
+        if claims["fam"] in self._families:
+            return True
+        user = self._users.get(claims["uid"])
+        return user is not None and claims["iat"] <= user[0]
+
+    def prune(self, now: float) -> None:
+        self._families = {family: expires for family, expires in self._families.items() if expires > now}
+        self._users = {user_id: entry for user_id, entry in self._users.items() if entry[1] > now}
+
+    async def sync(self) -> None:
+        """Apply revocations created since the last sync and drop expired ones."""
+        revocations = await list_revocations(since=self._watermark - _SYNC_OVERLAP, kinds=_SYNCED_KINDS)
+        for revocation in revocations:
+            self.add(revocation)
+        if revocations:
+            latest = revocations[-1].created_at
+            self._watermark = max(self._watermark, latest if latest.tzinfo else latest.replace(tzinfo=UTC))
+        self.prune(time.time())
+
+
+@cache
+def revocation_set() -> RevocationSet:
+    return RevocationSet()
+
+
+async def run_revocation_sync(interval: float) -> None:
+    """Sync the revocation set every ``interval`` seconds until cancelled."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await revocation_set().sync()
+        except Exception:
+            logger.exception("Refresh token revocation sync failed")
+
+
+@cache
+def _jwt() -> PyJWT:
+    return PyJWT()
+
+
+def is_stateless_token(token: str) -> bool:
+    """Whether the token is a JWT rather than an opaque database token."""
+    return token.count(".") == 2
+
+
+def issue(user_id: int, username: str, family: str | None = None) -> str:
+    """Create a refresh token, starting a new family unless one is given."""
+    now = time.time()
+    payload = {
+        "sub": username,
+        "uid": user_id,
+        "jti": secrets.token_urlsafe(16),
+        "fam": family or secrets.token_urlsafe(16),
+        "aud": _AUDIENCE,
+        # Sub-second iat so a token issued right after "log out everywhere" is not caught by its cutoff
+        "iat": now,
+        "exp": int(now) + settings.refresh_token_expire_seconds,
+    }
+    return _jwt().encode(payload, settings.jwt_secret, algorithm=settings.jwt_algorithm)
+
+
+def _decode(token: str) -> dict[str, Any] | None:
+    try:
+        return _jwt().decode(
+            token,
+            settings.jwt_secret,
+            algorithms=[settings.jwt_algorithm],
+            audience=_AUDIENCE,
+            options={"require": _REQUIRED_CLAIMS},
+        )
+    except PyJWTError:
+        return None
+
+
+async def _revoke(kind: str, key: str, user_id: int) -> None:
+    # Any token of the family or user still valid was issued before now, so it expires before this
+    expires_at = datetime.now(UTC) + timedelta(seconds=settings.refresh_token_expire_seconds)
+    revocation = RefreshTokenRevocation(kind=kind, key=key, user_id=user_id, expires_at=expires_at)
+    await add_revocation(revocation)
+    revocation_set().add(revocation)
+
+
+async def rotate(token: str) -> tuple[str, str] | None:
+    """Spend a refresh token and issue its successor in the same family.
+
+    Returns:
+        A tuple of (username, new refresh token), or None if the token is
+        invalid, expired, revoked or was already used.
+    """
+    claims = _decode(token)
+    if claims is None or revocation_set().is_revoked(claims):
+        return None
+
+    spent = RefreshTokenRevocation(
+        kind="token", key=claims["jti"], user_id=claims["uid"], expires_at=datetime.fromtimestamp(claims["exp"], UTC)
+    )
+    if not await add_revocation(spent):
+        # Someone rotated this token before: end the session for the legitimate user and the thief alike
+        logger.warning("Reused refresh token presented for user {}", claims["sub"])
+        await _revoke("family", claims["fam"], claims["uid"])
+        return None
+
+    return claims["sub"], issue(claims["uid"], claims["sub"], claims["fam"])
+
+
+async def revoke(token: str) -> bool:
+    """Revoke the family of a refresh token, ending that login session.
+
+    Returns:
+        True if the token was valid and is now revoked, False otherwise.
+    """
+    claims = _decode(token)
+    if claims is None:
+        return False
+    await _revoke("family", claims["fam"], claims["uid"])
+    return True
+
+
+async def revoke_user(user_id: int) -> None:
+    """Revoke every stateless refresh token issued to the user until now."""
+    await _revoke("user", secrets.token_urlsafe(16), user_id)
@@ -0,0 +1,83 @@
+"""Purge of expired and long-revoked refresh tokens and expired revocation entries.
+
+`run_sweeper` is started from ``main.lifespan`` in every worker; a Postgres
+advisory lock makes sure only one of them purges at a time. Run a single purge
+from the command line with::
+
+    PYTHONPATH=src python -m auth.sweeper
+"""
+
+import asyncio
+import random
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime, timedelta
+
+from loguru import logger
+
+from auth.model import purge_expired_refresh_tokens, purge_revocations, purge_revoked_refresh_tokens
+from conf import logging
+from conf.config import settings
+from conf.db import advisory_lock, close_db
+
+# Arbitrary application-wide key for pg_try_advisory_lock
+_LOCK_KEY = 0x52_54_53_57  # "RTSW"
+
+
+async def _purge_in_batches(purge: Callable[[int], Awaitable[int]], batch_size: int) -> int:
+    total = 0
+    while True:
+        deleted = await purge(batch_size)
+        total += deleted
+        if deleted < batch_size:
+            return total
+        # Let other queries through between batches
+        await asyncio.sleep(0)
+
+
+async def purge_once() -> int | None:
+    """Delete expired tokens, long-revoked tokens, then expired revocation entries, in batches.
+
+    Each pass has its own index, so no batch scans the table. Returns the
+    number of rows deleted, or None when another worker holds the lock.
+    """
+    batch_size = settings.refresh_token_sweep_batch_size
+    async with advisory_lock(_LOCK_KEY) as acquired:
+        if not acquired:
+            logger.debug("Refresh token purge skipped, another worker holds the lock")
+            return None
+
+        now = datetime.now(UTC)
+        revoked_before = now - timedelta(seconds=settings.refresh_token_revoked_retention_seconds)
+        total = await _purge_in_batches(lambda limit: purge_expired_refresh_tokens(before=now, limit=limit), batch_size)
+        total += await _purge_in_batches(
+            lambda limit: purge_revoked_refresh_tokens(before=revoked_before, limit=limit), batch_size
+        )
+        total += await _purge_in_batches(lambda limit: purge_revocations(expired_before=now, limit=limit), batch_size)
+
+    logger.info("Purged {} refresh tokens", total)
+    return total
+
+
+async def run_sweeper(interval: float) -> None:
+    """Purge every ``interval`` seconds until cancelled; failures are logged and retried next round."""
+    # Spread the first run so workers that start together do not all contend for the lock
+    await asyncio.sleep(interval * random.uniform(0.5, 1.0))
+    while True:
+        try:
+            await purge_once()
+        except Exception:
+            logger.exception("Refresh token purge failed")
+        await asyncio.sleep(interval)
+
+
+async def _main() -> None:
+    try:
+        deleted = await purge_once()
+    finally:
+        await close_db()
+    print("Another worker is purging, nothing done" if deleted is None else f"Purged {deleted} refresh tokens")
+
+
+if __name__ == "__main__":
+    logging.must_init()
+    asyncio.run(_main())
@@ -0,0 +1,30 @@
+"""JSON encoding helpers.
+
+Uses orjson when it is installed (``uv sync --extra fast``) and falls back to a
+preconstructed stdlib encoder otherwise. Both paths produce compact UTF-8 JSON
+and stringify values they cannot encode natively.
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the installed extras
+    orjson = None  # type: ignore[assignment]
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """Serialize ``obj`` to compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str)
+    return _encoder.encode(obj).encode("utf-8")
+
+
+def dumps(obj: Any) -> str:
+    """Serialize ``obj`` to a compact JSON string."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str).decode("utf-8")
+    return _encoder.encode(obj)
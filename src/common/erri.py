@@ -2,9 +2,11 @@ from __future__ import annotations
 
 
 class BusinessError(Exception):
-    def __init__(self, *, status_code: int, detail: str):
+    def __init__(self, *, status_code: int, detail: str, headers: dict[str, str] | None = None):
         self.status_code = status_code
         self.detail = detail
+        # Response headers that belong with the error, e.g. Retry-After
+        self.headers = headers
         super().__init__(detail)
 
 
@@ -30,3 +32,7 @@ def conflict(detail: str) -> BusinessError:
 
 def internal(detail: str) -> BusinessError:
     return BusinessError(status_code=500, detail=detail)
+
+
+def service_unavailable(detail: str, *, retry_after: int = 1) -> BusinessError:
+    return BusinessError(status_code=503, detail=detail, headers={"Retry-After": str(retry_after)})
@@ -0,0 +1,40 @@
+import asyncio
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ExecutorSaturatedError(Exception):
+    """Raised when a `BoundedExecutor` already has its maximum number of jobs."""
+
+
+class BoundedExecutor:
+    """Thread pool that rejects work instead of queueing it without limit.
+
+    At most ``max_workers`` jobs run at once and at most ``max_queue`` more wait
+    for a free worker. Anything beyond that fails fast with
+    `ExecutorSaturatedError`, so callers can shed load instead of piling up.
+
+    The pending counter is only touched from the event loop thread, so it needs
+    no lock.
+    """
+
+    def __init__(self, *, max_workers: int, max_queue: int, thread_name_prefix: str = "") -> None:
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self._capacity = max_workers + max_queue
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def run[T](self, fn: Callable[..., T], *args: object) -> T:
+        if self._pending >= self._capacity:
+            raise ExecutorSaturatedError(f"executor saturated ({self._pending} pending)")
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._pending -= 1
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
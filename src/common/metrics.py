@@ -0,0 +1,239 @@
+"""Prometheus-style metrics without external dependencies.
+
+Metrics are plain per-worker dicts updated from the event loop thread, so
+recording a sample takes no lock. Callback metrics are read only when scraped.
+
+With several workers, set ``metrics_multiproc_dir``: every worker periodically
+writes a JSON snapshot of its registry there, and the worker serving
+``/metrics`` writes its own snapshot, then sums all of them. Other workers'
+values are therefore at most ``metrics_flush_seconds`` old. Clear the directory
+when the service (re)starts, like ``PROMETHEUS_MULTIPROC_DIR``.
+"""
+
+import asyncio
+import json
+import math
+import os
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+from pathlib import Path
+from typing import Any
+
+from common import codec
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS: tuple[float, ...] = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+type Labels = tuple[str, ...]
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[Labels, Any] = {}
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "help": self.documentation,
+            "labelnames": list(self.labelnames),
+            "values": [[list(labels), value] for labels, value in self._values.items()],
+        }
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) - amount
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+
+class Histogram(_Metric):
+    """Histogram stored as per-bucket counts (last slot is ``+Inf``) followed by the sum."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        *,
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str) -> None:
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def snapshot(self) -> dict[str, Any]:
+        data = super().snapshot()
+        data["buckets"] = list(self.buckets)
+        return data
+
+
+class _Callback:
+    def __init__(self, name: str, documentation: str, kind: str, fn: Callable[[], float]) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.fn = fn
+
+    def snapshot(self) -> dict[str, Any]:
+        return {"kind": self.kind, "help": self.documentation, "labelnames": [], "values": [[[], float(self.fn())]]}
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric | _Callback] = {}
+
+    def _register[M: _Metric | _Callback](self, metric: M) -> M:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        *,
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets=buckets))
+
+    def callback(self, name: str, documentation: str, fn: Callable[[], float], *, kind: str = "gauge") -> None:
+        """Register a value that is computed by ``fn`` at scrape time."""
+        self._register(_Callback(name, documentation, kind, fn))
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+
+registry = Registry()
+
+
+def merge(snapshots: Iterable[dict[str, dict[str, Any]]]) -> dict[str, dict[str, Any]]:
+    """Sum snapshots from several workers, label set by label set."""
+    merged: dict[str, dict[str, Any]] = {}
+    totals: dict[str, dict[Labels, Any]] = {}
+    for snapshot in snapshots:
+        for name, data in snapshot.items():
+            if name not in merged:
+                merged[name] = {key: value for key, value in data.items() if key != "values"}
+                totals[name] = {}
+            values = totals[name]
+            for labels, value in data["values"]:
+                key = tuple(labels)
+                current = values.get(key)
+                if current is None:
+                    values[key] = list(value) if isinstance(value, list) else value
+                elif isinstance(value, list):
+                    values[key] = [a + b for a, b in zip(current, value, strict=True)]
+                else:
+                    values[key] = current + value
+    for name, data in merged.items():
+        data["values"] = [[list(labels), value] for labels, value in totals[name].items()]
+    return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=True)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def render(snapshot: dict[str, dict[str, Any]]) -> str:
+    """Render a snapshot in the Prometheus text exposition format."""
+    lines: list[str] = []
+    for name, data in sorted(snapshot.items()):
+        lines.append(f"# HELP {name} {data['help']}")
+        lines.append(f"# TYPE {name} {data['kind']}")
+        labelnames = data["labelnames"]
+        for labels, value in data["values"]:
+            if data["kind"] != "histogram":
+                lines.append(f"{name}{_format_labels(labelnames, labels)} {_format_value(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip([*data["buckets"], math.inf], value[:-1], strict=True):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{name}_bucket{_format_labels(labelnames, labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labelnames, labels)} {_format_value(value[-1])}")
+            lines.append(f"{name}_count{_format_labels(labelnames, labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def write_snapshot(directory: str | Path, target: Registry = registry) -> None:
+    """Atomically write this worker's snapshot to ``<directory>/<pid>.json``."""
+    path = Path(directory) / f"{os.getpid()}.json"
+    tmp = path.with_suffix(".tmp")
+    tmp.write_bytes(codec.dumps_bytes(target.snapshot()))
+    tmp.replace(path)
+
+
+def remove_snapshot(directory: str | Path) -> None:
+    (Path(directory) / f"{os.getpid()}.json").unlink(missing_ok=True)
+
+
+def collect(directory: str | Path | None = None, target: Registry = registry) -> str:
+    """Return the exposition text for this worker, or for all workers sharing ``directory``."""
+    if not directory:
+        return render(target.snapshot())
+    write_snapshot(directory, target)
+    snapshots = []
+    for path in Path(directory).glob("*.json"):
+        try:
+            snapshots.append(json.loads(path.read_bytes()))
+        except (OSError, ValueError):  # a worker exited or is mid-write
+            continue
+    return render(merge(snapshots))
+
+
+async def run_snapshot_writer(directory: str | Path, interval: float, target: Registry = registry) -> None:
+    """Write this worker's snapshot every ``interval`` seconds until cancelled."""
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    while True:
+        write_snapshot(directory, target)
+        await asyncio.sleep(interval)
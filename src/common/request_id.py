@@ -0,0 +1,64 @@
+"""Per-request correlation IDs.
+
+IDs are ``<worker prefix>-<counter>``: the prefix is unique per process (pid plus
+random bits, regenerated after ``fork``) and the counter is a process-local
+``itertools.count``, so generating one costs a string format and never collides
+across concurrent requests or workers.
+
+The current ID lives in a contextvar, so anything running inside the request
+(services, models, log records) can read it without it being passed around.
+"""
+
+import itertools
+import os
+import re
+import secrets
+from contextvars import ContextVar, Token
+
+REQUEST_ID_HEADER = "x-request-id"
+
+# Incoming IDs are echoed into headers and logs, so only accept a conservative charset
+_VALID_REQUEST_ID = re.compile(r"[A-Za-z0-9._:-]{1,128}")
+
+_request_id: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+
+def _new_prefix() -> str:
+    return f"{os.getpid():x}{secrets.token_hex(2)}"
+
+
+_prefix = _new_prefix()
+_counter = itertools.count(1)
+
+
+def _reset_after_fork() -> None:
+    global _prefix, _counter
+    _prefix = _new_prefix()
+    _counter = itertools.count(1)
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def new_request_id() -> str:
+    """Generate a new request ID, unique within this process and across workers."""
+    return f"{_prefix}-{next(_counter):x}"
+
+
+def sanitize(value: str) -> str | None:
+    """Return ``value`` if it is safe to reuse as a request ID, otherwise None."""
+    return value if _VALID_REQUEST_ID.fullmatch(value) else None
+
+
+def get_request_id() -> str | None:
+    """Return the ID of the request being handled, or None outside a request."""
+    return _request_id.get()
+
+
+def bind_request_id(request_id: str) -> Token[str | None]:
+    """Set the current request ID; pass the returned token to `reset_request_id`."""
+    return _request_id.set(request_id)
+
+
+def reset_request_id(token: Token[str | None]) -> None:
+    _request_id.reset(token)
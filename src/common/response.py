@@ -0,0 +1,23 @@
+"""Fast JSON responses.
+
+`FastJSONResponse` is the app-wide default response class. Handlers that
+already hold a response DTO return ``FastJSONResponse(dto)``: FastAPI passes
+Response instances through untouched, so the DTO is not revalidated against
+``response_model`` and is serialized once, straight to bytes, by pydantic-core.
+Keep ``response_model`` on the route for the OpenAPI schema.
+"""
+
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from common import codec
+
+
+# Subclassing JSONResponse keeps the response_model schema in the OpenAPI document
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return content.__pydantic_serializer__.to_json(content)
+        return codec.dumps_bytes(content)
@@ -0,0 +1,61 @@
+"""Coalescing of concurrent calls for the same key.
+
+When many requests miss the cache for the same key at once, only the first
+runs the fetch and the others await its result, so a thundering herd on a hot
+key costs one query instead of dozens.
+"""
+
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+
+from common import metrics
+
+_COALESCED = metrics.registry.counter(
+    "singleflight_coalesced_total", "Calls that joined an in-flight call for the same key", ("name",)
+)
+
+
+class SingleFlight[K: Hashable, V]:
+    """Share one in-flight call per key among concurrent callers.
+
+    The call runs as its own task: a caller that is cancelled or stops waiting
+    does not cancel it for the others. Its result or exception is delivered to
+    every caller that joined, and the key is free again once it finishes. The
+    result object is shared, so return something callers will not mutate.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._calls: dict[K, asyncio.Task[V]] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: K, fn: Callable[[], Awaitable[V]], *, timeout: float | None = None) -> V:
+        """Return the result of ``fn()``, joining the call already in flight for ``key`` if any.
+
+        ``timeout`` bounds the shared call itself: when it expires every caller
+        gets `TimeoutError` and the next call for the key starts afresh.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(asyncio.wait_for(fn(), timeout))
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            _COALESCED.inc(self.name)
+        return await asyncio.shield(task)
+
+    def forget(self, key: K) -> None:
+        """Let the next call for ``key`` start afresh instead of joining the one in flight.
+
+        Callers already waiting still get the result of the call they joined.
+        """
+        self._calls.pop(key, None)
+
+    def _finish(self, key: K, task: asyncio.Task[V]) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception as retrieved in case every caller stopped waiting
+        if not task.cancelled():
+            task.exception()
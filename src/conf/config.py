@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Literal
 
 from pydantic import computed_field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -15,24 +16,72 @@ class Settings(BaseSettings):
 
     debug: bool = False
 
+    # Logging configuration
+    log_format: Literal["text", "json"] = "text"  # json: one JSON object per line, one record per request
+    log_body_max_bytes: int = 4096  # request/response body bytes captured per DEBUG log line
+    log_async: bool = False  # write log sinks from a background thread instead of the request path
+    log_queue_size: int = 10000
+    log_queue_block: bool = False  # when the queue is full: block the caller (True) or drop the record (False)
+    log_batch_size: int = 512
+
+    # Metrics: with several workers, point this at a shared directory so /metrics sums all of them
+    metrics_multiproc_dir: str = ""
+    metrics_flush_seconds: float = 5.0
+
     # Database configuration
     db_host: str = "localhost"
     db_port: int = 5432
     db_user: str = "postgres"
     db_password: str = "postgres"
     db_name: str = "fastapi-boilerplate"
+    # Connection pool, per worker: keep workers * (pool_size + max_overflow) below Postgres max_connections
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0  # seconds to wait for a free connection before failing
+    db_pool_recycle: int = 1800  # seconds before a connection is replaced, -1 disables
+    db_pool_pre_ping: bool = False
+    db_statement_timeout_ms: int = 0  # 0 disables
+    db_pgbouncer: bool = False  # transaction pooling: disable prepared statements and startup options
 
     @computed_field  # type: ignore[prop-decorator]
     @property
     def database_url(self) -> str:
         return f"postgresql+psycopg://{self.db_user}:{self.db_password}@{self.db_host}:{self.db_port}/{self.db_name}"
 
+    # User cache: "local" per-process LRU, or a store shared by workers installed with
+    # user.cache.use_shared_store; "none" disables
+    user_cache_backend: Literal["local", "none"] = "local"
+    user_cache_size: int = 10000
+    user_cache_ttl_seconds: int = 60
+    # Unknown usernames are remembered too, so repeated lookups (credential stuffing) skip the database.
+    # Kept short: the local cache is not invalidated on other workers, so a user registered on one worker
+    # may be rejected on another for up to this TTL. A shared store (use_shared_store) has no such delay.
+    user_missing_cache_size: int = 100000
+    user_missing_cache_ttl_seconds: int = 5
+    user_load_timeout_seconds: float = 10.0  # bounds a database load shared by concurrent cache misses
+    # Bloom filter of existing usernames; other workers learn new users within user_bloom_sync_seconds
+    user_bloom_filter: bool = False
+    user_bloom_sync_seconds: float = 1.0
+
     # Security configuration
-    password_salt: str = "Momoyeyu"
+    password_salt: str = "Momoyeyu"  # only used to verify legacy SHA-512 hashes
+    password_hash_n: int = 16384  # scrypt CPU/memory cost (power of two)
+    password_hash_r: int = 8
+    password_hash_p: int = 1
+    password_hash_workers: int = 4
+    password_hash_max_queue: int = 64
     jwt_secret: str = "Momoyeyu"
     jwt_algorithm: str = "HS256"
     jwt_expire_seconds: int = 3600
+    jwt_cache_size: int = 10000  # verified access tokens kept in memory, 0 disables the cache
+    jwt_cache_ttl_seconds: int = 300
     refresh_token_expire_seconds: int = 604800  # 7 days
+    # "opaque": random tokens stored in the database; "jwt": signed tokens checked against an in-memory revocation set
+    refresh_token_mode: Literal["opaque", "jwt"] = "opaque"
+    refresh_token_revocation_sync_seconds: float = 1.0
+    refresh_token_sweep_interval_seconds: int = 3600  # 0 disables the background purge
+    refresh_token_sweep_batch_size: int = 1000
+    refresh_token_revoked_retention_seconds: int = 86400  # revoked tokens are kept this long after revocation
 
     # Admin account
     admin_username: str = "admin"
@@ -1,9 +1,162 @@
-from sqlmodel import create_engine
+import functools
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from typing import Any
 
-from conf.config import settings
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
 
-engine = create_engine(settings.database_url)
+from common import metrics
+from conf.config import Settings, settings
 
+_QUERY_DURATION = metrics.registry.histogram(
+    "db_query_duration_seconds", "Database round trips by model function", ("function",)
+)
+_CHECKOUT_WAIT = metrics.registry.histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection"
+)
 
-def close_db() -> None:
-    engine.dispose()
+
+class PoolStats:
+    """Checkout counters shared by every pool instance of the process."""
+
+    def __init__(self) -> None:
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds: float) -> None:
+        self.checkouts += 1
+        self.wait_seconds_total += seconds
+        if seconds > self.wait_seconds_max:
+            self.wait_seconds_max = seconds
+
+
+_pool_stats = PoolStats()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited for a connection.
+
+    The wait includes opening a new connection when the pool grows. Stats live
+    outside the instance because ``engine.dispose()`` recreates the pool.
+    """
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            _pool_stats.timeouts += 1
+            raise
+        finally:
+            wait = time.perf_counter() - start
+            _pool_stats.record_wait(wait)
+            _CHECKOUT_WAIT.observe(wait)
+
+
+def engine_options(config: Settings) -> dict[str, Any]:
+    """Build `create_async_engine` keyword arguments from settings."""
+    connect_args: dict[str, Any] = {}
+    if config.db_pgbouncer:
+        # PgBouncer in transaction mode cannot keep server-side prepared statements
+        connect_args["prepare_threshold"] = None
+        if config.db_statement_timeout_ms:
+            logger.warning("db_statement_timeout_ms is ignored with db_pgbouncer; set it on the database role instead")
+    elif config.db_statement_timeout_ms:
+        connect_args["options"] = f"-c statement_timeout={config.db_statement_timeout_ms}"
+    return {
+        "poolclass": InstrumentedPool,
+        "pool_size": config.db_pool_size,
+        "max_overflow": config.db_max_overflow,
+        "pool_timeout": config.db_pool_timeout,
+        "pool_recycle": config.db_pool_recycle,
+        "pool_pre_ping": config.db_pool_pre_ping,
+        "connect_args": connect_args,
+    }
+
+
+engine: AsyncEngine = create_async_engine(settings.database_url, **engine_options(settings))
+
+
+def pool_stats() -> dict[str, float]:
+    """Current pool occupancy and cumulative checkout wait for this process."""
+    pool = engine.pool
+    if not isinstance(pool, AsyncAdaptedQueuePool):
+        return {}
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    checked_out = pool.checkedout()
+    return {
+        "size": pool.size(),
+        "capacity": capacity,
+        "checked_out": checked_out,
+        "saturation": checked_out / capacity if capacity else 0.0,
+        "checkouts": _pool_stats.checkouts,
+        "timeouts": _pool_stats.timeouts,
+        "wait_seconds_total": _pool_stats.wait_seconds_total,
+        "wait_seconds_max": _pool_stats.wait_seconds_max,
+    }
+
+
+metrics.registry.callback(
+    "db_pool_connections_in_use", "Connections checked out of the pool", lambda: pool_stats().get("checked_out", 0)
+)
+metrics.registry.callback(
+    "db_pool_connections_max", "Pool size plus max overflow", lambda: pool_stats().get("capacity", 0)
+)
+metrics.registry.callback(
+    "db_pool_timeouts_total",
+    "Checkouts that timed out waiting for a connection",
+    lambda: _pool_stats.timeouts,
+    kind="counter",
+)
+
+
+def timed_query[**P, R](fn: Callable[P, Awaitable[R]]) -> Callable[P, Awaitable[R]]:
+    """Record the latency of a model function in ``db_query_duration_seconds``.
+
+    The ``function`` label is the function name without leading underscores.
+    """
+    label = fn.__name__.lstrip("_")
+
+    @functools.wraps(fn)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        start = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            _QUERY_DURATION.observe(time.perf_counter() - start, label)
+
+    return wrapper
+
+
+@asynccontextmanager
+async def advisory_lock(key: int) -> AsyncIterator[bool]:
+    """Try to take a Postgres session advisory lock for the duration of the block.
+
+    Yields whether the lock was acquired; it is never waited for. The lock is
+    held by a dedicated pooled connection, so it does not work behind PgBouncer
+    in transaction mode. Other dialects have no cross-process lock and always
+    yield True.
+    """
+    async with engine.connect() as conn:
+        if conn.dialect.name != "postgresql":
+            yield True
+            return
+        acquired = bool((await conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": key})).scalar())
+        await conn.commit()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+                await conn.commit()
+
+
+async def close_db() -> None:
+    await engine.dispose()
@@ -1,40 +1,253 @@
 """Loguru 日志配置模块。"""
 
+import atexit
+import copy
+import queue
 import sys
+import threading
+import traceback
+from collections.abc import Callable
 from functools import cache
 from pathlib import Path
+from typing import Any
 
 from loguru import logger
 
+from common import codec, metrics
+from common.request_id import get_request_id
 from conf.config import settings
 
 _PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
 _LOG_DIR = _PROJECT_ROOT / "logs"
 
+_CONSOLE_FORMAT = "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <magenta>{extra[request_id]}</magenta> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
+_FILE_FORMAT = "{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {extra[request_id]} | {name}:{function}:{line} - {message}"
+
+
+def _patch_request_id(record: Any) -> None:
+    """给每条日志带上当前请求 ID，请求之外为 ``-``。"""
+    record["extra"]["request_id"] = get_request_id() or "-"
+
+
+def _json_format(record: Any) -> str:
+    # 返回可调用格式时 loguru 不会自动追加 {exception}，异常已序列化进 JSON
+    return "{extra[json]}\n"
+
+
+def _json_patcher(record: Any) -> None:
+    """把日志记录序列化为一行 JSON，放入 ``extra["json"]``。
+
+    通过 ``logger.bind(fields=...)`` 传入的结构化字段直接并入顶层，
+    整条记录只序列化一次，所有 sink 共用同一结果。
+    """
+    _patch_request_id(record)
+    data: dict[str, Any] = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "logger": record["name"],
+        "request_id": record["extra"]["request_id"],
+        "message": record["message"],
+    }
+    fields = record["extra"].get("fields")
+    if fields:
+        data.update(fields)
+    exception = record["exception"]
+    if exception is not None:
+        data["exception"] = "".join(traceback.format_exception(exception.type, exception.value, exception.traceback))
+    record["extra"]["json"] = codec.dumps(data)
+
+
+class _Flush:
+    """写线程处理到该标记时，说明之前入队的日志都已写出。"""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+
+
+class QueueSink:
+    """有界队列 + 后台写线程的异步 sink。
+
+    请求协程里只做格式化和入队，磁盘写入、轮转和压缩都在写线程中进行。
+    队列满时按 ``block`` 决定阻塞等待还是丢弃，丢弃条数记录在 ``dropped``。
+    """
+
+    def __init__(self, *, maxsize: int, block: bool, batch_size: int) -> None:
+        self.dropped = 0
+        self._block = block
+        self._batch_size = batch_size
+        self._queue: queue.Queue[tuple[Callable[[str], None], str] | _Flush | None] = queue.Queue(maxsize)
+        self._drop_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def writer(self, write: Callable[[str], None]) -> Callable[[str], None]:
+        """返回一个 loguru sink，把格式化后的日志交给写线程，由 ``write`` 写出。"""
+
+        def _sink(message: str) -> None:
+            item = (write, str(message))
+            if self._block:
+                self._queue.put(item)
+                return
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                with self._drop_lock:
+                    self.dropped += 1
+
+        return _sink
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """等待已入队的日志写完。"""
+        marker = _Flush()
+        self._queue.put(marker)
+        return marker.done.wait(timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self._batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not self._write_batch(batch):
+                return
+
+    def _write_batch(self, batch: list[tuple[Callable[[str], None], str] | _Flush | None]) -> bool:
+        # 相邻且写往同一目标的日志合并为一次写入
+        pending: list[str] = []
+        target: Callable[[str], None] | None = None
+        for item in batch:
+            if isinstance(item, tuple) and item[0] is target:
+                pending.append(item[1])
+                continue
+            if target is not None and pending:
+                self._safe_write(target, "".join(pending))
+            pending, target = [], None
+            if isinstance(item, tuple):
+                target, pending = item[0], [item[1]]
+            elif isinstance(item, _Flush):
+                item.done.set()
+            else:
+                return False
+        if target is not None and pending:
+            self._safe_write(target, "".join(pending))
+        return True
+
+    @staticmethod
+    def _safe_write(write: Callable[[str], None], text: str) -> None:
+        try:
+            write(text)
+        except Exception as e:  # 写线程不能因单次写入失败而退出
+            sys.stderr.write(f"log writer failed: {e!r}\n")
+
+
+_queue_sink: QueueSink | None = None
+
+
+def _write_stderr(text: str) -> None:
+    sys.stderr.write(text)
+    sys.stderr.flush()
+
+
+def _init_async_sinks(level: str, console_format: Any, file_format: Any, colorize: bool) -> None:
+    global _queue_sink
+
+    # 文件 sink 挂在独立的 logger 副本上，只在写线程中调用，轮转和压缩都不会阻塞请求
+    file_logger = copy.deepcopy(logger)
+    file_logger.add(
+        _LOG_DIR / "backend_{time:YYYY-MM-DD}.log",
+        format="{message}",
+        level=0,
+        rotation="00:00",
+        retention="7 days",
+        compression="zip",
+        encoding="utf-8",
+    )
+    raw_file_logger = file_logger.opt(raw=True)
+
+    _queue_sink = QueueSink(
+        maxsize=settings.log_queue_size,
+        block=settings.log_queue_block,
+        batch_size=settings.log_batch_size,
+    )
+    logger.add(_queue_sink.writer(_write_stderr), format=console_format, level=level, colorize=colorize)
+    logger.add(
+        _queue_sink.writer(lambda text: raw_file_logger.log("INFO", text)),
+        format=file_format,
+        level=level,
+        colorize=False,
+    )
+    atexit.register(_queue_sink.close)
+
 
 @cache
 def must_init() -> None:
     """初始化日志配置，只执行一次。"""
     _LOG_DIR.mkdir(exist_ok=True)
+    level = "DEBUG" if settings.debug else "INFO"
 
     # 移除默认 handler
     logger.remove()
 
+    # JSON 模式：每条日志一行 JSON，控制台和文件格式一致
+    if settings.log_format == "json":
+        logger.configure(patcher=_json_patcher)
+        console_format: Any = _json_format
+        file_format: Any = _json_format
+        colorize = False
+    else:
+        logger.configure(patcher=_patch_request_id)
+        console_format, file_format, colorize = _CONSOLE_FORMAT, _FILE_FORMAT, True
+
+    if settings.log_async:
+        _init_async_sinks(level, console_format, file_format, colorize)
+        return
+
     # 控制台输出
     logger.add(
         sys.stderr,
-        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
-        level="DEBUG" if settings.debug else "INFO",
-        colorize=True,
+        format=console_format,
+        level=level,
+        colorize=colorize,
     )
 
     # 文件输出 (按天命名，每日午夜或达到 10MB 时轮转)
     logger.add(
         _LOG_DIR / "backend_{time:YYYY-MM-DD}.log",
-        format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
-        level="DEBUG" if settings.debug else "INFO",
+        format=file_format,
+        level=level,
         rotation="00:00",  # 每日午夜轮转
         retention="7 days",
         compression="zip",
         encoding="utf-8",
     )
+
+
+def flush() -> None:
+    """异步模式下等待队列中的日志写完，同步模式下无操作。"""
+    if _queue_sink is not None:
+        _queue_sink.flush()
+
+
+def dropped_records() -> int:
+    """异步模式下因队列已满而丢弃的日志条数。"""
+    return _queue_sink.dropped if _queue_sink is not None else 0
+
+
+metrics.registry.callback(
+    "log_records_dropped_total",
+    "Log records dropped because the async log queue was full",
+    dropped_records,
+    kind="counter",
+)
+
+
+def is_level_enabled(level: str) -> bool:
+    """判断是否有任一 sink 会输出该级别的日志。"""
+    return logger._core.min_level <= logger.level(level).no  # type: ignore[attr-defined]
@@ -1,27 +1,67 @@
+import asyncio
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
 from typing import Any
 
-from fastapi import APIRouter, FastAPI
+from fastapi import APIRouter, FastAPI, Response
 from loguru import logger
 
+from auth import service as auth_service
+from auth import stateless
 from auth.handler import router as auth_router
+from auth.sweeper import run_sweeper
+from common import metrics
+from common.response import FastJSONResponse
 from conf import logging
+from conf.config import settings
 from conf.db import close_db
 from conf.openapi import setup_openapi
+from middleware import auth
 from middleware.auth import setup_auth_middleware
 from middleware.logging import setup_logging_middleware
+from middleware.metrics import setup_metrics_middleware
 from user.handler import router as user_router
-from user.service import ensure_admin_user
+from user.service import ensure_admin_user, run_username_filter_sync, sync_username_filter
 
 
 @asynccontextmanager
 async def lifespan(_app: FastAPI) -> AsyncGenerator[None, None]:
-    ensure_admin_user()
+    await ensure_admin_user()
+    snapshot_writer = None
+    if settings.metrics_multiproc_dir:
+        snapshot_writer = asyncio.create_task(
+            metrics.run_snapshot_writer(settings.metrics_multiproc_dir, settings.metrics_flush_seconds)
+        )
+    sweeper = None
+    if settings.refresh_token_sweep_interval_seconds > 0:
+        sweeper = asyncio.create_task(run_sweeper(settings.refresh_token_sweep_interval_seconds))
+    revocation_sync = None
+    if settings.refresh_token_mode == "jwt":
+        # Start with every known revocation; serving stale would accept revoked tokens
+        await stateless.revocation_set().sync()
+        revocation_sync = asyncio.create_task(
+            stateless.run_revocation_sync(settings.refresh_token_revocation_sync_seconds)
+        )
+    username_sync = None
+    if settings.user_bloom_filter:
+        # Build the filter from every existing user before serving
+        await sync_username_filter()
+        username_sync = asyncio.create_task(run_username_filter_sync(settings.user_bloom_sync_seconds))
     logger.info("Application started")
     yield
     logger.info("Application shutdown")
-    close_db()
+    if sweeper is not None:
+        sweeper.cancel()
+    if revocation_sync is not None:
+        revocation_sync.cancel()
+    if username_sync is not None:
+        username_sync.cancel()
+    if snapshot_writer is not None:
+        snapshot_writer.cancel()
+        metrics.remove_snapshot(settings.metrics_multiproc_dir)
+    auth_service.shutdown_hash_executor()
+    await close_db()
+    logging.flush()
 
 
 def init_routers(_app: FastAPI) -> None:
@@ -31,6 +71,11 @@ def init_routers(_app: FastAPI) -> None:
     async def root() -> dict[str, Any]:
         return {"message": "Hello FastAPI + UV!"}
 
+    @auth.exempt
+    @root_router.get("/metrics", include_in_schema=False)
+    async def metrics_endpoint() -> Response:
+        return Response(metrics.collect(settings.metrics_multiproc_dir), media_type=metrics.CONTENT_TYPE)
+
     _app.include_router(root_router)
     _app.include_router(auth_router)
     _app.include_router(user_router)
@@ -38,9 +83,10 @@ def init_routers(_app: FastAPI) -> None:
 
 def init_middlewares(_app: FastAPI) -> None:
     # Note: FastAPI middlewares execute in reverse order (last registered = first executed)
-    # Order: logging -> auth -> handler
+    # Order: metrics -> logging -> auth -> handler
     setup_auth_middleware(_app)
     setup_logging_middleware(_app)
+    setup_metrics_middleware(_app)
 
 
 def create_app() -> FastAPI:
@@ -51,6 +97,7 @@ def create_app() -> FastAPI:
         description="A FastAPI demo initialized by UV",
         version="1.0.0",
         lifespan=lifespan,
+        default_response_class=FastJSONResponse,
     )
 
     init_routers(_app)
@@ -1,21 +1,50 @@
-from collections.abc import Awaitable, Callable
+import hashlib
+import time
+from collections.abc import Callable
 from functools import cache
 from typing import Any, NoReturn
 
-from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.routing import APIRoute
-from jwt import PyJWT, PyJWTError
+from jwt import ExpiredSignatureError, PyJWT, PyJWTError
+from starlette.types import ASGIApp, Receive, Scope, Send
 
-from common import erri
+from common import erri, metrics
+from common.cache import TTLCache
 from conf.config import settings
 
+_VERIFY_DURATION = metrics.registry.histogram(
+    "jwt_verify_duration_seconds", "Access token verification time", ("cached",)
+)
+_VERIFY_FAILURES = metrics.registry.counter("jwt_verify_failures_total", "Rejected access tokens", ("reason",))
+
 
 @cache
 def _jwt() -> PyJWT:
     return PyJWT()
 
 
+@cache
+def token_cache() -> TTLCache[bytes, dict[str, Any]]:
+    """Cache of verified token payloads, keyed by the SHA-256 of the token."""
+    return TTLCache(maxsize=settings.jwt_cache_size, ttl=settings.jwt_cache_ttl_seconds)
+
+
+metrics.registry.callback(
+    "jwt_cache_hits_total",
+    "Access tokens served from the verified token cache",
+    lambda: token_cache().hits,
+    kind="counter",
+)
+metrics.registry.callback(
+    "jwt_cache_misses_total",
+    "Access tokens not found in the verified token cache",
+    lambda: token_cache().misses,
+    kind="counter",
+)
+
+
 DEBUG_EXEMPT_PATHS = {
     "/docs",  # Swagger UI
     "/redoc",  # ReDoc
@@ -62,12 +91,30 @@ def _freeze_route_registration(app: FastAPI) -> None:
 
 
 def verify_token(token: str) -> dict[str, Any]:
-    """Verify a JWT token and return the payload."""
+    """Verify a JWT token and return the payload.
+
+    Verified payloads are cached until the token's ``exp`` (or the cache TTL,
+    whichever comes first), so repeat requests skip signature and claims checks.
+    """
+    start = time.perf_counter()
+    key = hashlib.sha256(token.encode()).digest()
+    cached = token_cache().get(key)
+    if cached is not None:
+        _VERIFY_DURATION.observe(time.perf_counter() - start, "true")
+        return cached
+
     try:
         decoded: dict[str, Any] = _jwt().decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
-        return decoded
-    except PyJWTError:
+    except PyJWTError as e:
+        _VERIFY_FAILURES.inc("expired" if isinstance(e, ExpiredSignatureError) else "invalid")
         raise erri.unauthorized("Invalid token") from None
+    finally:
+        _VERIFY_DURATION.observe(time.perf_counter() - start, "false")
+
+    exp = decoded.get("exp")
+    if isinstance(exp, int | float):
+        token_cache().set(key, decoded, ttl=exp - time.time())
+    return decoded
 
 
 def get_username(request: Request) -> str:
@@ -87,6 +134,49 @@ def get_username(request: Request) -> str:
     raise erri.unauthorized("Unauthorized")
 
 
+def _bearer_token(scope: Scope) -> str | None:
+    """Extract the bearer token from the raw ASGI headers without building a Headers object."""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            if value.startswith(b"Bearer "):
+                return value[7:].decode("latin-1")
+            return None
+    return None
+
+
+class JWTMiddleware:
+    """ASGI middleware that rejects requests without a valid bearer token.
+
+    On success the token subject is stored in ``scope["state"]["user"]``, which is
+    what ``request.state.user`` reads.
+    """
+
+    def __init__(self, app: ASGIApp, *, exempt_paths: frozenset[str]) -> None:
+        self.app = app
+        self.exempt_paths = exempt_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        token = _bearer_token(scope)
+        if token is None:
+            _VERIFY_FAILURES.inc("missing")
+            response = JSONResponse(status_code=401, content={"detail": "Unauthorized"})
+            await response(scope, receive, send)
+            return
+        try:
+            payload = verify_token(token)
+        except erri.BusinessError as e:
+            response = JSONResponse(status_code=e.status_code, content={"detail": e.detail}, headers=e.headers)
+            await response(scope, receive, send)
+            return
+
+        scope.setdefault("state", {})["user"] = payload.get("sub")
+        await self.app(scope, receive, send)
+
+
 def setup_auth_middleware(app: FastAPI) -> None:
     """Setup JWT authentication middleware."""
     if getattr(app, _SETUP_ATTR, False):
@@ -97,21 +187,4 @@ def setup_auth_middleware(app: FastAPI) -> None:
     _freeze_route_registration(app)
     setattr(app, _SETUP_ATTR, True)
 
-    @app.middleware("http")
-    async def jwt_middleware(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
-        path = request.url.path
-        if path in EXEMPT_PATHS:
-            return await call_next(request)
-
-        auth = request.headers.get("Authorization")
-        if not auth or not auth.startswith("Bearer "):
-            return JSONResponse(status_code=401, content={"detail": "Unauthorized"})
-        token = auth.split(" ", 1)[1]
-        try:
-            payload = verify_token(token)
-        except erri.BusinessError as e:
-            return JSONResponse(status_code=e.status_code, content={"detail": e.detail})
-        except HTTPException as e:
-            return JSONResponse(status_code=e.status_code, content={"detail": e.detail})
-        request.state.user = payload.get("sub")
-        return await call_next(request)
+    app.add_middleware(JWTMiddleware, exempt_paths=frozenset(EXEMPT_PATHS))
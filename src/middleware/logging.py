@@ -9,12 +9,17 @@ from fastapi import FastAPI
 from loguru import logger
 from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from common import request_id as request_ids
+from conf.config import settings
+from conf.logging import is_level_enabled
+
 # Paths to exclude from logging (e.g., health checks, static files)
 _EXCLUDE_PATHS: set[str] = {
     "/docs",
     "/redoc",
     "/openapi.json",
     "/docs/oauth2-redirect",
+    "/metrics",
 }
 
 # Headers to mask for security
@@ -24,6 +29,20 @@ _SENSITIVE_HEADERS: set[str] = {
     "x-api-key",
 }
 
+# Content types whose bodies are captured; anything else (binary, multipart, ...) is skipped
+_TEXT_CONTENT_MARKERS: tuple[str, ...] = (
+    "json",
+    "xml",
+    "javascript",
+    "x-www-form-urlencoded",
+)
+
+# Content types parsed field by field for masking; their raw text is never logged when cut off
+_STRUCTURED_CONTENT_MARKERS: tuple[str, ...] = (
+    "json",
+    "x-www-form-urlencoded",
+)
+
 # Fields to mask in request body and query params
 _SENSITIVE_FIELDS: set[str] = {
     "password",
@@ -63,6 +82,78 @@ def _parse_body(body: bytes, content_type: str) -> Any:
     return f"{text[:500]}..." if len(text) > 500 else text
 
 
+def _is_text_content_type(content_type: str) -> bool:
+    """Whether a body of this content type is worth capturing for the log."""
+    content_type = content_type.lower()
+    return content_type.startswith("text/") or any(marker in content_type for marker in _TEXT_CONTENT_MARKERS)
+
+
+class _BodyCapture:
+    """Collects body chunks up to ``limit`` bytes and joins them once.
+
+    Chunks are kept in a list rather than concatenated, and capture stops at the
+    limit, so memory stays bounded however large or long-lived the body is.
+    """
+
+    __slots__ = ("enabled", "limit", "size", "truncated", "_chunks")
+
+    def __init__(self, limit: int, *, enabled: bool = True) -> None:
+        self.enabled = enabled and limit > 0
+        self.limit = limit
+        self.size = 0
+        self.truncated = False
+        self._chunks: list[bytes] = []
+
+    def feed(self, chunk: bytes) -> None:
+        if not self.enabled or not chunk or self.truncated:
+            return
+        room = self.limit - self.size
+        if len(chunk) > room:
+            chunk = chunk[:room]
+            self.truncated = True
+        self._chunks.append(chunk)
+        self.size += len(chunk)
+
+    def getvalue(self) -> bytes:
+        return b"".join(self._chunks)
+
+
+def _loggable_body(capture: _BodyCapture, content_type: str) -> Any:
+    """Parse and mask a captured body for the log.
+
+    A JSON or form body cut off at the capture limit cannot be parsed reliably,
+    and its raw text would expose the fields masking is meant to hide, so only
+    its captured size is logged.
+    """
+    if capture.truncated and any(marker in content_type.lower() for marker in _STRUCTURED_CONTENT_MARKERS):
+        return f"<truncated, {capture.size} bytes captured>"
+    return _mask_fields(_parse_body(capture.getvalue(), content_type))
+
+
+def _capturing_receive(receive: Receive, capture: _BodyCapture) -> Receive:
+    """Wrap ``receive`` so request body chunks are fed into ``capture``."""
+    body_consumed = False
+
+    async def receive_wrapper() -> Message:
+        nonlocal body_consumed
+        message = await receive()
+        if message["type"] == "http.request" and not body_consumed:
+            capture.feed(message.get("body", b""))
+            if not message.get("more_body", False):
+                body_consumed = True
+        return message
+
+    return receive_wrapper
+
+
+def _incoming_request_id(scope: Scope) -> str | None:
+    """Return the client-supplied ``X-Request-ID`` if present and well-formed."""
+    for key, value in scope.get("headers", []):
+        if key == b"x-request-id":
+            return request_ids.sanitize(value.decode("latin-1"))
+    return None
+
+
 def _flatten_qs(qs: str) -> dict[str, Any]:
     """Parse and flatten query string."""
     parsed = parse_qs(qs, keep_blank_values=True)
@@ -70,43 +161,125 @@ def _flatten_qs(qs: str) -> dict[str, Any]:
 
 
 class LoggingMiddleware:
-    """ASGI middleware that logs request and response details."""
+    """ASGI middleware that logs request and response details.
 
-    def __init__(self, app: ASGIApp) -> None:
+    With ``verbose`` off (the log level is above DEBUG) only method, path, status
+    and duration are recorded: headers are not decoded and bodies are not captured.
+    With ``structured`` on, each request produces a single record whose fields are
+    serialized once by the JSON log format (see `conf.logging`).
+
+    Every request gets an ID (a sanitized incoming ``X-Request-ID`` or a newly
+    generated one) that is bound to `common.request_id` for the duration of the
+    request and echoed back in the ``X-Request-ID`` response header.
+    """
+
+    def __init__(self, app: ASGIApp, *, verbose: bool = True, structured: bool = False, body_limit: int = 4096) -> None:
         self.app = app
+        self.verbose = verbose
+        self.structured = structured
+        self.body_limit = body_limit
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         if scope["type"] != "http":
             await self.app(scope, receive, send)
             return
 
-        path = scope.get("path", "")
-        if path in _EXCLUDE_PATHS:
-            await self.app(scope, receive, send)
-            return
+        request_id = _incoming_request_id(scope) or request_ids.new_request_id()
+        header = (request_ids.REQUEST_ID_HEADER.encode("latin-1"), request_id.encode("latin-1"))
 
+        async def send_with_request_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), header]
+            await send(message)
+
+        token = request_ids.bind_request_id(request_id)
+        try:
+            path = scope.get("path", "")
+            if path in _EXCLUDE_PATHS:
+                await self.app(scope, receive, send_with_request_id)
+            elif self.structured:
+                await self._log_structured(scope, receive, send_with_request_id, path, request_id)
+            elif self.verbose:
+                await self._log_verbose(scope, receive, send_with_request_id, path, request_id)
+            else:
+                await self._log_summary(scope, receive, send_with_request_id, path, request_id)
+        finally:
+            request_ids.reset_request_id(token)
+
+    async def _log_structured(self, scope: Scope, receive: Receive, send: Send, path: str, request_id: str) -> None:
         start_time = time.perf_counter()
-        request_id = f"{int(time.time() * 1000)}"
-        method = scope.get("method", "")
 
-        # Capture request body
-        request_body = b""
-        body_consumed = False
-
-        async def receive_wrapper() -> Message:
-            nonlocal request_body, body_consumed
-            message = await receive()
-            if message["type"] == "http.request" and not body_consumed:
-                request_body += message.get("body", b"")
-                if not message.get("more_body", False):
-                    body_consumed = True
-            return message
+        content_type = ""
+        if self.verbose:
+            for key, value in scope.get("headers", []):
+                if key == b"content-type":
+                    content_type = value.decode("latin-1")
+                    break
+        request_body = _BodyCapture(self.body_limit, enabled=self.verbose and _is_text_content_type(content_type))
+
+        response_status = 0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_status
+            if message["type"] == "http.response.start":
+                response_status = message.get("status", 0)
+            await send(message)
+
+        await self.app(
+            scope, _capturing_receive(receive, request_body) if request_body.enabled else receive, send_wrapper
+        )
+
+        fields: dict[str, Any] = {
+            "request_id": request_id,
+            "method": scope.get("method", ""),
+            "path": path,
+            "status": response_status,
+            "duration_ms": round((time.perf_counter() - start_time) * 1000, 2),
+            "user": scope.get("state", {}).get("user"),
+        }
+        if request_body.size:
+            fields["body"] = _loggable_body(request_body, content_type)
+        logger.bind(fields=fields).info("Request {} | {} {} | {}", request_id, fields["method"], path, response_status)
+
+    async def _log_summary(self, scope: Scope, receive: Receive, send: Send, path: str, request_id: str) -> None:
+        start_time = time.perf_counter()
+        logger.info(
+            "Request {request_id} | {method} {path}",
+            request_id=request_id,
+            method=scope.get("method", ""),
+            path=path,
+        )
+
+        response_status = 0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_status
+            if message["type"] == "http.response.start":
+                response_status = message.get("status", 0)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+        logger.info(
+            "Response {request_id} | {status_code} | {duration:.2f}ms",
+            request_id=request_id,
+            status_code=response_status,
+            duration=(time.perf_counter() - start_time) * 1000,
+        )
+
+    async def _log_verbose(self, scope: Scope, receive: Receive, send: Send, path: str, request_id: str) -> None:
+        start_time = time.perf_counter()
+        method = scope.get("method", "")
 
         # Parse request headers
         headers = dict(scope.get("headers", []))
         headers_str = {k.decode(): v.decode() for k, v in headers.items()}
         content_type = headers_str.get("content-type", "")
 
+        # Capture request body
+        request_body = _BodyCapture(self.body_limit, enabled=_is_text_content_type(content_type))
+        receive_wrapper = _capturing_receive(receive, request_body)
+
         # Log request info
         logger.info(
             "Request {request_id} | {method} {path}",
@@ -132,28 +305,32 @@ class LoggingMiddleware:
 
         # Capture response
         response_status = 0
-        response_body = b""
-        response_headers: list[tuple[bytes, bytes]] = []
+        resp_content_type = ""
+        response_body = _BodyCapture(self.body_limit, enabled=False)
 
         async def send_wrapper(message: Message) -> None:
-            nonlocal response_status, response_body, response_headers
+            nonlocal response_status, resp_content_type, response_body
             if message["type"] == "http.response.start":
                 response_status = message.get("status", 0)
-                response_headers = list(message.get("headers", []))
+                for key, value in message.get("headers", []):
+                    if key.lower() == b"content-type":
+                        resp_content_type = value.decode("latin-1")
+                        break
+                response_body = _BodyCapture(self.body_limit, enabled=_is_text_content_type(resp_content_type))
             elif message["type"] == "http.response.body":
-                response_body += message.get("body", b"")
+                response_body.feed(message.get("body", b""))
             await send(message)
 
         # Process request
         await self.app(scope, receive_wrapper, send_wrapper)
 
         # Log request body (after consumed)
-        if request_body:
-            parsed_body = _parse_body(request_body, content_type)
+        if request_body.size:
             logger.debug(
-                "Request {request_id} body: {body}",
+                "Request {request_id} body{truncated}: {body}",
                 request_id=request_id,
-                body=json.dumps(_mask_fields(parsed_body), ensure_ascii=False),
+                truncated=" (truncated)" if request_body.truncated else "",
+                body=json.dumps(_loggable_body(request_body, content_type), ensure_ascii=False),
             )
 
         # Calculate duration
@@ -166,20 +343,23 @@ class LoggingMiddleware:
             status_code=response_status,
             duration=duration_ms,
         )
-        if response_body:
-            resp_content_type = ""
-            for key, value in response_headers:
-                if key.lower() == b"content-type":
-                    resp_content_type = value.decode()
-                    break
-            parsed_resp = _parse_body(response_body, resp_content_type)
+        if response_body.size:
             logger.debug(
-                "Response {request_id} body: {body}",
+                "Response {request_id} body{truncated}: {body}",
                 request_id=request_id,
-                body=json.dumps(_mask_fields(parsed_resp), ensure_ascii=False),
+                truncated=" (truncated)" if response_body.truncated else "",
+                body=json.dumps(_loggable_body(response_body, resp_content_type), ensure_ascii=False),
             )
 
 
 def setup_logging_middleware(app: FastAPI) -> None:
-    """Set up the logging middleware."""
-    app.add_middleware(LoggingMiddleware)
+    """Set up the logging middleware.
+
+    The DEBUG check happens once here, so call it after the log sinks are configured.
+    """
+    app.add_middleware(
+        LoggingMiddleware,
+        verbose=is_level_enabled("DEBUG"),
+        structured=settings.log_format == "json",
+        body_limit=settings.log_body_max_bytes,
+    )
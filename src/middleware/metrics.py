@@ -0,0 +1,72 @@
+"""HTTP request metrics middleware."""
+
+import time
+
+from fastapi import FastAPI
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from common import metrics
+
+_REQUESTS = metrics.registry.counter(
+    "http_requests_total", "HTTP requests by route template and status", ("method", "route", "status")
+)
+_DURATION = metrics.registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template and status", ("method", "route", "status")
+)
+_IN_FLIGHT = metrics.registry.gauge("http_requests_in_flight", "HTTP requests currently being handled")
+
+# Label for requests that match no route, so unknown paths cannot blow up label cardinality
+_UNMATCHED = "<unmatched>"
+
+
+class MetricsMiddleware:
+    """ASGI middleware that records request count, latency and in-flight requests.
+
+    Requests are labelled with the route template (``/user/{id}``), never the raw
+    path. Requests rejected before routing (e.g. by `JWTMiddleware`) are matched
+    against ``routes`` to find their template.
+    """
+
+    def __init__(self, app: ASGIApp, *, routes: list[BaseRoute]) -> None:
+        self.app = app
+        self.routes = routes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        _IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            _IN_FLIGHT.dec()
+            labels = (scope["method"], self._route_template(scope), str(status))
+            _REQUESTS.inc(*labels)
+            _DURATION.observe(duration, *labels)
+
+    def _route_template(self, scope: Scope) -> str:
+        route = scope.get("route")
+        if route is not None:
+            return route.path
+        for candidate in self.routes:
+            match, _ = candidate.matches(scope)
+            if match is Match.FULL:
+                return getattr(candidate, "path", _UNMATCHED)
+        return _UNMATCHED
+
+
+def setup_metrics_middleware(app: FastAPI) -> None:
+    """Set up the metrics middleware; register it last so it wraps every other middleware."""
+    app.add_middleware(MetricsMiddleware, routes=app.router.routes)
@@ -0,0 +1,295 @@
+"""Read-through cache for user rows.
+
+Entries are snapshots of the row (``User.model_dump()``), so `user.model` builds
+a fresh ``User`` on every hit and callers can never mutate what is cached. Writes
+in `user.model` invalidate the entry after they commit; with the local backend,
+other workers see the change once their own entry expires, so keep the TTL short.
+
+Usernames that do not exist can be cached too, as an empty dict, so repeated
+lookups of unknown names (credential stuffing) do not reach the database. The
+local backend keeps them in a separate bounded LRU so they cannot evict real
+users. Creating a user invalidates its name like any other write, which with
+the local backend only reaches the worker that created it; other workers may
+reject the new name until ``user_missing_cache_ttl_seconds`` (a few seconds)
+expires.
+
+`UsernameFilter` is an optional Bloom filter of every existing username that
+answers "no such user" for names never seen before.
+
+Two backends are provided:
+
+- `LocalUserCache`: in-process LRU with TTL (default).
+- `SharedUserCache`: serializes entries into a `KeyValueStore`, so several
+  workers can share one cache. It is used once a store is installed with
+  `use_shared_store` at startup; a Redis or Memcached client only has to
+  provide the same three coroutines. `InMemoryStore` is the process-local
+  stand-in used by tests.
+"""
+
+import json
+import time
+from collections.abc import Awaitable, Callable, Collection
+from functools import cache
+from typing import Any, Protocol
+
+from common import codec, metrics
+from common.bloom import BloomFilter
+from common.cache import TTLCache
+from conf.config import settings
+
+type UserData = dict[str, Any]
+
+
+class UserCache(Protocol):
+    """``get`` returns an empty dict for usernames stored with ``set_missing``."""
+
+    hits: int
+    misses: int
+
+    async def get(self, username: str) -> UserData | None: ...
+
+    async def set(self, username: str, data: UserData) -> None: ...
+
+    async def set_missing(self, username: str) -> None: ...
+
+    async def invalidate(self, username: str) -> None: ...
+
+
+class KeyValueStore(Protocol):
+    async def get(self, key: str) -> bytes | None: ...
+
+    async def set(self, key: str, value: bytes, *, ttl: float) -> None: ...
+
+    async def delete(self, key: str) -> None: ...
+
+
+class NullUserCache:
+    """Cache that never stores anything; used when caching is disabled."""
+
+    hits = 0
+    misses = 0
+
+    async def get(self, username: str) -> UserData | None:
+        return None
+
+    async def set(self, username: str, data: UserData) -> None:
+        return None
+
+    async def set_missing(self, username: str) -> None:
+        return None
+
+    async def invalidate(self, username: str) -> None:
+        return None
+
+
+class LocalUserCache:
+    """Per-process LRU cache with TTL, plus a separate one for unknown usernames."""
+
+    def __init__(self, *, maxsize: int, ttl: float, missing_maxsize: int = 0, missing_ttl: float = 0) -> None:
+        self._cache: TTLCache[str, UserData] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._missing: TTLCache[str, bool] = TTLCache(maxsize=missing_maxsize, ttl=missing_ttl)
+
+    # Every miss of the user LRU goes on to the unknown-name LRU
+    @property
+    def hits(self) -> int:
+        return self._cache.hits + self._missing.hits
+
+    @property
+    def misses(self) -> int:
+        return self._missing.misses
+
+    async def get(self, username: str) -> UserData | None:
+        data = self._cache.get(username)
+        if data is None and self._missing.get(username):
+            return {}
+        return data
+
+    async def set(self, username: str, data: UserData) -> None:
+        self._cache.set(username, data)
+
+    async def set_missing(self, username: str) -> None:
+        self._missing.set(username, True)
+
+    async def invalidate(self, username: str) -> None:
+        self._cache.pop(username)
+        self._missing.pop(username)
+
+
+class InMemoryStore:
+    """Process-local `KeyValueStore`, standing in for a shared store in tests and single-node setups."""
+
+    def __init__(self, *, clock: Callable[[], float] = time.monotonic) -> None:
+        self._clock = clock
+        self._data: dict[str, tuple[float, bytes]] = {}
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        deadline, value = entry
+        if deadline <= self._clock():
+            del self._data[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: bytes, *, ttl: float) -> None:
+        self._data[key] = (self._clock() + ttl, value)
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+
+class SharedUserCache:
+    """User cache backed by a `KeyValueStore` shared between workers."""
+
+    # Stored for unknown usernames under the same key, so invalidating the name clears it
+    _MISSING = b"{}"
+
+    def __init__(self, store: KeyValueStore, *, ttl: float, missing_ttl: float = 0, prefix: str = "user:") -> None:
+        self.hits = 0
+        self.misses = 0
+        self._store = store
+        self._ttl = ttl
+        self._missing_ttl = missing_ttl
+        self._prefix = prefix
+
+    async def get(self, username: str) -> UserData | None:
+        raw = await self._store.get(self._prefix + username)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    async def set(self, username: str, data: UserData) -> None:
+        await self._store.set(self._prefix + username, codec.dumps_bytes(data), ttl=self._ttl)
+
+    async def set_missing(self, username: str) -> None:
+        if self._missing_ttl > 0:
+            await self._store.set(self._prefix + username, self._MISSING, ttl=self._missing_ttl)
+
+    async def invalidate(self, username: str) -> None:
+        await self._store.delete(self._prefix + username)
+
+
+class UsernameFilter:
+    """Bloom filter of existing usernames, kept current by polling new users.
+
+    A name the filter has not seen definitely does not exist, unless it was
+    created on another worker since the last `sync`. Until the first sync the
+    filter knows nothing and lets every name through.
+
+    New users are found by id, which the database assigns in insert order.
+    Inserts can commit out of that order, so ids a poll skipped over are asked
+    for again until they turn up or `_GAP_TIMEOUT` passes (a rolled back insert
+    never does). Once more users have been synced than the filter was sized
+    for, the next sync rebuilds it from every user.
+    """
+
+    # Longer than any registration transaction stays open
+    _GAP_TIMEOUT = 300.0
+    _MAX_GAPS = 1000
+
+    def __init__(self, *, error_rate: float = 0.01, clock: Callable[[], float] = time.monotonic) -> None:
+        self._error_rate = error_rate
+        self._clock = clock
+        self._bloom: BloomFilter | None = None
+        self._capacity = 0
+        self._count = 0
+        self._last_id = 0
+        self._gaps: dict[int, float] = {}
+        # Names added locally while a rebuild loads, replayed into the new filter
+        self._pending: list[str] | None = None
+
+    def might_exist(self, username: str) -> bool:
+        return self._bloom is None or username in self._bloom
+
+    def add(self, username: str) -> None:
+        if self._bloom is not None:
+            self._bloom.add(username)
+        if self._pending is not None:
+            self._pending.append(username)
+
+    async def sync(self, load: Callable[[int, Collection[int]], Awaitable[list[tuple[int, str]]]]) -> None:
+        """Add the users returned by ``load(after_id, ids)``: those with an id above ``after_id`` or in ``ids``.
+
+        The first call, and the first after the filter has filled up, builds a new filter from all users.
+        """
+        if self._bloom is not None and self._count <= self._capacity:
+            now = self._clock()
+            self._gaps = {user_id: seen for user_id, seen in self._gaps.items() if now - seen < self._GAP_TIMEOUT}
+            self._add_users(self._bloom, await load(self._last_id, list(self._gaps)))
+            return
+
+        self._pending = []
+        try:
+            users = await load(0, ())
+            # Room to double before the false positive rate degrades
+            capacity = max(2 * len(users), 1024)
+            bloom = BloomFilter(capacity=capacity, error_rate=self._error_rate)
+            for username in self._pending:
+                bloom.add(username)
+        finally:
+            self._pending = None
+        self._capacity, self._count, self._last_id, self._gaps = capacity, 0, 0, {}
+        self._add_users(bloom, users)
+        self._bloom = bloom
+
+    def _add_users(self, bloom: BloomFilter, users: list[tuple[int, str]]) -> None:
+        ids = set()
+        for user_id, username in users:
+            bloom.add(username)
+            ids.add(user_id)
+            self._gaps.pop(user_id, None)
+        self._count += len(users)
+        last_id = max(ids, default=0)
+        if last_id > self._last_id:
+            now = self._clock()
+            # Late commits sit just below the newest ids; older holes are deleted users or sequence jumps
+            skipped = range(max(self._last_id + 1, last_id - self._MAX_GAPS), last_id)
+            self._gaps.update((user_id, now) for user_id in skipped if user_id not in ids)
+            self._last_id = last_id
+
+
+_shared_store: KeyValueStore | None = None
+
+
+def use_shared_store(store: KeyValueStore | None) -> None:
+    """Back the user cache with ``store``, shared by every worker; None returns to the local cache.
+
+    Call it at startup, before the first lookup.
+    """
+    global _shared_store
+    _shared_store = store
+    user_cache.cache_clear()
+
+
+@cache
+def user_cache() -> UserCache:
+    if settings.user_cache_backend == "none" or settings.user_cache_ttl_seconds <= 0:
+        return NullUserCache()
+    if _shared_store is not None:
+        return SharedUserCache(
+            _shared_store,
+            ttl=settings.user_cache_ttl_seconds,
+            missing_ttl=settings.user_missing_cache_ttl_seconds,
+        )
+    return LocalUserCache(
+        maxsize=settings.user_cache_size,
+        ttl=settings.user_cache_ttl_seconds,
+        missing_maxsize=settings.user_missing_cache_size,
+        missing_ttl=settings.user_missing_cache_ttl_seconds,
+    )
+
+
+metrics.registry.callback(
+    "user_cache_hits_total", "User lookups answered by the user cache", lambda: user_cache().hits, kind="counter"
+)
+metrics.registry.callback(
+    "user_cache_misses_total", "User lookups that went to the database", lambda: user_cache().misses, kind="counter"
+)
+
+
+@cache
+def username_filter() -> UsernameFilter | None:
+    return UsernameFilter() if settings.user_bloom_filter else None
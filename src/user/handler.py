@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Request
 
 from common import erri
+from common.response import FastJSONResponse
 from middleware import auth
 from user import dto, service
 
@@ -9,58 +10,62 @@ router = APIRouter(prefix="/user", tags=["user"])
 
 @auth.exempt
 @router.post("/register", response_model=dto.UserRegisterResponse)
-async def register(body: dto.UserRegisterRequest) -> dto.UserRegisterResponse:
+async def register(body: dto.UserRegisterRequest) -> FastJSONResponse:
     try:
-        user = service.register_user(body.username, body.password)
+        user = await service.register_user(body.username, body.password)
         assert user.id is not None  # guaranteed by service
-        return dto.UserRegisterResponse(id=user.id, username=user.username)
+        return FastJSONResponse(dto.UserRegisterResponse(id=user.id, username=user.username))
     except erri.BusinessError as e:
-        raise HTTPException(status_code=e.status_code, detail=e.detail) from None
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers) from None
 
 
 @router.get("/whoami", response_model=dto.UserWhoAmIResponse)
-async def whoami(request: Request) -> dto.UserWhoAmIResponse:
+async def whoami(request: Request) -> FastJSONResponse:
     try:
         username = auth.get_username(request)
-        return dto.UserWhoAmIResponse(username=username)
+        return FastJSONResponse(dto.UserWhoAmIResponse(username=username))
     except erri.BusinessError as e:
-        raise HTTPException(status_code=e.status_code, detail=e.detail) from None
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers) from None
 
 
 @router.get("/me", response_model=dto.UserProfileResponse)
-async def get_me(request: Request) -> dto.UserProfileResponse:
+async def get_me(request: Request) -> FastJSONResponse:
     try:
         username = auth.get_username(request)
-        user = service.get_user_profile(username)
-        return dto.UserProfileResponse(
-            username=user.username,
-            nickname=user.nickname,
-            email=user.email,
-            avatar_url=user.avatar_url,
-            role=user.role,
-            is_active=user.is_active,
+        user = await service.get_user_profile(username)
+        return FastJSONResponse(
+            dto.UserProfileResponse(
+                username=user.username,
+                nickname=user.nickname,
+                email=user.email,
+                avatar_url=user.avatar_url,
+                role=user.role,
+                is_active=user.is_active,
+            )
         )
     except erri.BusinessError as e:
-        raise HTTPException(status_code=e.status_code, detail=e.detail) from None
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers) from None
 
 
 @router.patch("/me", response_model=dto.UserProfileResponse)
-async def update_me(request: Request, body: dto.UserProfileUpdateRequest) -> dto.UserProfileResponse:
+async def update_me(request: Request, body: dto.UserProfileUpdateRequest) -> FastJSONResponse:
     try:
         username = auth.get_username(request)
-        user = service.update_my_profile(
+        user = await service.update_my_profile(
             username,
             nickname=body.nickname,
             email=body.email,
             avatar_url=body.avatar_url,
         )
-        return dto.UserProfileResponse(
-            username=user.username,
-            nickname=user.nickname,
-            email=user.email,
-            avatar_url=user.avatar_url,
-            role=user.role,
-            is_active=user.is_active,
+        return FastJSONResponse(
+            dto.UserProfileResponse(
+                username=user.username,
+                nickname=user.nickname,
+                email=user.email,
+                avatar_url=user.avatar_url,
+                role=user.role,
+                is_active=user.is_active,
+            )
         )
     except erri.BusinessError as e:
-        raise HTTPException(status_code=e.status_code, detail=e.detail) from None
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers) from None
@@ -1,8 +1,17 @@
+from collections.abc import Collection
 from datetime import UTC, datetime
 
-from sqlmodel import Field, Session, SQLModel, select
+from sqlalchemy import or_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Field, SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from conf.db import engine
+from common import metrics
+from common.singleflight import SingleFlight
+from conf.config import settings
+from conf.db import engine, timed_query
+from user.cache import UserData, user_cache, username_filter
 
 
 class User(SQLModel, table=True):
@@ -18,45 +27,177 @@ class User(SQLModel, table=True):
     updated_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
 
 
-def create_user(username: str, password: str, *, role: str = "user") -> User | None:
+_user_loads: SingleFlight[str, UserData | None] = SingleFlight("get_user")
+# username -> [generation, loads in flight], tracked only while a load of the name runs.
+# Writes bump the generation so a load that overlaps them does not cache what it read.
+_generations: dict[str, list[int]] = {}
+_ABSENT_LOOKUPS = metrics.registry.counter(
+    "user_absent_lookups_total", "Lookups of unknown usernames answered without a query", ("source",)
+)
+
+# Dialects whose INSERT supports ON CONFLICT DO NOTHING; others detect duplicates through IntegrityError
+_CONFLICT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+@timed_query
+async def create_user(username: str, password: str, *, role: str = "user") -> User | None:
+    """Insert a new user in a single statement.
+
+    Returns None if the username is already taken, including when a concurrent
+    registration of the same name wins the race.
+    """
     user = User(username=username, password=password, nickname=username, role=role)
-    with Session(engine) as session:
-        try:
+    insert = _CONFLICT_INSERTS.get(engine.dialect.name)
+    # The returned user is read after commit, so keep its loaded state
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        if insert is not None:
+            statement = (
+                insert(User)
+                .values(**user.model_dump(exclude={"id"}))
+                .on_conflict_do_nothing(index_elements=["username"])
+                .returning(User.id)
+            )
+            user.id = (await session.exec(statement)).scalar_one_or_none()
+            if user.id is None:
+                return None
+        else:
             session.add(user)
-            session.commit()
-            session.refresh(user)
-        except Exception:
-            session.rollback()
-            return None
+            try:
+                await session.flush()
+            except IntegrityError:
+                return None
+        await session.commit()
+    await _invalidate(username)
+    known = username_filter()
+    if known is not None:
+        known.add(username)
     return user
 
 
-def get_user(username: str) -> User | None:
-    with Session(engine) as session:
-        return session.exec(select(User).where(User.username == username)).one_or_none()
+async def get_user(username: str) -> User | None:
+    """Return the user, served from `user.cache` when possible.
+
+    Concurrent cache misses for the same username share one database query.
+    Unknown usernames are answered from the cache or `username_filter` when
+    possible, without a query.
+    """
+    cache = user_cache()
+    data = await cache.get(username)
+    if data is None:
+        known = username_filter()
+        if known is not None and not known.might_exist(username):
+            _ABSENT_LOOKUPS.inc("filter")
+            return None
+        data = await _user_loads.do(username, lambda: _fetch_user(username), timeout=settings.user_load_timeout_seconds)
+    elif not data:
+        _ABSENT_LOOKUPS.inc("cache")
+    # Callers may modify the user, so each gets its own instance
+    return User.model_validate(data) if data else None
+
+
+async def _fetch_user(username: str) -> UserData | None:
+    entry = _generations.setdefault(username, [0, 0])
+    generation = entry[0]
+    entry[1] += 1
+    try:
+        user = await _load_user(username)
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _generations[username]
+    data = user.model_dump() if user is not None else None
+    if entry[0] != generation:
+        # Written while loading: the row read may predate the write, and its invalidation already ran
+        return data
+    if data is None:
+        await user_cache().set_missing(username)
+    else:
+        await user_cache().set(username, data)
+    return data
+
 
+async def _invalidate(username: str) -> None:
+    """Drop the cached user after a committed write, including what loads in flight would cache."""
+    entry = _generations.get(username)
+    if entry is not None:
+        entry[0] += 1
+    # Lookups from now on must see the write rather than join a load that may have read around it
+    _user_loads.forget(username)
+    await user_cache().invalidate(username)
 
-def update_user_profile(
+
+@timed_query
+async def _load_user(username: str) -> User | None:
+    async with AsyncSession(engine) as session:
+        return (await session.exec(select(User).where(User.username == username))).one_or_none()
+
+
+@timed_query
+async def list_usernames(after_id: int, ids: Collection[int] = ()) -> list[tuple[int, str]]:
+    """Get (id, username) of the users with an id above ``after_id`` or in ``ids``."""
+    condition = User.id > after_id  # type: ignore[operator]
+    if ids:
+        condition = or_(condition, User.id.in_(ids))  # type: ignore[union-attr]
+    statement = select(User.id, User.username).where(condition)
+    async with AsyncSession(engine) as session:
+        return [(user_id, username) for user_id, username in (await session.exec(statement)).all()]
+
+
+@timed_query
+async def update_user_profile(
     username: str,
     *,
     nickname: str | None = None,
     email: str | None = None,
     avatar_url: str | None = None,
 ) -> User | None:
-    with Session(engine) as session:
-        user = session.exec(select(User).where(User.username == username)).one_or_none()
-        if not user:
+    """Update the given non-None profile fields and return the updated user.
+
+    Runs a single ``UPDATE ... RETURNING`` where the backend supports it and
+    falls back to loading and flushing the row otherwise.
+    """
+    changes = {
+        field: value
+        for field, value in (("nickname", nickname), ("email", email), ("avatar_url", avatar_url))
+        if value is not None
+    }
+    changes["updated_at"] = datetime.now(UTC)
+
+    # The returned user is read after commit, so keep its loaded state
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        if engine.dialect.update_returning:
+            statement = update(User).where(User.username == username).values(**changes).returning(User)
+            user = (await session.exec(statement)).scalar_one_or_none()
+        else:
+            user = (await session.exec(select(User).where(User.username == username))).one_or_none()
+            if user is not None:
+                user.sqlmodel_update(changes)
+                session.add(user)
+        if user is None:
             return None
+        await session.commit()
+    await _invalidate(username)
+    return user
+
+
+@timed_query
+async def replace_password_hash(username: str, old_hash: str, new_hash: str) -> str | None:
+    """Store ``new_hash`` in place of ``old_hash`` unless the user's hash changed meanwhile.
 
-        if nickname is not None:
-            user.nickname = nickname
-        if email is not None:
-            user.email = email
-        if avatar_url is not None:
-            user.avatar_url = avatar_url
-
-        user.updated_at = datetime.now(UTC)
-        session.add(user)
-        session.commit()
-        session.refresh(user)
-        return user
+    Returns the hash stored afterwards: ``new_hash``, or the one another
+    request stored first. None if the user no longer exists.
+    """
+    statement = (
+        update(User)
+        .where(User.username == username, User.password == old_hash)
+        .values(password=new_hash, updated_at=datetime.now(UTC))
+    )
+    async with AsyncSession(engine) as session:
+        if (await session.exec(statement)).rowcount:
+            await session.commit()
+            stored: str | None = new_hash
+        else:
+            stored = (await session.exec(select(User.password).where(User.username == username))).one_or_none()
+    if stored == new_hash:
+        await _invalidate(username)
+    return stored
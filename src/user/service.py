@@ -1,36 +1,60 @@
+import asyncio
+
+from loguru import logger
+
 from auth.service import get_password_hash
 from common import erri
 from conf.config import settings
-from user.model import User, create_user, get_user, update_user_profile
+from user.cache import username_filter
+from user.model import User, create_user, get_user, list_usernames, update_user_profile
 
 
-def register_user(username: str, password: str) -> User:
-    if get_user(username):
+async def register_user(username: str, password: str) -> User:
+    encrypted_password = await get_password_hash(password)
+    # The insert itself detects taken names, so concurrent registrations cannot both pass a check
+    user = await create_user(username, encrypted_password)
+    if not user:
         raise erri.conflict("User already exists")
-    encrypted_password = get_password_hash(password)
-    user = create_user(username, encrypted_password)
-    if not user or user.id is None:
+    if user.id is None:
         raise erri.internal("Create user failed")
+    logger.info("Registered user {}", username)
     return user
 
 
-def get_user_profile(username: str) -> User:
-    user = get_user(username)
+async def get_user_profile(username: str) -> User:
+    user = await get_user(username)
     if not user:
         raise erri.not_found("User not found")
     return user
 
 
-def update_my_profile(username: str, *, nickname: str | None, email: str | None, avatar_url: str | None) -> User:
-    user = update_user_profile(username, nickname=nickname, email=email, avatar_url=avatar_url)
+async def update_my_profile(username: str, *, nickname: str | None, email: str | None, avatar_url: str | None) -> User:
+    user = await update_user_profile(username, nickname=nickname, email=email, avatar_url=avatar_url)
     if not user:
         raise erri.not_found("User not found")
     return user
 
 
-def ensure_admin_user() -> None:
+async def ensure_admin_user() -> None:
     """Ensure the admin user exists, create if not."""
-    if get_user(settings.admin_username):
+    if await get_user(settings.admin_username):
         return
-    encrypted_password = get_password_hash(settings.admin_password)
-    create_user(settings.admin_username, encrypted_password, role="admin")
+    encrypted_password = await get_password_hash(settings.admin_password)
+    await create_user(settings.admin_username, encrypted_password, role="admin")
+
+
+async def sync_username_filter() -> None:
+    """Add users created since the last sync to the username filter, if enabled."""
+    known = username_filter()
+    if known is not None:
+        await known.sync(list_usernames)
+
+
+async def run_username_filter_sync(interval: float) -> None:
+    """Sync the username filter every ``interval`` seconds until cancelled."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await sync_username_filter()
+        except Exception:
+            logger.exception("Username filter sync failed")
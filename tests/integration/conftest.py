@@ -2,6 +2,8 @@
 Integration test fixtures.
 
 Uses a temporary SQLite database to isolate tests from the real database.
+The application talks to it through aiosqlite, the same way it talks to
+Postgres through psycopg's async driver.
 """
 
 import tempfile
@@ -10,30 +12,39 @@ from pathlib import Path
 
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
 from sqlmodel import Session, SQLModel, create_engine
 
 from auth import model as auth_model
+from auth import stateless
 from conf import db as db_module
+from user import cache as user_cache_module
 from user import model as user_model
 
 
 @pytest.fixture(scope="function")
-def test_engine():
-    """Create a fresh temporary SQLite database for each test."""
+def db_path() -> Generator[str, None, None]:
+    """Create a fresh temporary SQLite database file for each test."""
     # Use a temporary file instead of in-memory to avoid connection issues
     with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as f:
-        db_path = f.name
+        path = f.name
 
-    sqlite_url = f"sqlite:///{db_path}"
-    engine = create_engine(
-        sqlite_url,
-        connect_args={"check_same_thread": False},
-    )
+    engine = create_engine(f"sqlite:///{path}")
     SQLModel.metadata.create_all(engine)
-    yield engine
     engine.dispose()
+    yield path
     # Clean up the temporary file
-    Path(db_path).unlink(missing_ok=True)
+    Path(path).unlink(missing_ok=True)
+
+
+@pytest.fixture(scope="function")
+def test_engine(db_path: str):
+    """Create an async engine bound to the temporary SQLite database."""
+    # NullPool: the TestClient runs the app on its own event loop, so connections must not outlive a request
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}", poolclass=NullPool)
+    yield engine
+    engine.sync_engine.dispose()
 
 
 @pytest.fixture(scope="function")
@@ -47,6 +58,10 @@ def client(test_engine, monkeypatch) -> Generator[TestClient, None, None]:
     monkeypatch.setattr(db_module, "engine", test_engine)
     monkeypatch.setattr(user_model, "engine", test_engine)
     monkeypatch.setattr(auth_model, "engine", test_engine)
+    # Each test gets a fresh database, so cached users from earlier tests must not leak in
+    user_cache_module.user_cache.cache_clear()
+    user_cache_module.username_filter.cache_clear()
+    stateless.revocation_set.cache_clear()
 
     # Import create_app after patching to ensure patches are in effect
     from main import create_app
@@ -58,7 +73,20 @@ def client(test_engine, monkeypatch) -> Generator[TestClient, None, None]:
 
 
 @pytest.fixture(scope="function")
-def session(test_engine) -> Generator[Session, None, None]:
+def session(db_path: str) -> Generator[Session, None, None]:
     """Create a database session for direct database operations in tests."""
-    with Session(test_engine) as session:
+    engine = create_engine(f"sqlite:///{db_path}")
+    with Session(engine) as session:
         yield session
+    engine.dispose()
+
+
+@pytest.fixture(scope="function")
+def patched_engine(test_engine, monkeypatch: pytest.MonkeyPatch):
+    """Point the model functions at the test database without starting the app."""
+    monkeypatch.setattr(db_module, "engine", test_engine)
+    monkeypatch.setattr(auth_model, "engine", test_engine)
+    monkeypatch.setattr(user_model, "engine", test_engine)
+    stateless.revocation_set.cache_clear()
+    user_cache_module.user_cache.cache_clear()
+    return test_engine
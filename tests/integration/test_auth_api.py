@@ -4,7 +4,27 @@ Integration tests for Auth API endpoints.
 Tests the complete request/response cycle including database operations.
 """
 
+import asyncio
+
+import pytest
 from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from auth import hashing, service
+from conf.config import settings
+from user.model import User
+
+
+@pytest.mark.anyio
+async def test_concurrent_logins_with_a_legacy_hash_all_succeed(patched_engine, session: Session):
+    session.add(User(username="legacy_user", password=hashing.legacy_hash("secret123", settings.password_salt)))
+    session.commit()
+
+    pairs = await asyncio.gather(*(service.login_user("legacy_user", "secret123") for _ in range(3)))
+
+    assert all(pair.refresh_token for pair in pairs)
+    session.expire_all()
+    assert session.exec(select(User.password)).one().startswith("$scrypt$")
 
 
 class TestAuthLogin:
@@ -179,3 +199,36 @@ class TestLogout:
         )
         # Logout is idempotent - should succeed even with invalid token
         assert response.status_code == 200
+
+
+class TestLogoutAll:
+    """Tests for POST /auth/logout-all endpoint."""
+
+    def test_logout_all_revokes_every_refresh_token(self, client: TestClient):
+        client.post("/user/register", json={"username": "everywhere", "password": "secret123"})
+        sessions = [
+            client.post("/auth/login", data={"username": "everywhere", "password": "secret123"}).json()
+            for _ in range(3)
+        ]
+
+        response = client.post(
+            "/auth/logout-all",
+            headers={"Authorization": f"Bearer {sessions[0]['access_token']}"},
+        )
+        assert response.status_code == 200
+        assert response.json()["revoked"] == 3
+
+        for session in sessions:
+            refresh_response = client.post("/auth/refresh", json={"refresh_token": session["refresh_token"]})
+            assert refresh_response.status_code == 401
+
+        # Nothing left to revoke
+        again = client.post(
+            "/auth/logout-all",
+            headers={"Authorization": f"Bearer {sessions[0]['access_token']}"},
+        )
+        assert again.json()["revoked"] == 0
+
+    def test_logout_all_requires_access_token(self, client: TestClient):
+        response = client.post("/auth/logout-all")
+        assert response.status_code == 401
@@ -0,0 +1,100 @@
+"""
+Integration tests for refresh token rotation at the model level.
+"""
+
+import asyncio
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from sqlmodel import Session, select
+
+from auth import model as auth_model
+from auth.model import RefreshToken, hash_refresh_token
+from user.model import User
+
+pytestmark = pytest.mark.anyio
+
+
+def _add_token(session: Session, token: str, *, expires_in: timedelta, revoked: bool = False) -> None:
+    session.add(
+        RefreshToken(
+            token_hash=hash_refresh_token(token),
+            user_id=1,
+            username="alice",
+            expires_at=datetime.now(UTC) + expires_in,
+            revoked=revoked,
+        )
+    )
+    session.commit()
+
+
+async def test_rotate_revokes_old_token_and_issues_new_one(patched_engine, session: Session):
+    _add_token(session, "old", expires_in=timedelta(hours=1))
+
+    rotated = await auth_model.rotate_refresh_token("old")
+
+    assert rotated is not None
+    new_token, stored = rotated
+    assert stored.id is not None
+    assert new_token != "old"
+    assert stored.token_hash == hash_refresh_token(new_token)
+    assert (stored.user_id, stored.username) == (1, "alice")
+    rows = {row.token_hash: (row.revoked, row.revoked_at is not None) for row in session.exec(select(RefreshToken))}
+    assert rows == {hash_refresh_token("old"): (True, True), hash_refresh_token(new_token): (False, False)}
+
+
+@pytest.mark.parametrize(
+    ("token", "expires_in", "revoked"),
+    [
+        ("revoked", timedelta(hours=1), True),
+        ("expired", -timedelta(minutes=1), False),
+    ],
+)
+async def test_rotate_rejects_revoked_or_expired_token(
+    patched_engine, session: Session, token: str, expires_in: timedelta, revoked: bool
+):
+    _add_token(session, token, expires_in=expires_in, revoked=revoked)
+
+    assert await auth_model.rotate_refresh_token(token) is None
+    assert len(session.exec(select(RefreshToken)).all()) == 1
+
+
+async def test_rotate_unknown_token(patched_engine):
+    assert await auth_model.rotate_refresh_token("missing") is None
+
+
+async def test_concurrent_rotations_of_one_token_issue_one_new_token(patched_engine, session: Session):
+    _add_token(session, "shared", expires_in=timedelta(hours=1))
+
+    results = await asyncio.gather(*(auth_model.rotate_refresh_token("shared") for _ in range(5)))
+
+    assert sum(result is not None for result in results) == 1
+    assert len(session.exec(select(RefreshToken)).all()) == 2
+
+
+async def test_only_the_token_hash_is_stored(patched_engine, session: Session):
+    token, stored = await auth_model.create_refresh_token(1, "alice")
+
+    row = session.exec(select(RefreshToken)).one()
+    assert row.token_hash == hash_refresh_token(token) == stored.token_hash
+    assert len(row.token_hash) == 32
+    assert token.encode() not in row.token_hash
+    assert await auth_model.get_refresh_token(token) is not None
+
+
+async def test_login_token_requires_the_current_password_hash(patched_engine, session: Session):
+    user = User(username="alice", password="current-hash")
+    session.add(user)
+    session.commit()
+    session.refresh(user)
+    assert user.id is not None
+
+    assert await auth_model.create_refresh_token(user.id, "alice", password_hash="stale-hash") is None
+    assert session.exec(select(RefreshToken)).all() == []
+
+    issued = await auth_model.create_refresh_token(user.id, "alice", password_hash="current-hash")
+    assert issued is not None
+    token, stored = issued
+    row = session.exec(select(RefreshToken)).one()
+    assert (row.id, row.user_id, row.username, row.revoked) == (stored.id, user.id, "alice", False)
+    assert row.token_hash == hash_refresh_token(token)
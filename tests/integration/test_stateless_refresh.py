@@ -0,0 +1,111 @@
+"""
+Integration tests for stateless (JWT) refresh tokens.
+"""
+
+import asyncio
+from collections.abc import Generator
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from auth import stateless
+from auth.model import RefreshToken, RefreshTokenRevocation
+from conf.config import settings
+
+
+@pytest.fixture
+def jwt_client(monkeypatch: pytest.MonkeyPatch, client: TestClient) -> Generator[TestClient, None, None]:
+    monkeypatch.setattr(settings, "refresh_token_mode", "jwt")
+    yield client
+
+
+def _login(client: TestClient, username: str = "stateless_user") -> dict[str, str]:
+    client.post("/user/register", json={"username": username, "password": "secret123"})
+    return client.post("/auth/login", data={"username": username, "password": "secret123"}).json()
+
+
+def _refresh(client: TestClient, refresh_token: str):
+    return client.post("/auth/refresh", json={"refresh_token": refresh_token})
+
+
+def test_login_issues_stateless_token_without_storing_it(jwt_client: TestClient, session: Session):
+    tokens = _login(jwt_client)
+
+    assert stateless.is_stateless_token(tokens["refresh_token"])
+    assert session.exec(select(RefreshToken)).all() == []
+
+
+def test_refresh_rotates_and_only_records_the_spent_token(jwt_client: TestClient, session: Session):
+    tokens = _login(jwt_client)
+
+    response = _refresh(jwt_client, tokens["refresh_token"])
+
+    assert response.status_code == 200
+    assert response.json()["refresh_token"] != tokens["refresh_token"]
+    assert [row.kind for row in session.exec(select(RefreshTokenRevocation)).all()] == ["token"]
+
+
+def test_reused_token_revokes_the_whole_family(jwt_client: TestClient):
+    tokens = _login(jwt_client)
+    successor = _refresh(jwt_client, tokens["refresh_token"]).json()["refresh_token"]
+
+    assert _refresh(jwt_client, tokens["refresh_token"]).status_code == 401
+    # The successor belongs to the reused family, so it is revoked too
+    assert _refresh(jwt_client, successor).status_code == 401
+
+
+def test_logout_revokes_the_session(jwt_client: TestClient):
+    tokens = _login(jwt_client)
+
+    assert jwt_client.post("/auth/logout", json={"refresh_token": tokens["refresh_token"]}).status_code == 200
+    assert _refresh(jwt_client, tokens["refresh_token"]).status_code == 401
+
+
+def test_logout_all_revokes_every_session(jwt_client: TestClient):
+    first = _login(jwt_client)
+    second = _login(jwt_client)
+
+    response = jwt_client.post("/auth/logout-all", headers={"Authorization": f"Bearer {first['access_token']}"})
+    assert response.status_code == 200
+
+    assert _refresh(jwt_client, first["refresh_token"]).status_code == 401
+    assert _refresh(jwt_client, second["refresh_token"]).status_code == 401
+    # Logging in again afterwards starts a valid session
+    assert _refresh(jwt_client, _login(jwt_client)["refresh_token"]).status_code == 200
+
+
+def test_revocations_reach_other_workers_through_sync(jwt_client: TestClient):
+    tokens = _login(jwt_client)
+    jwt_client.post("/auth/logout", json={"refresh_token": tokens["refresh_token"]})
+
+    # A fresh set stands in for another worker that has not seen the logout yet
+    other_worker = stateless.RevocationSet()
+    claims = stateless._decode(tokens["refresh_token"])
+    assert claims is not None
+    assert not other_worker.is_revoked(claims)
+    asyncio.run(other_worker.sync())
+    assert other_worker.is_revoked(claims)
+
+
+def test_refresh_token_is_not_an_access_token(jwt_client: TestClient):
+    tokens = _login(jwt_client)
+
+    response = jwt_client.get("/user/whoami", headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+    assert response.status_code == 401
+
+
+def test_opaque_session_moves_to_a_stateless_token_after_switching_to_jwt(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch, session: Session
+):
+    opaque = _login(client)["refresh_token"]
+    monkeypatch.setattr(settings, "refresh_token_mode", "jwt")
+
+    response = _refresh(client, opaque)
+    assert response.status_code == 200
+    refreshed = response.json()["refresh_token"]
+    assert stateless.is_stateless_token(refreshed)
+    # The opaque row is spent and no new one is stored
+    assert [row.revoked for row in session.exec(select(RefreshToken)).all()] == [True]
+    assert _refresh(client, opaque).status_code == 401
+    assert _refresh(client, refreshed).status_code == 200
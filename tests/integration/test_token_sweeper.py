@@ -0,0 +1,89 @@
+"""
+Integration tests for the refresh token purge.
+"""
+
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from sqlmodel import Session, select
+
+from auth import sweeper
+from auth.model import RefreshToken, RefreshTokenRevocation, hash_refresh_token
+
+pytestmark = pytest.mark.anyio
+
+
+def _token(
+    name: str, *, expires_in: timedelta, age: timedelta = timedelta(), revoked_ago: timedelta | None = None
+) -> RefreshToken:
+    now = datetime.now(UTC)
+    return RefreshToken(
+        token_hash=hash_refresh_token(name),
+        user_id=1,
+        username="alice",
+        expires_at=now + expires_in,
+        revoked=revoked_ago is not None,
+        revoked_at=None if revoked_ago is None else now - revoked_ago,
+        created_at=now - age,
+    )
+
+
+async def test_purge_deletes_expired_and_long_revoked_tokens_in_batches(
+    patched_engine, session: Session, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(sweeper.settings, "refresh_token_sweep_batch_size", 2)
+    monkeypatch.setattr(sweeper.settings, "refresh_token_revoked_retention_seconds", 3600)
+    session.add_all(
+        [
+            _token("active", expires_in=timedelta(days=1)),
+            _token(
+                "recently-revoked",
+                expires_in=timedelta(days=1),
+                age=timedelta(hours=2),
+                revoked_ago=timedelta(minutes=5),
+            ),
+            _token("old-revoked", expires_in=timedelta(days=1), age=timedelta(hours=3), revoked_ago=timedelta(hours=2)),
+            *(_token(f"expired-{i}", expires_in=-timedelta(minutes=1)) for i in range(4)),
+        ]
+    )
+    # Revoked by a release that did not record revoked_at: left until it expires
+    unrecorded = _token("unrecorded-revoked", expires_in=timedelta(days=1), age=timedelta(hours=3))
+    unrecorded.revoked = True
+    session.add(unrecorded)
+    session.commit()
+
+    assert await sweeper.purge_once() == 5
+
+    remaining = {token.token_hash for token in session.exec(select(RefreshToken)).all()}
+    assert remaining == {
+        hash_refresh_token("active"),
+        hash_refresh_token("recently-revoked"),
+        hash_refresh_token("unrecorded-revoked"),
+    }
+
+
+async def test_purge_deletes_expired_revocation_entries(patched_engine, session: Session):
+    now = datetime.now(UTC)
+    session.add_all(
+        [
+            RefreshTokenRevocation(kind="token", key="spent", user_id=1, expires_at=now - timedelta(minutes=1)),
+            RefreshTokenRevocation(kind="family", key="live", user_id=1, expires_at=now + timedelta(days=1)),
+        ]
+    )
+    session.commit()
+
+    assert await sweeper.purge_once() == 1
+
+    assert [row.key for row in session.exec(select(RefreshTokenRevocation)).all()] == ["live"]
+
+
+async def test_purge_is_skipped_when_lock_is_held(patched_engine, monkeypatch: pytest.MonkeyPatch):
+    class _Held:
+        async def __aenter__(self) -> bool:
+            return False
+
+        async def __aexit__(self, *_: object) -> None:
+            return None
+
+    monkeypatch.setattr(sweeper, "advisory_lock", lambda key: _Held())
+    assert await sweeper.purge_once() is None
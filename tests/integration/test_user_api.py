@@ -4,7 +4,17 @@ Integration tests for User API endpoints.
 Tests the complete request/response cycle including database operations.
 """
 
+import pytest
 from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from auth import model as auth_model
+from common.executor import BoundedExecutor, ExecutorSaturatedError
+from conf import db as db_module
+from conf.config import settings
+from user import model as user_model
+from user.cache import user_cache, username_filter
+from user.model import User
 
 
 class TestUserRegister:
@@ -39,6 +49,24 @@ class TestUserRegister:
         assert response2.status_code == 409
         assert "already exists" in response2.json()["detail"].lower()
 
+    @pytest.mark.parametrize(
+        ("path", "payload", "as_form"),
+        [
+            ("/user/register", {"username": "busy_user", "password": "busypass"}, False),
+            ("/auth/login", {"username": "busy_user", "password": "busypass"}, True),
+        ],
+    )
+    def test_saturated_hash_pool_returns_retry_after(
+        self, client: TestClient, monkeypatch: pytest.MonkeyPatch, path: str, payload: dict, as_form: bool
+    ):
+        async def _saturated(*_: object) -> None:
+            raise ExecutorSaturatedError("saturated")
+
+        monkeypatch.setattr(BoundedExecutor, "run", _saturated)
+        response = client.post(path, data=payload) if as_form else client.post(path, json=payload)
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+
 
 class TestProtectedEndpoints:
     """Tests for protected endpoints requiring authentication."""
@@ -76,3 +104,95 @@ class TestProtectedEndpoints:
             headers={"Authorization": "Bearer invalid-token"},
         )
         assert response.status_code == 401
+
+
+class TestUserCache:
+    """Tests for the read-through user cache behind GET/PATCH /user/me."""
+
+    def _login(self, client: TestClient) -> dict[str, str]:
+        client.post("/user/register", json={"username": "cache_user", "password": "cachepass"})
+        token = client.post("/auth/login", data={"username": "cache_user", "password": "cachepass"}).json()[
+            "access_token"
+        ]
+        return {"Authorization": f"Bearer {token}"}
+
+    def test_me_is_served_from_cache(self, client: TestClient):
+        headers = self._login(client)
+        cache = user_cache()
+        client.get("/user/me", headers=headers)
+        hits = cache.hits
+        response = client.get("/user/me", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["username"] == "cache_user"
+        assert cache.hits == hits + 1
+
+    def test_profile_update_invalidates_cache(self, client: TestClient, session: Session):
+        headers = self._login(client)
+        client.get("/user/me", headers=headers)
+        response = client.patch("/user/me", headers=headers, json={"nickname": "Cached"})
+        assert response.status_code == 200
+        assert client.get("/user/me", headers=headers).json()["nickname"] == "Cached"
+
+        # Writes that bypass the model layer are only seen once the entry expires
+        user = session.exec(select(User).where(User.username == "cache_user")).one()
+        user.nickname = "Direct"
+        session.add(user)
+        session.commit()
+        assert client.get("/user/me", headers=headers).json()["nickname"] == "Cached"
+
+    def test_registering_clears_the_unknown_name_entry(self, client: TestClient, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(settings, "user_missing_cache_ttl_seconds", 30)
+        user_cache.cache_clear()
+        credentials = {"username": "late_user", "password": "latepass"}
+        assert client.post("/auth/login", data=credentials).status_code == 400
+        # The second attempt is answered from the unknown-name entry
+        hits = user_cache().hits
+        assert client.post("/auth/login", data=credentials).status_code == 400
+        assert user_cache().hits == hits + 1
+
+        client.post("/user/register", json=credentials)
+        assert client.post("/auth/login", data=credentials).status_code == 200
+
+
+class TestUsernameFilter:
+    """Tests for the optional Bloom filter of existing usernames."""
+
+    def test_filter_is_built_at_startup_and_updated_on_register(
+        self, test_engine, monkeypatch: pytest.MonkeyPatch, session: Session
+    ):
+        session.add(User(username="existing", password="x"))
+        session.commit()
+        monkeypatch.setattr(settings, "user_bloom_filter", True)
+        monkeypatch.setattr(db_module, "engine", test_engine)
+        monkeypatch.setattr(user_model, "engine", test_engine)
+        monkeypatch.setattr(auth_model, "engine", test_engine)
+        user_cache.cache_clear()
+        username_filter.cache_clear()
+
+        from main import create_app
+
+        with TestClient(create_app()) as client:
+            known = username_filter()
+            assert known is not None
+            assert known.might_exist("existing")
+            assert not known.might_exist("bloom_user")
+
+            credentials = {"username": "bloom_user", "password": "bloompass"}
+            client.post("/user/register", json=credentials)
+            assert known.might_exist("bloom_user")
+            assert client.post("/auth/login", data=credentials).status_code == 200
+        username_filter.cache_clear()
+
+
+class TestMetricsEndpoint:
+    """Tests for GET /metrics."""
+
+    def test_metrics_is_public_and_labels_by_route(self, client: TestClient):
+        client.get("/user/whoami")
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert 'http_requests_total{method="GET",route="/user/whoami",status="401"}' in response.text
+        assert "jwt_verify_failures_total" in response.text
+        assert "# TYPE jwt_cache_hits_total counter" in response.text
+        assert "# TYPE user_cache_misses_total counter" in response.text
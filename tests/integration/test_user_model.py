@@ -0,0 +1,126 @@
+"""
+Integration tests for user model functions against the test database.
+"""
+
+import asyncio
+
+import pytest
+from sqlmodel import Session, select
+
+from conf.config import settings
+from user import model as user_model
+from user.cache import user_cache
+from user.model import User
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(params=[True, False], ids=["returning", "orm-fallback"])
+def update_returning(request: pytest.FixtureRequest, patched_engine, monkeypatch: pytest.MonkeyPatch) -> bool:
+    monkeypatch.setattr(patched_engine.dialect, "update_returning", request.param)
+    return request.param
+
+
+async def test_update_user_profile_changes_only_given_fields(update_returning: bool, session: Session):
+    session.add(User(username="alice", password="x", nickname="Alice", email="alice@example.com"))
+    session.commit()
+    before = session.exec(select(User)).one().updated_at
+
+    user = await user_model.update_user_profile("alice", nickname="Al")
+
+    assert user is not None
+    assert (user.id, user.username, user.nickname, user.email) == (1, "alice", "Al", "alice@example.com")
+    session.expire_all()
+    stored = session.exec(select(User)).one()
+    assert (stored.nickname, stored.email) == ("Al", "alice@example.com")
+    assert stored.updated_at > before
+
+
+async def test_update_user_profile_unknown_user(update_returning: bool):
+    assert await user_model.update_user_profile("ghost", nickname="Boo") is None
+
+
+@pytest.fixture(params=[True, False], ids=["on-conflict", "integrity-error"])
+def on_conflict(request: pytest.FixtureRequest, patched_engine, monkeypatch: pytest.MonkeyPatch) -> bool:
+    if not request.param:
+        monkeypatch.setattr(user_model, "_CONFLICT_INSERTS", {})
+    return request.param
+
+
+async def test_create_user_returns_none_for_taken_username(on_conflict: bool, session: Session):
+    user = await user_model.create_user("bob", "hash")
+    assert user is not None
+    assert user.id is not None
+    assert user.nickname == "bob"
+
+    assert await user_model.create_user("bob", "other-hash") is None
+    assert [row.password for row in session.exec(select(User)).all()] == ["hash"]
+
+
+async def test_concurrent_registrations_of_one_name_create_one_user(on_conflict: bool, session: Session):
+    results = await asyncio.gather(*(user_model.create_user("carol", f"hash-{i}") for i in range(5)))
+
+    assert sum(result is not None for result in results) == 1
+    assert len(session.exec(select(User)).all()) == 1
+
+
+async def test_update_during_a_cache_miss_is_not_cached_stale(patched_engine, session: Session, monkeypatch):
+    session.add(User(username="alice", password="x", nickname="old"))
+    session.commit()
+    loaded, release = asyncio.Event(), asyncio.Event()
+    load_user = user_model._load_user
+
+    async def _slow_load(username: str) -> User | None:
+        user = await load_user(username)
+        loaded.set()
+        await release.wait()
+        return user
+
+    monkeypatch.setattr(user_model, "_load_user", _slow_load)
+    lookup = asyncio.ensure_future(user_model.get_user("alice"))
+    await loaded.wait()
+    await user_model.update_user_profile("alice", nickname="new")
+    release.set()
+    await lookup
+
+    monkeypatch.setattr(user_model, "_load_user", load_user)
+    user = await user_model.get_user("alice")
+    assert user is not None
+    assert user.nickname == "new"
+
+
+async def test_registration_during_an_unknown_name_lookup(patched_engine, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(settings, "user_missing_cache_ttl_seconds", 30)
+    user_cache.cache_clear()
+    loaded, release = asyncio.Event(), asyncio.Event()
+    load_user = user_model._load_user
+
+    async def _slow_load(username: str) -> User | None:
+        user = await load_user(username)
+        if not loaded.is_set():
+            loaded.set()
+            await release.wait()
+        return user
+
+    monkeypatch.setattr(user_model, "_load_user", _slow_load)
+    lookup = asyncio.ensure_future(user_model.get_user("bob"))
+    await loaded.wait()
+    assert await user_model.create_user("bob", "hash") is not None
+
+    # Lookups after the commit do not join the load that read before it
+    assert await user_model.get_user("bob") is not None
+    release.set()
+    assert await lookup is None
+    # ...and that load does not leave an unknown-name entry behind
+    assert await user_model.get_user("bob") is not None
+
+
+async def test_replace_password_hash_keeps_the_first_upgrade(patched_engine, session: Session):
+    session.add(User(username="alice", password="legacy"))
+    session.commit()
+
+    assert await user_model.replace_password_hash("alice", "legacy", "first") == "first"
+    assert await user_model.replace_password_hash("alice", "legacy", "second") == "first"
+    assert await user_model.replace_password_hash("ghost", "legacy", "third") is None
+    session.expire_all()
+    assert session.exec(select(User.password)).one() == "first"
@@ -1,13 +1,26 @@
+import asyncio
+import time
+from typing import Any
+
 import pytest
 from fastapi import APIRouter, FastAPI, Request
+from fastapi.responses import StreamingResponse
 from fastapi.testclient import TestClient
+from jwt import PyJWT
 
 from auth import service as auth_service
+from common import erri, metrics
+from common.cache import TTLCache
+from conf.config import settings
 from middleware import auth
 from user import handler as user_handler
 from user.model import User
 
 
+async def _mock_create_refresh_token(user_id: int, username: str, **_: object) -> tuple[str, object]:
+    return "mock-refresh", object()
+
+
 def test_jwt_middleware_returns_401_when_missing_authorization_header():
     auth.EXEMPT_PATHS.clear()
     app = FastAPI()
@@ -101,11 +114,11 @@ def test_get_username_returns_username_from_request_state_when_middleware_instal
     monkeypatch.setattr(
         auth_service,
         "create_refresh_token",
-        lambda user_id, username: type("MockToken", (), {"token": "mock-refresh"})(),
+        _mock_create_refresh_token,
         raising=True,
     )
 
-    token_pair = auth_service.create_token(User(id=1, username="alice", password="x"))
+    token_pair = asyncio.run(auth_service.create_token(User(id=1, username="alice", password="x")))
     resp = client.get("/me", headers={"Authorization": f"Bearer {token_pair.access_token}"})
     assert resp.status_code == 200
     assert resp.json() == {"username": "alice"}
@@ -124,11 +137,11 @@ def test_get_username_can_parse_username_from_authorization_header_without_middl
     monkeypatch.setattr(
         auth_service,
         "create_refresh_token",
-        lambda user_id, username: type("MockToken", (), {"token": "mock-refresh"})(),
+        _mock_create_refresh_token,
         raising=True,
     )
 
-    token_pair = auth_service.create_token(User(id=2, username="bob", password="x"))
+    token_pair = asyncio.run(auth_service.create_token(User(id=2, username="bob", password="x")))
     resp = client.get("/me", headers={"Authorization": f"Bearer {token_pair.access_token}"})
     assert resp.status_code == 200
     assert resp.json() == {"username": "bob"}
@@ -145,11 +158,11 @@ def test_user_whoami_returns_username_from_token(monkeypatch: pytest.MonkeyPatch
     monkeypatch.setattr(
         auth_service,
         "create_refresh_token",
-        lambda user_id, username: type("MockToken", (), {"token": "mock-refresh"})(),
+        _mock_create_refresh_token,
         raising=True,
     )
 
-    token_pair = auth_service.create_token(User(id=1, username="alice", password="x"))
+    token_pair = asyncio.run(auth_service.create_token(User(id=1, username="alice", password="x")))
     resp = client.get("/user/whoami", headers={"Authorization": f"Bearer {token_pair.access_token}"})
     assert resp.status_code == 200
     assert resp.json() == {"username": "alice"}
@@ -164,7 +177,7 @@ def test_user_me_uses_get_username_to_fetch_profile(monkeypatch: pytest.MonkeyPa
 
     captured: dict[str, str] = {}
 
-    def _get_user_profile(username: str) -> User:
+    async def _get_user_profile(username: str) -> User:
         captured["username"] = username
         return User(
             id=1,
@@ -183,11 +196,11 @@ def test_user_me_uses_get_username_to_fetch_profile(monkeypatch: pytest.MonkeyPa
     monkeypatch.setattr(
         auth_service,
         "create_refresh_token",
-        lambda user_id, username: type("MockToken", (), {"token": "mock-refresh"})(),
+        _mock_create_refresh_token,
         raising=True,
     )
 
-    token_pair = auth_service.create_token(User(id=1, username="alice", password="x"))
+    token_pair = asyncio.run(auth_service.create_token(User(id=1, username="alice", password="x")))
     resp = client.get("/user/me", headers={"Authorization": f"Bearer {token_pair.access_token}"})
     assert resp.status_code == 200
     assert captured["username"] == "alice"
@@ -201,7 +214,9 @@ def test_user_me_patch_updates_profile(monkeypatch: pytest.MonkeyPatch):
     auth.setup_auth_middleware(app)
     client = TestClient(app)
 
-    def _update_my_profile(username: str, *, nickname: str | None, email: str | None, avatar_url: str | None) -> User:
+    async def _update_my_profile(
+        username: str, *, nickname: str | None, email: str | None, avatar_url: str | None
+    ) -> User:
         return User(
             id=1,
             username=username,
@@ -219,11 +234,11 @@ def test_user_me_patch_updates_profile(monkeypatch: pytest.MonkeyPatch):
     monkeypatch.setattr(
         auth_service,
         "create_refresh_token",
-        lambda user_id, username: type("MockToken", (), {"token": "mock-refresh"})(),
+        _mock_create_refresh_token,
         raising=True,
     )
 
-    token_pair = auth_service.create_token(User(id=1, username="alice", password="x"))
+    token_pair = asyncio.run(auth_service.create_token(User(id=1, username="alice", password="x")))
     resp = client.patch(
         "/user/me",
         headers={"Authorization": f"Bearer {token_pair.access_token}"},
@@ -232,3 +247,90 @@ def test_user_me_patch_updates_profile(monkeypatch: pytest.MonkeyPatch):
     assert resp.status_code == 200
     assert resp.json()["username"] == "alice"
     assert resp.json()["nickname"] == "NewName"
+
+
+class _CountingJWT:
+    def __init__(self) -> None:
+        self.calls = 0
+        self._jwt = PyJWT()
+
+    def decode(self, *args: Any, **kwargs: Any) -> dict[str, Any]:
+        self.calls += 1
+        return self._jwt.decode(*args, **kwargs)
+
+
+def test_verify_token_caches_verified_payload(monkeypatch: pytest.MonkeyPatch):
+    counting = _CountingJWT()
+    cache: TTLCache[bytes, dict[str, Any]] = TTLCache(maxsize=10, ttl=300)
+    monkeypatch.setattr(auth, "_jwt", lambda: counting, raising=True)
+    monkeypatch.setattr(auth, "token_cache", lambda: cache, raising=True)
+
+    token, _ = auth_service.create_access_token("alice")
+    assert auth.verify_token(token)["sub"] == "alice"
+    assert auth.verify_token(token)["sub"] == "alice"
+    assert counting.calls == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    text = metrics.render(metrics.registry.snapshot())
+    assert "jwt_cache_hits_total 1.0" in text
+    assert "jwt_cache_misses_total 1.0" in text
+
+
+def test_verify_token_cache_entry_expires_with_token(monkeypatch: pytest.MonkeyPatch):
+    counting = _CountingJWT()
+    clock = [0.0]
+    cache: TTLCache[bytes, dict[str, Any]] = TTLCache(maxsize=10, ttl=300, clock=lambda: clock[0])
+    monkeypatch.setattr(auth, "_jwt", lambda: counting, raising=True)
+    monkeypatch.setattr(auth, "token_cache", lambda: cache, raising=True)
+
+    now = int(time.time())
+    token = PyJWT().encode({"sub": "alice", "exp": now + 5}, settings.jwt_secret, algorithm=settings.jwt_algorithm)
+    auth.verify_token(token)
+    clock[0] += 6
+    auth.verify_token(token)
+    assert counting.calls == 2
+
+
+def test_verify_token_does_not_cache_invalid_tokens(monkeypatch: pytest.MonkeyPatch):
+    cache: TTLCache[bytes, dict[str, Any]] = TTLCache(maxsize=10, ttl=300)
+    monkeypatch.setattr(auth, "token_cache", lambda: cache, raising=True)
+
+    with pytest.raises(erri.BusinessError):
+        auth.verify_token("not-a-jwt")
+    assert len(cache) == 0
+
+
+def test_jwt_middleware_passes_streaming_responses_through():
+    auth.EXEMPT_PATHS.clear()
+    app = FastAPI()
+
+    @app.get("/stream")
+    async def stream(request: Request):
+        async def chunks():
+            yield f"user={request.state.user};".encode()
+            for i in range(3):
+                yield f"chunk{i};".encode()
+
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    auth.setup_auth_middleware(app)
+    client = TestClient(app)
+    token, _ = auth_service.create_access_token("alice")
+    resp = client.get("/stream", headers={"Authorization": f"Bearer {token}"})
+    assert resp.status_code == 200
+    assert resp.text == "user=alice;chunk0;chunk1;chunk2;"
+
+
+def test_jwt_middleware_rejects_non_bearer_authorization_header():
+    auth.EXEMPT_PATHS.clear()
+    app = FastAPI()
+
+    @app.get("/protected")
+    async def protected():
+        return {"ok": True}
+
+    auth.setup_auth_middleware(app)
+    client = TestClient(app)
+    resp = client.get("/protected", headers={"Authorization": "Basic YWxpY2U6cHc="})
+    assert resp.status_code == 401
+    assert resp.json() == {"detail": "Unauthorized"}
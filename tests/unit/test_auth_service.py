@@ -1,4 +1,6 @@
+import asyncio
 import hashlib
+import threading
 from unittest.mock import MagicMock
 
 import pytest
@@ -6,50 +8,111 @@ import pytest
 from auth import service
 from auth.service import TokenPair
 from common import erri
+from common.executor import BoundedExecutor
 from user.model import User
 
+pytestmark = pytest.mark.anyio
+
 
 @pytest.fixture
 def mock_settings(monkeypatch: pytest.MonkeyPatch) -> MagicMock:
     """Create a mock settings object with default test values."""
     mock = MagicMock()
     mock.password_salt = "salt"
+    mock.password_hash_n = 1024
+    mock.password_hash_r = 8
+    mock.password_hash_p = 1
+    mock.password_hash_workers = 2
+    mock.password_hash_max_queue = 8
     monkeypatch.setattr(service, "settings", mock)
     return mock
 
 
-def test_get_password_hash_uses_salt(mock_settings: MagicMock):
-    password = "pw"
-    expected = hashlib.sha512((password + "salt").encode("utf-8")).hexdigest()
-    assert service.get_password_hash(password) == expected
+def _async_return(value: object):
+    async def _fn(*_: object, **__: object) -> object:
+        return value
+
+    return _fn
+
+
+async def test_get_password_hash_uses_random_salt(mock_settings: MagicMock):
+    first = await service.get_password_hash("pw")
+    second = await service.get_password_hash("pw")
+    assert first.startswith("$scrypt$n=1024,r=8,p=1$")
+    assert first != second
+    assert await service.verify_password("pw", first) == (True, False)
+    assert await service.verify_password("wrong", first) == (False, False)
+
+
+async def test_verify_password_accepts_legacy_hash_and_requests_rehash(mock_settings: MagicMock):
+    legacy = hashlib.sha512(("pw" + "salt").encode("utf-8")).hexdigest()
+    assert await service.verify_password("pw", legacy) == (True, True)
+    assert await service.verify_password("wrong", legacy) == (False, True)
+
+
+async def test_verify_password_requests_rehash_when_cost_changes(mock_settings: MagicMock):
+    hashed = await service.get_password_hash("pw")
+    mock_settings.password_hash_n = 2048
+    assert await service.verify_password("pw", hashed) == (True, True)
+
+
+async def test_password_hashing_returns_503_when_pool_is_saturated(monkeypatch: pytest.MonkeyPatch):
+    executor = BoundedExecutor(max_workers=1, max_queue=0)
+    monkeypatch.setattr(service, "_hash_executor", lambda: executor, raising=True)
+    release = threading.Event()
 
+    async def _occupy() -> None:
+        await executor.run(release.wait)
 
-def test_login_user_user_not_found(monkeypatch: pytest.MonkeyPatch):
-    monkeypatch.setattr(service, "get_user", lambda username: None, raising=True)
+    task = asyncio.create_task(_occupy())
+    await asyncio.sleep(0)
+    try:
+        with pytest.raises(erri.BusinessError) as exc:
+            await service.get_password_hash("pw")
+        assert exc.value.status_code == 503
+    finally:
+        release.set()
+        await task
+        executor.shutdown()
+
+
+def test_shutdown_hash_executor_stops_the_pool():
+    service._hash_executor.cache_clear()
+    executor = service._hash_executor()
+    service.shutdown_hash_executor()
+
+    with pytest.raises(RuntimeError):
+        executor._executor.submit(print)
+    assert service._hash_executor() is not executor
+    service.shutdown_hash_executor()
+
+
+async def test_login_user_user_not_found(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(service, "get_user", _async_return(None), raising=True)
     with pytest.raises(erri.BusinessError) as exc:
-        service.login_user("alice", "pw")
+        await service.login_user("alice", "pw")
     assert exc.value.status_code == 401
 
 
-def test_login_user_password_mismatch(monkeypatch: pytest.MonkeyPatch, mock_settings: MagicMock):
-    user = User(id=1, username="alice", password=service.get_password_hash("correct"))
-    monkeypatch.setattr(service, "get_user", lambda username: user, raising=True)
+async def test_login_user_password_mismatch(monkeypatch: pytest.MonkeyPatch, mock_settings: MagicMock):
+    user = User(id=1, username="alice", password=await service.get_password_hash("correct"))
+    monkeypatch.setattr(service, "get_user", _async_return(user), raising=True)
     with pytest.raises(erri.BusinessError) as exc:
-        service.login_user("alice", "wrong")
+        await service.login_user("alice", "wrong")
     assert exc.value.status_code == 401
 
 
-def test_login_user_user_without_id(monkeypatch: pytest.MonkeyPatch, mock_settings: MagicMock):
-    user = User(id=None, username="alice", password=service.get_password_hash("pw"))
-    monkeypatch.setattr(service, "get_user", lambda username: user, raising=True)
+async def test_login_user_user_without_id(monkeypatch: pytest.MonkeyPatch, mock_settings: MagicMock):
+    user = User(id=None, username="alice", password=await service.get_password_hash("pw"))
+    monkeypatch.setattr(service, "get_user", _async_return(user), raising=True)
     with pytest.raises(erri.BusinessError) as exc:
-        service.login_user("alice", "pw")
+        await service.login_user("alice", "pw")
     assert exc.value.status_code == 401
 
 
-def test_login_user_success_creates_token(monkeypatch: pytest.MonkeyPatch, mock_settings: MagicMock):
-    user = User(id=7, username="alice", password=service.get_password_hash("pw"))
-    monkeypatch.setattr(service, "get_user", lambda username: user, raising=True)
+async def test_login_user_success_creates_token(monkeypatch: pytest.MonkeyPatch, mock_settings: MagicMock):
+    user = User(id=7, username="alice", password=await service.get_password_hash("pw"))
+    monkeypatch.setattr(service, "get_user", _async_return(user), raising=True)
 
     captured: dict[str, object] = {}
     mock_token_pair = TokenPair(
@@ -59,13 +122,69 @@ def test_login_user_success_creates_token(monkeypatch: pytest.MonkeyPatch, mock_
         refresh_token_expires_in=604800,
     )
 
-    def _create_token(passed_user: object):
+    async def _create_token(passed_user: object):
         captured["user"] = passed_user
         return mock_token_pair
 
     monkeypatch.setattr(service, "create_token", _create_token, raising=True)
 
-    token_pair = service.login_user("alice", "pw")
+    token_pair = await service.login_user("alice", "pw")
     assert token_pair.access_token == "token-123"
     assert token_pair.refresh_token == "refresh-456"
     assert captured["user"] is user
+
+
+async def test_login_user_rehashes_legacy_password(monkeypatch: pytest.MonkeyPatch, mock_settings: MagicMock):
+    legacy = hashlib.sha512(("pw" + "salt").encode("utf-8")).hexdigest()
+    user = User(id=7, username="alice", password=legacy)
+    monkeypatch.setattr(service, "get_user", _async_return(user), raising=True)
+    monkeypatch.setattr(service, "create_token", _async_return(None), raising=True)
+
+    captured: dict[str, str] = {}
+
+    async def _replace_password_hash(username: str, old_hash: str, new_hash: str) -> str:
+        assert old_hash == legacy
+        captured[username] = new_hash
+        return new_hash
+
+    monkeypatch.setattr(service, "replace_password_hash", _replace_password_hash, raising=True)
+
+    await service.login_user("alice", "pw")
+    assert captured["alice"].startswith("$scrypt$")
+    assert await service.verify_password("pw", captured["alice"]) == (True, False)
+
+
+async def test_revoke_all_tokens_user_not_found(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(service, "get_user", _async_return(None), raising=True)
+    with pytest.raises(erri.BusinessError) as exc:
+        await service.revoke_all_tokens("ghost")
+    assert exc.value.status_code == 404
+
+
+async def test_revoke_all_tokens_revokes_by_user_id(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(service, "get_user", _async_return(User(id=7, username="alice", password="x")), raising=True)
+    captured: list[int] = []
+
+    async def _revoke_all_user_tokens(user_id: int) -> int:
+        captured.append(user_id)
+        return 3
+
+    monkeypatch.setattr(service, "revoke_all_user_tokens", _revoke_all_user_tokens, raising=True)
+
+    assert await service.revoke_all_tokens("alice") == 3
+    assert captured == [7]
+
+
+async def test_create_token_rejects_user_whose_password_changed(monkeypatch: pytest.MonkeyPatch):
+    captured: dict[str, object] = {}
+
+    async def _create_refresh_token(user_id: int, username: str, *, password_hash: str | None = None) -> None:
+        captured["password_hash"] = password_hash
+        return None
+
+    monkeypatch.setattr(service, "create_refresh_token", _create_refresh_token, raising=True)
+
+    with pytest.raises(erri.BusinessError) as exc:
+        await service.create_token(User(id=7, username="alice", password="verified-hash"))
+    assert exc.value.status_code == 401
+    assert captured["password_hash"] == "verified-hash"
@@ -0,0 +1,23 @@
+from common.bloom import BloomFilter
+
+
+def test_added_items_are_always_found():
+    bloom = BloomFilter(capacity=1000)
+    names = [f"user-{i}" for i in range(1000)]
+    for name in names:
+        bloom.add(name)
+
+    assert all(name in bloom for name in names)
+
+
+def test_false_positive_rate_stays_near_target():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"user-{i}")
+
+    false_positives = sum(f"stranger-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_empty_filter_contains_nothing():
+    assert "alice" not in BloomFilter(capacity=0)
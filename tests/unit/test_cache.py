@@ -0,0 +1,72 @@
+from common.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_get_returns_value_and_counts_hits_and_misses():
+    cache: TTLCache[str, int] = TTLCache(maxsize=2, ttl=10)
+    assert cache.get("a") is None
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache: TTLCache[str, int] = TTLCache(maxsize=2, ttl=10, clock=clock)
+    cache.set("a", 1)
+    clock.now += 10
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_per_entry_ttl_can_only_shorten_the_default():
+    clock = FakeClock()
+    cache: TTLCache[str, int] = TTLCache(maxsize=2, ttl=10, clock=clock)
+    cache.set("short", 1, ttl=2)
+    cache.set("long", 2, ttl=60)
+    clock.now += 5
+    assert cache.get("short") is None
+    assert cache.get("long") == 2
+    clock.now += 5
+    assert cache.get("long") is None
+
+
+def test_non_positive_ttl_is_not_stored():
+    cache: TTLCache[str, int] = TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1, ttl=0)
+    assert len(cache) == 0
+
+
+def test_evicts_least_recently_used_entry():
+    cache: TTLCache[str, int] = TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_zero_maxsize_disables_cache():
+    cache: TTLCache[str, int] = TTLCache(maxsize=0, ttl=10)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+def test_pop_and_clear():
+    cache: TTLCache[str, int] = TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.pop("a")
+    assert cache.get("a") is None
+    cache.clear()
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (0, 0)
@@ -0,0 +1,55 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from conf import db
+from conf.config import Settings
+
+pytestmark = pytest.mark.anyio
+
+
+def test_engine_options_map_pool_settings():
+    options = db.engine_options(Settings(db_pool_size=3, db_max_overflow=2, db_pool_timeout=1.5, db_pool_pre_ping=True))
+    assert options["poolclass"] is db.InstrumentedPool
+    assert options["pool_size"] == 3
+    assert options["max_overflow"] == 2
+    assert options["pool_timeout"] == 1.5
+    assert options["pool_pre_ping"] is True
+    assert options["connect_args"] == {}
+
+
+def test_engine_options_set_statement_timeout():
+    options = db.engine_options(Settings(db_statement_timeout_ms=5000))
+    assert options["connect_args"] == {"options": "-c statement_timeout=5000"}
+
+
+def test_engine_options_pgbouncer_disables_prepared_statements():
+    options = db.engine_options(Settings(db_pgbouncer=True, db_statement_timeout_ms=5000))
+    assert options["connect_args"] == {"prepare_threshold": None}
+
+
+async def test_instrumented_pool_records_checkouts_and_timeouts(monkeypatch: pytest.MonkeyPatch, tmp_path):
+    stats = db.PoolStats()
+    monkeypatch.setattr(db, "_pool_stats", stats, raising=True)
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+        poolclass=db.InstrumentedPool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05,
+    )
+    monkeypatch.setattr(db, "engine", engine, raising=True)
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            assert db.pool_stats()["saturation"] == 1.0
+            with pytest.raises(PoolTimeoutError):
+                async with engine.connect():
+                    pass
+        assert stats.checkouts == 2
+        assert stats.timeouts == 1
+        assert stats.wait_seconds_max >= 0.05
+        assert db.pool_stats()["checked_out"] == 0
+    finally:
+        await engine.dispose()
@@ -0,0 +1,119 @@
+import json
+import threading
+
+import pytest
+from loguru import logger
+
+from common import codec, request_id
+from conf.logging import QueueSink, _json_format, _json_patcher
+
+
+def test_queue_sink_batches_consecutive_writes_to_same_target():
+    sink = QueueSink(maxsize=100, block=True, batch_size=100)
+    gate = threading.Event()
+    writes: list[str] = []
+
+    def _slow(text: str) -> None:
+        gate.wait(5)
+
+    # Hold the writer thread so the following records pile up into one batch
+    sink.writer(_slow)("first\n")
+    write = sink.writer(writes.append)
+    for i in range(5):
+        write(f"line{i}\n")
+    gate.set()
+    assert sink.flush()
+    sink.close()
+
+    assert writes == ["line0\nline1\nline2\nline3\nline4\n"]
+
+
+def test_queue_sink_drops_records_when_full():
+    sink = QueueSink(maxsize=2, block=False, batch_size=1)
+    gate = threading.Event()
+    started = threading.Event()
+    writes: list[str] = []
+
+    def _stall(text: str) -> None:
+        started.set()
+        gate.wait(5)
+
+    sink.writer(_stall)("stall\n")
+    assert started.wait(5)
+    write = sink.writer(writes.append)
+    for i in range(5):
+        write(f"line{i}\n")
+    gate.set()
+    assert sink.flush()
+    sink.close()
+
+    assert sink.dropped == 3
+    assert writes == ["line0\n", "line1\n"]
+
+
+def test_queue_sink_survives_failing_writer():
+    sink = QueueSink(maxsize=10, block=True, batch_size=10)
+    writes: list[str] = []
+
+    def _fail(text: str) -> None:
+        raise OSError("disk full")
+
+    sink.writer(_fail)("lost\n")
+    sink.writer(writes.append)("kept\n")
+    assert sink.flush()
+    sink.close()
+
+    assert writes == ["kept\n"]
+
+
+@pytest.fixture
+def json_lines():
+    lines: list[str] = []
+    handler_id = logger.add(lines.append, format=_json_format, level="DEBUG", colorize=False)
+    yield lambda: [json.loads(line) for line in lines], logger.patch(_json_patcher)
+    logger.remove(handler_id)
+
+
+def test_json_patcher_merges_structured_fields(json_lines):
+    parsed, log = json_lines
+    log.bind(fields={"path": "/users/me", "status": 200}).info("request")
+    (line,) = parsed()
+    assert line["message"] == "request"
+    assert line["level"] == "INFO"
+    assert line["path"] == "/users/me"
+    assert line["status"] == 200
+
+
+def test_json_patcher_serializes_exception_into_the_same_line(json_lines):
+    parsed, log = json_lines
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        log.exception("failed")
+    (line,) = parsed()
+    assert "ValueError: boom" in line["exception"]
+
+
+def test_json_patcher_includes_current_request_id(json_lines):
+    parsed, log = json_lines
+    token = request_id.bind_request_id("req-1")
+    try:
+        log.info("inside")
+    finally:
+        request_id.reset_request_id(token)
+    log.info("outside")
+    inside, outside = parsed()
+    assert inside["request_id"] == "req-1"
+    assert outside["request_id"] == "-"
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_codec_dumps_is_compact_and_stringifies_unknown_types(monkeypatch: pytest.MonkeyPatch, use_orjson: bool):
+    if not use_orjson:
+        monkeypatch.setattr(codec, "orjson", None, raising=True)
+    elif codec.orjson is None:
+        pytest.skip("orjson is not installed")
+    text = codec.dumps({"name": "张三", "n": 1, "obj": threading})
+    assert json.loads(text)["name"] == "张三"
+    assert ", " not in text
+    assert isinstance(codec.dumps_bytes({"a": 1}), bytes)
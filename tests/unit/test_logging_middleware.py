@@ -1,8 +1,16 @@
-from fastapi import FastAPI
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
 from fastapi.testclient import TestClient
+from loguru import logger
 
+from common import request_id
+from middleware import logging as logging_middleware
 from middleware.logging import (
+    LoggingMiddleware,
+    _BodyCapture,
     _flatten_qs,
+    _is_text_content_type,
     _mask_fields,
     _mask_headers,
     _parse_body,
@@ -119,6 +127,44 @@ class TestParseBody:
         assert result == "not valid json"
 
 
+class TestBodyCapture:
+    def test_joins_chunks_below_limit(self):
+        capture = _BodyCapture(10)
+        capture.feed(b"abc")
+        capture.feed(b"def")
+        assert capture.getvalue() == b"abcdef"
+        assert not capture.truncated
+
+    def test_stops_at_limit(self):
+        capture = _BodyCapture(4)
+        capture.feed(b"abc")
+        capture.feed(b"def")
+        capture.feed(b"ghi")
+        assert capture.getvalue() == b"abcd"
+        assert capture.size == 4
+        assert capture.truncated
+
+    def test_disabled_capture_keeps_nothing(self):
+        capture = _BodyCapture(10, enabled=False)
+        capture.feed(b"abc")
+        assert capture.size == 0
+        assert capture.getvalue() == b""
+
+
+class TestIsTextContentType:
+    def test_text_types_are_captured(self):
+        assert _is_text_content_type("application/json; charset=utf-8")
+        assert _is_text_content_type("application/problem+json")
+        assert _is_text_content_type("application/x-www-form-urlencoded")
+        assert _is_text_content_type("text/plain")
+
+    def test_binary_types_are_skipped(self):
+        assert not _is_text_content_type("application/octet-stream")
+        assert not _is_text_content_type("image/png")
+        assert not _is_text_content_type("multipart/form-data; boundary=x")
+        assert not _is_text_content_type("")
+
+
 class TestFlattenQs:
     def test_flattens_single_value_params(self):
         result = _flatten_qs("name=alice&age=30")
@@ -205,3 +251,191 @@ class TestLoggingMiddleware:
         resp = client.post("/login", data={"username": "alice", "password": "secret"})
         assert resp.status_code == 200
         assert resp.json() == {"user": "alice"}
+
+
+class TestLoggingMiddlewareBodyCapture:
+    def test_streaming_response_is_captured_up_to_limit_only(self, monkeypatch: pytest.MonkeyPatch):
+        captured: list[bytes] = []
+
+        def _parse(body: bytes, content_type: str) -> str:
+            captured.append(body)
+            return body.decode()
+
+        monkeypatch.setattr(logging_middleware, "_parse_body", _parse, raising=True)
+        app = FastAPI()
+
+        @app.get("/stream")
+        async def stream():
+            async def chunks():
+                for _ in range(100):
+                    yield b"x" * 1000
+
+            return StreamingResponse(chunks(), media_type="text/plain")
+
+        app.add_middleware(LoggingMiddleware, verbose=True, body_limit=16)
+        client = TestClient(app)
+        resp = client.get("/stream")
+        assert resp.status_code == 200
+        assert len(resp.content) == 100_000
+        assert captured == [b"x" * 16]
+
+    def test_binary_response_is_not_captured(self, monkeypatch: pytest.MonkeyPatch):
+        captured: list[bytes] = []
+        monkeypatch.setattr(logging_middleware, "_parse_body", lambda body, ct: captured.append(body), raising=True)
+        app = FastAPI()
+
+        @app.get("/blob")
+        async def blob():
+            return Response(content=b"\x00" * 64, media_type="application/octet-stream")
+
+        app.add_middleware(LoggingMiddleware, verbose=True)
+        client = TestClient(app)
+        resp = client.get("/blob")
+        assert resp.status_code == 200
+        assert captured == []
+
+    def test_truncated_json_body_is_not_logged_raw(self):
+        messages: list[str] = []
+        handler_id = logger.add(messages.append, level="DEBUG", format="{message}")
+        app = FastAPI()
+
+        @app.post("/register")
+        async def register(data: dict):
+            return {"ok": True}
+
+        app.add_middleware(LoggingMiddleware, verbose=True, body_limit=4096)
+        client = TestClient(app)
+        try:
+            resp = client.post("/register", json={"password": "hunter2-SECRET", "bio": "x" * 5000})
+        finally:
+            logger.remove(handler_id)
+        assert resp.status_code == 200
+
+        logged = "".join(messages)
+        assert "hunter2-SECRET" not in logged
+        assert "<truncated, 4096 bytes captured>" in logged
+
+
+class TestLoggingMiddlewareSummaryMode:
+    @pytest.fixture(autouse=True)
+    def _no_body_parsing(self, monkeypatch: pytest.MonkeyPatch):
+        def _fail(*_: object) -> None:
+            raise AssertionError("summary mode must not inspect headers or bodies")
+
+        monkeypatch.setattr(logging_middleware, "_parse_body", _fail, raising=True)
+        monkeypatch.setattr(logging_middleware, "_mask_headers", _fail, raising=True)
+
+    def test_setup_uses_summary_mode_when_debug_disabled(self, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(logging_middleware, "is_level_enabled", lambda level: False, raising=True)
+        app = FastAPI()
+        setup_logging_middleware(app)
+        assert app.user_middleware[0].kwargs["verbose"] is False
+
+    def test_summary_mode_skips_header_and_body_capture(self):
+        app = FastAPI()
+
+        @app.post("/echo")
+        async def echo(data: dict):
+            return data
+
+        app.add_middleware(LoggingMiddleware, verbose=False)
+        client = TestClient(app)
+        resp = client.post("/echo?q=1", json={"password": "secret"})
+        assert resp.status_code == 200
+        assert resp.json() == {"password": "secret"}
+
+
+class TestLoggingMiddlewareStructuredMode:
+    @pytest.fixture
+    def records(self):
+        captured: list[dict] = []
+        handler_id = logger.add(lambda message: captured.append(message.record), level="DEBUG")
+        yield captured
+        logger.remove(handler_id)
+
+    def test_emits_one_record_per_request(self, records: list[dict]):
+        app = FastAPI()
+
+        @app.post("/echo")
+        async def echo(data: dict):
+            return data
+
+        app.add_middleware(LoggingMiddleware, verbose=True, structured=True)
+        client = TestClient(app)
+        resp = client.post("/echo", json={"name": "alice", "password": "secret"})
+        assert resp.status_code == 200
+
+        assert len(records) == 1
+        fields = records[0]["extra"]["fields"]
+        assert fields["method"] == "POST"
+        assert fields["path"] == "/echo"
+        assert fields["status"] == 200
+        assert fields["user"] is None
+        assert fields["body"] == {"name": "alice", "password": "***"}
+        assert isinstance(fields["duration_ms"], float)
+
+    def test_truncated_json_body_is_not_logged_raw(self, records: list[dict]):
+        app = FastAPI()
+
+        @app.post("/register")
+        async def register(data: dict):
+            return {"ok": True}
+
+        app.add_middleware(LoggingMiddleware, verbose=True, structured=True, body_limit=64)
+        client = TestClient(app)
+        client.post("/register", json={"password": "hunter2-SECRET", "bio": "x" * 200})
+
+        assert records[0]["extra"]["fields"]["body"] == "<truncated, 64 bytes captured>"
+
+    def test_omits_body_when_not_verbose(self, records: list[dict]):
+        app = FastAPI()
+
+        @app.post("/echo")
+        async def echo(data: dict):
+            return data
+
+        app.add_middleware(LoggingMiddleware, verbose=False, structured=True)
+        client = TestClient(app)
+        client.post("/echo", json={"name": "alice"})
+
+        assert len(records) == 1
+        assert "body" not in records[0]["extra"]["fields"]
+
+    def test_setup_enables_structured_mode_for_json_format(self, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(logging_middleware.settings, "log_format", "json", raising=True)
+        app = FastAPI()
+        setup_logging_middleware(app)
+        assert app.user_middleware[0].kwargs["structured"] is True
+
+
+class TestLoggingMiddlewareRequestId:
+    @pytest.fixture
+    def client(self) -> TestClient:
+        app = FastAPI()
+
+        @app.get("/whoami")
+        async def whoami():
+            return {"request_id": request_id.get_request_id()}
+
+        app.add_middleware(LoggingMiddleware, verbose=False)
+        return TestClient(app)
+
+    def test_generates_and_echoes_request_id(self, client: TestClient):
+        first = client.get("/whoami")
+        second = client.get("/whoami")
+        assert first.headers["x-request-id"] == first.json()["request_id"]
+        assert first.headers["x-request-id"] != second.headers["x-request-id"]
+
+    def test_honours_incoming_request_id(self, client: TestClient):
+        resp = client.get("/whoami", headers={"X-Request-ID": "trace-123"})
+        assert resp.headers["x-request-id"] == "trace-123"
+        assert resp.json()["request_id"] == "trace-123"
+
+    def test_replaces_malformed_incoming_request_id(self, client: TestClient):
+        resp = client.get("/whoami", headers={"X-Request-ID": "bad id <>"})
+        assert resp.headers["x-request-id"] != "bad id <>"
+        assert resp.json()["request_id"] == resp.headers["x-request-id"]
+
+    def test_request_id_is_cleared_after_request(self, client: TestClient):
+        client.get("/whoami")
+        assert request_id.get_request_id() is None
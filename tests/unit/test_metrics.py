@@ -0,0 +1,91 @@
+from pathlib import Path
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from common import metrics
+from middleware import metrics as metrics_middleware
+from middleware.metrics import MetricsMiddleware
+
+
+def test_counter_and_gauge_render_with_labels():
+    registry = metrics.Registry()
+    requests = registry.counter("requests_total", "Requests", ("route",))
+    in_flight = registry.gauge("in_flight", "In flight")
+    requests.inc("/a")
+    requests.inc("/a")
+    in_flight.inc()
+    in_flight.dec()
+
+    text = metrics.render(registry.snapshot())
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{route="/a"} 2.0' in text
+    assert "in_flight 0.0" in text
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = metrics.Registry()
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        latency.observe(value)
+
+    text = metrics.render(registry.snapshot())
+    assert 'latency_seconds_bucket{le="0.1"} 2' in text
+    assert 'latency_seconds_bucket{le="1.0"} 3' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in text
+    assert "latency_seconds_count 4" in text
+    assert "latency_seconds_sum 2.65" in text
+
+
+def test_label_values_are_escaped():
+    registry = metrics.Registry()
+    registry.counter("c", "C", ("path",)).inc('a"b\\c')
+    assert 'c{path="a\\"b\\\\c"} 1.0' in metrics.render(registry.snapshot())
+
+
+def test_callback_is_read_at_scrape_time():
+    registry = metrics.Registry()
+    value = {"n": 1}
+    registry.callback("pending", "Pending jobs", lambda: value["n"])
+    value["n"] = 5
+    assert "pending 5.0" in metrics.render(registry.snapshot())
+
+
+def test_collect_sums_worker_snapshots(tmp_path: Path):
+    worker = metrics.Registry()
+    worker.counter("requests_total", "Requests", ("route",)).inc("/a", amount=3)
+    worker.histogram("latency_seconds", "Latency", buckets=(1.0,)).observe(0.5)
+    (tmp_path / "1.json").write_bytes(metrics.codec.dumps_bytes(worker.snapshot()))
+
+    local = metrics.Registry()
+    local.counter("requests_total", "Requests", ("route",)).inc("/a")
+    local.histogram("latency_seconds", "Latency", buckets=(1.0,)).observe(2.0)
+
+    text = metrics.collect(tmp_path, local)
+    assert 'requests_total{route="/a"} 4.0' in text
+    assert 'latency_seconds_bucket{le="1.0"} 1' in text
+    assert "latency_seconds_count 2" in text
+    # The scraping worker publishes its own snapshot as well
+    assert len(list(tmp_path.glob("*.json"))) == 2
+
+
+def test_middleware_labels_requests_by_route_template(monkeypatch):
+    registry = metrics.Registry()
+    requests = registry.counter("requests_total", "Requests", ("method", "route", "status"))
+    monkeypatch.setattr(metrics_middleware, "_REQUESTS", requests, raising=True)
+    monkeypatch.setattr(metrics_middleware, "_DURATION", registry.histogram("d", "D", ("method", "route", "status")))
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        return {"id": item_id}
+
+    app.add_middleware(MetricsMiddleware, routes=app.router.routes)
+    client = TestClient(app)
+    client.get("/items/1")
+    client.get("/items/2")
+    client.get("/missing/3")
+
+    text = metrics.render(registry.snapshot())
+    assert 'requests_total{method="GET",route="/items/{item_id}",status="200"} 2.0' in text
+    assert 'requests_total{method="GET",route="<unmatched>",status="404"} 1.0' in text
@@ -0,0 +1,31 @@
+from common import request_id
+
+
+def test_new_request_ids_are_unique():
+    ids = {request_id.new_request_id() for _ in range(10000)}
+    assert len(ids) == 10000
+
+
+def test_new_request_ids_share_the_worker_prefix():
+    first, second = request_id.new_request_id(), request_id.new_request_id()
+    assert first.rsplit("-", 1)[0] == second.rsplit("-", 1)[0]
+
+
+def test_sanitize_accepts_common_formats():
+    assert request_id.sanitize("3f2a9c1e-7b4d-4c1a-9d2e-1a2b3c4d5e6f") == "3f2a9c1e-7b4d-4c1a-9d2e-1a2b3c4d5e6f"
+    assert request_id.sanitize("01HF8Z3K5Q.trace:1") == "01HF8Z3K5Q.trace:1"
+
+
+def test_sanitize_rejects_unsafe_values():
+    assert request_id.sanitize("") is None
+    assert request_id.sanitize("a" * 129) is None
+    assert request_id.sanitize("id\r\nX-Injected: 1") is None
+    assert request_id.sanitize("<script>") is None
+
+
+def test_bind_and_reset_request_id():
+    assert request_id.get_request_id() is None
+    token = request_id.bind_request_id("abc")
+    assert request_id.get_request_id() == "abc"
+    request_id.reset_request_id(token)
+    assert request_id.get_request_id() is None
@@ -0,0 +1,29 @@
+import json
+
+from fastapi.responses import JSONResponse
+
+from common.response import FastJSONResponse
+from user.dto import UserProfileResponse
+
+
+def _profile() -> UserProfileResponse:
+    return UserProfileResponse(
+        username="alice", nickname="Ålice", email=None, avatar_url=None, role="user", is_active=True
+    )
+
+
+def test_renders_dto_like_fastapi_default():
+    profile = _profile()
+    fast = FastJSONResponse(profile)
+    default = JSONResponse(profile.model_dump(mode="json"))
+
+    assert fast.body == default.body
+    assert fast.media_type == "application/json"
+
+
+def test_renders_plain_content():
+    response = FastJSONResponse({"message": "hi", "items": [1, 2]}, status_code=201)
+
+    assert json.loads(response.body) == {"message": "hi", "items": [1, 2]}
+    assert response.status_code == 201
+    assert response.headers["content-length"] == str(len(response.body))
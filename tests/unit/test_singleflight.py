@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from common.singleflight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_calls_share_one_execution():
+    flight: SingleFlight[str, int] = SingleFlight("test")
+    calls = 0
+    release = asyncio.Event()
+
+    async def fetch() -> int:
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return 42
+
+    waiters = [asyncio.create_task(flight.do("key", fetch)) for _ in range(10)]
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*waiters) == [42] * 10
+    assert calls == 1
+    assert len(flight) == 0
+
+
+async def test_different_keys_and_later_calls_run_separately():
+    flight: SingleFlight[str, str] = SingleFlight("test")
+    calls: list[str] = []
+
+    async def fetch(key: str) -> str:
+        calls.append(key)
+        await asyncio.sleep(0)
+        return key
+
+    assert await asyncio.gather(flight.do("a", lambda: fetch("a")), flight.do("b", lambda: fetch("b"))) == ["a", "b"]
+    assert await flight.do("a", lambda: fetch("a")) == "a"
+    assert calls == ["a", "b", "a"]
+
+
+async def test_error_is_raised_to_every_caller_and_frees_the_key():
+    flight: SingleFlight[str, int] = SingleFlight("test")
+
+    async def fail() -> int:
+        await asyncio.sleep(0)
+        raise RuntimeError("db down")
+
+    results = await asyncio.gather(*(flight.do("key", fail) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert len(flight) == 0
+
+
+async def test_timeout_applies_to_the_shared_call():
+    flight: SingleFlight[str, int] = SingleFlight("test")
+
+    async def hang() -> int:
+        await asyncio.Event().wait()
+        return 0
+
+    results = await asyncio.gather(*(flight.do("key", hang, timeout=0.01) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, TimeoutError) for result in results)
+    assert len(flight) == 0
+
+
+async def test_cancelled_caller_does_not_cancel_the_others():
+    flight: SingleFlight[str, int] = SingleFlight("test")
+    release = asyncio.Event()
+
+    async def fetch() -> int:
+        await release.wait()
+        return 7
+
+    first = asyncio.create_task(flight.do("key", fetch))
+    second = asyncio.create_task(flight.do("key", fetch))
+    await asyncio.sleep(0)
+    first.cancel()
+    release.set()
+
+    assert await second == 7
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+
+async def test_forget_starts_the_next_call_afresh():
+    flight: SingleFlight[str, str] = SingleFlight("test")
+    release = asyncio.Event()
+
+    async def stale() -> str:
+        await release.wait()
+        return "stale"
+
+    async def fresh() -> str:
+        return "fresh"
+
+    first = asyncio.create_task(flight.do("key", stale))
+    await asyncio.sleep(0)
+    flight.forget("key")
+    assert await flight.do("key", fresh) == "fresh"
+
+    release.set()
+    assert await first == "stale"
+    assert len(flight) == 0
@@ -0,0 +1,64 @@
+import time
+from datetime import UTC, datetime, timedelta
+
+from auth import stateless
+from auth.model import RefreshTokenRevocation
+
+
+def _claims(*, family: str = "fam-1", user_id: int = 7, issued_at: float | None = None) -> dict[str, object]:
+    return {"fam": family, "uid": user_id, "iat": time.time() if issued_at is None else issued_at}
+
+
+def _revocation(
+    kind: str, key: str, *, user_id: int = 7, created_at: datetime, ttl: timedelta
+) -> RefreshTokenRevocation:
+    return RefreshTokenRevocation(
+        kind=kind, key=key, user_id=user_id, created_at=created_at, expires_at=created_at + ttl
+    )
+
+
+def test_revoked_family_rejects_all_its_tokens():
+    revocations = stateless.RevocationSet()
+    now = datetime.now(UTC)
+    revocations.add(_revocation("family", "fam-1", created_at=now, ttl=timedelta(hours=1)))
+
+    assert revocations.is_revoked(_claims(family="fam-1"))
+    assert not revocations.is_revoked(_claims(family="fam-2"))
+
+
+def test_user_cutoff_only_rejects_tokens_issued_before_it():
+    revocations = stateless.RevocationSet()
+    cutoff = datetime.now(UTC)
+    revocations.add(_revocation("user", "k1", created_at=cutoff, ttl=timedelta(hours=1)))
+    # An older cutoff must not move the newer one back
+    revocations.add(_revocation("user", "k0", created_at=cutoff - timedelta(minutes=5), ttl=timedelta(hours=1)))
+
+    assert revocations.is_revoked(_claims(issued_at=cutoff.timestamp() - 1))
+    assert not revocations.is_revoked(_claims(issued_at=cutoff.timestamp() + 0.001))
+    assert not revocations.is_revoked(_claims(user_id=8, issued_at=cutoff.timestamp() - 1))
+
+
+def test_spent_tokens_are_not_kept_in_memory():
+    revocations = stateless.RevocationSet()
+    now = datetime.now(UTC)
+    revocations.add(_revocation("token", "jti-1", created_at=now, ttl=timedelta(hours=1)))
+
+    assert len(revocations) == 0
+
+
+def test_prune_drops_expired_entries():
+    revocations = stateless.RevocationSet()
+    now = datetime.now(UTC)
+    revocations.add(_revocation("family", "old", created_at=now - timedelta(hours=2), ttl=timedelta(hours=1)))
+    revocations.add(_revocation("family", "live", created_at=now, ttl=timedelta(hours=1)))
+    revocations.add(_revocation("user", "k", created_at=now - timedelta(hours=2), ttl=timedelta(hours=1)))
+
+    revocations.prune(now.timestamp())
+
+    assert len(revocations) == 1
+    assert revocations.is_revoked(_claims(family="live"))
+
+
+def test_is_stateless_token():
+    assert stateless.is_stateless_token("a.b.c")
+    assert not stateless.is_stateless_token("opaque_token-value")
@@ -0,0 +1,232 @@
+import asyncio
+from collections.abc import Collection
+
+import pytest
+
+from user import model as user_model
+from user.cache import (
+    InMemoryStore,
+    LocalUserCache,
+    NullUserCache,
+    SharedUserCache,
+    UsernameFilter,
+    use_shared_store,
+    user_cache,
+)
+from user.model import User
+
+pytestmark = pytest.mark.anyio
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def test_local_cache_counts_hits_and_misses():
+    cache = LocalUserCache(maxsize=10, ttl=60)
+    assert await cache.get("alice") is None
+    await cache.set("alice", {"username": "alice"})
+    assert await cache.get("alice") == {"username": "alice"}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+async def test_local_cache_invalidate_removes_entry():
+    cache = LocalUserCache(maxsize=10, ttl=60)
+    await cache.set("alice", {"username": "alice"})
+    await cache.invalidate("alice")
+    assert await cache.get("alice") is None
+
+
+async def test_shared_cache_round_trips_through_store():
+    clock = _Clock()
+    store = InMemoryStore(clock=clock)
+    writer = SharedUserCache(store, ttl=30)
+    reader = SharedUserCache(store, ttl=30)
+
+    await writer.set("alice", {"username": "alice", "id": 1})
+    assert await reader.get("alice") == {"username": "alice", "id": 1}
+    assert reader.hits == 1
+
+    await writer.invalidate("alice")
+    assert await reader.get("alice") is None
+    assert reader.misses == 1
+
+
+def test_installed_store_backs_the_user_cache():
+    store = InMemoryStore()
+    use_shared_store(store)
+    try:
+        assert isinstance(user_cache(), SharedUserCache)
+    finally:
+        use_shared_store(None)
+    assert isinstance(user_cache(), LocalUserCache)
+
+
+async def test_in_memory_store_expires_entries():
+    clock = _Clock()
+    store = InMemoryStore(clock=clock)
+    await store.set("k", b"v", ttl=10)
+    clock.now = 9.9
+    assert await store.get("k") == b"v"
+    clock.now = 10.0
+    assert await store.get("k") is None
+
+
+async def test_null_cache_never_stores():
+    cache = NullUserCache()
+    await cache.set("alice", {"username": "alice"})
+    assert await cache.get("alice") is None
+
+
+async def test_concurrent_misses_load_the_user_once(monkeypatch: pytest.MonkeyPatch):
+    calls = 0
+
+    async def _load_user(username: str) -> User:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return User(id=1, username=username, password="x")
+
+    monkeypatch.setattr(user_model, "_load_user", _load_user)
+    monkeypatch.setattr(user_model, "user_cache", lambda: NullUserCache())
+
+    users = await asyncio.gather(*(user_model.get_user("alice") for _ in range(20)))
+
+    assert calls == 1
+    assert {user.username for user in users if user} == {"alice"}
+    # Every caller gets its own instance
+    assert len({id(user) for user in users}) == 20
+
+
+async def test_local_cache_remembers_unknown_names_separately():
+    cache = LocalUserCache(maxsize=1, ttl=60, missing_maxsize=10, missing_ttl=60)
+    await cache.set("alice", {"username": "alice"})
+    for i in range(5):
+        await cache.set_missing(f"ghost-{i}")
+
+    # Unknown names do not evict real users
+    assert await cache.get("alice") == {"username": "alice"}
+    assert await cache.get("ghost-0") == {}
+    await cache.invalidate("ghost-0")
+    assert await cache.get("ghost-0") is None
+
+
+async def test_shared_cache_remembers_unknown_names_under_the_same_key():
+    cache = SharedUserCache(InMemoryStore(), ttl=60, missing_ttl=60)
+    await cache.set_missing("ghost")
+    assert await cache.get("ghost") == {}
+    await cache.invalidate("ghost")
+    assert await cache.get("ghost") is None
+
+
+async def test_unknown_name_is_loaded_once_then_answered_from_cache(monkeypatch: pytest.MonkeyPatch):
+    calls = 0
+
+    async def _load_user(username: str) -> None:
+        nonlocal calls
+        calls += 1
+
+    cache = LocalUserCache(maxsize=10, ttl=60, missing_maxsize=10, missing_ttl=60)
+    monkeypatch.setattr(user_model, "_load_user", _load_user)
+    monkeypatch.setattr(user_model, "user_cache", lambda: cache)
+
+    assert await user_model.get_user("ghost") is None
+    assert await user_model.get_user("ghost") is None
+    assert calls == 1
+
+
+async def test_username_filter_answers_for_names_it_has_not_seen(monkeypatch: pytest.MonkeyPatch):
+    known = UsernameFilter()
+    assert known.might_exist("anyone")  # not built yet
+
+    async def _load(after_id: int, ids: Collection[int]) -> list[tuple[int, str]]:
+        return [(1, "alice")]
+
+    await known.sync(_load)
+    known.add("bob")
+
+    assert known.might_exist("alice")
+    assert known.might_exist("bob")
+
+    async def _load_user(username: str) -> None:
+        raise AssertionError("the filter should have answered")
+
+    monkeypatch.setattr(user_model, "_load_user", _load_user)
+    monkeypatch.setattr(user_model, "user_cache", lambda: NullUserCache())
+    monkeypatch.setattr(user_model, "username_filter", lambda: known)
+    assert await user_model.get_user("mallory") is None
+
+
+async def test_username_filter_polls_past_the_last_id_and_retries_skipped_ids():
+    clock = _Clock()
+    known = UsernameFilter(clock=clock)
+    polls: list[tuple[int, list[int]]] = []
+    # id 2 is assigned before id 3 but commits after it
+    rows = [[(1, "alice"), (3, "carol")], [(2, "bob")], []]
+
+    async def _load(after_id: int, ids: Collection[int]) -> list[tuple[int, str]]:
+        polls.append((after_id, sorted(ids)))
+        return rows[len(polls) - 1]
+
+    await known.sync(_load)
+    await known.sync(_load)
+    assert known.might_exist("bob")
+    await known.sync(_load)
+
+    assert polls == [(0, []), (3, [2]), (3, [])]
+
+
+async def test_username_filter_stops_retrying_a_skipped_id_after_a_while():
+    clock = _Clock()
+    known = UsernameFilter(clock=clock)
+    polls: list[list[int]] = []
+
+    async def _load(after_id: int, ids: Collection[int]) -> list[tuple[int, str]]:
+        polls.append(sorted(ids))
+        return [(1, "alice"), (3, "carol")] if after_id == 0 else []
+
+    await known.sync(_load)
+    await known.sync(_load)
+    clock.now += UsernameFilter._GAP_TIMEOUT
+    await known.sync(_load)
+
+    assert polls == [[], [2], []]
+
+
+async def test_username_filter_is_rebuilt_once_it_outgrows_its_capacity():
+    known = UsernameFilter()
+    users = [(i, f"user{i}") for i in range(1, 11)]
+    full_loads = 0
+
+    async def _load(after_id: int, ids: Collection[int]) -> list[tuple[int, str]]:
+        nonlocal full_loads
+        if after_id == 0:
+            full_loads += 1
+            return list(users)
+        return [user for user in users if user[0] > after_id]
+
+    await known.sync(_load)
+    users.extend((i, f"user{i}") for i in range(11, 1100))
+    await known.sync(_load)
+    assert full_loads == 1
+
+    await known.sync(_load)
+    assert full_loads == 2
+    assert all(known.might_exist(username) for _, username in users)
+    assert known._capacity == 2 * len(users)
+
+
+async def test_username_filter_keeps_names_registered_while_it_builds():
+    known = UsernameFilter()
+
+    async def _load(after_id: int, ids: Collection[int]) -> list[tuple[int, str]]:
+        known.add("dave")  # created on this worker after the load's snapshot
+        return [(1, "alice")]
+
+    await known.sync(_load)
+
+    assert known.might_exist("dave")
@@ -7,60 +7,65 @@ from common import erri
 from user import service
 from user.model import User
 
+pytestmark = pytest.mark.anyio
+
+
+def _async_return(value: object):
+    async def _fn(*_: object, **__: object) -> object:
+        return value
+
+    return _fn
+
 
 @pytest.fixture
 def mock_settings(monkeypatch: pytest.MonkeyPatch) -> MagicMock:
     """Create a mock settings object with default test values."""
     mock = MagicMock()
     mock.password_salt = "salt"
+    mock.password_hash_n = 1024
+    mock.password_hash_r = 8
+    mock.password_hash_p = 1
+    mock.password_hash_workers = 2
+    mock.password_hash_max_queue = 8
     monkeypatch.setattr(auth_service, "settings", mock)
     return mock
 
 
-def test_register_user_when_user_exists(monkeypatch: pytest.MonkeyPatch):
-    monkeypatch.setattr(service, "get_user", lambda username: User(id=1, username=username, password="x"), raising=True)
+async def test_register_user_when_user_exists(monkeypatch: pytest.MonkeyPatch, mock_settings: MagicMock):
+    monkeypatch.setattr(service, "create_user", _async_return(None), raising=True)
     with pytest.raises(erri.BusinessError) as exc:
-        service.register_user("alice", "pw")
+        await service.register_user("alice", "pw")
     assert exc.value.status_code == 409
 
 
-def test_register_user_success_hashes_password_and_calls_create(
+async def test_register_user_success_hashes_password_and_calls_create(
     monkeypatch: pytest.MonkeyPatch, mock_settings: MagicMock
 ):
-    monkeypatch.setattr(service, "get_user", lambda username: None, raising=True)
-
     captured: dict[str, str] = {}
 
-    def _create_user(username: str, password: str):
+    async def _create_user(username: str, password: str):
         captured["username"] = username
         captured["password"] = password
         return User(id=123, username=username, password=password)
 
     monkeypatch.setattr(service, "create_user", _create_user, raising=True)
 
-    user = service.register_user("alice", "pw")
+    user = await service.register_user("alice", "pw")
     assert user.id == 123
     assert user.username == "alice"
     assert captured["username"] == "alice"
-    assert captured["password"] == auth_service.get_password_hash("pw")
+    assert await auth_service.verify_password("pw", captured["password"]) == (True, False)
 
 
-def test_register_user_create_failed_returns_none(monkeypatch: pytest.MonkeyPatch):
-    monkeypatch.setattr(service, "get_user", lambda username: None, raising=True)
-    monkeypatch.setattr(service, "create_user", lambda username, password: None, raising=True)
-    with pytest.raises(erri.BusinessError) as exc:
-        service.register_user("alice", "pw")
-    assert exc.value.status_code == 500
-
-
-def test_register_user_create_failed_returns_user_without_id(monkeypatch: pytest.MonkeyPatch):
-    monkeypatch.setattr(service, "get_user", lambda username: None, raising=True)
+async def test_register_user_create_failed_returns_user_without_id(
+    monkeypatch: pytest.MonkeyPatch, mock_settings: MagicMock
+):
     monkeypatch.setattr(
         service,
         "create_user",
-        lambda username, password: User(id=None, username=username, password=password),
+        _async_return(User(id=None, username="alice", password="x")),
         raising=True,
     )
     with pytest.raises(erri.BusinessError) as exc:
-        service.register_user("alice", "pw")
+        await service.register_user("alice", "pw")
     assert exc.value.status_code == 500